@@ -1,20 +1,44 @@
 # app.py
 import os
-import re
-import unicodedata
 from datetime import date, timedelta
 from calendar import monthrange  # último dia do mês
 
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import sqlite3
 import streamlit as st
 import threading
 import time
 import requests
 import urllib.parse  # ADICIONADO: usado para montar mailto/whatsapp
 
+from hospedar.banco import conectar
+from hospedar.conflitos import conflitos_no_banco, conflitos_reserva, datas_alteradas
+from hospedar.dados import (
+    anos_disponiveis, ganhos_por_mes, get_despesas, get_locacoes, get_precos, get_unidades, noites_por_mes,
+    valores_distintos,
+)
+from hospedar.edicao import com_unidade_id, gravar_mudancas, mudancas_editor
+from hospedar.importacao import (
+    AVISO_SOBRESCREVER_LOCACOES, CSV_EM_BLOCOS_BYTES, LINHAS_POR_BLOCO, OBRIGATORIAS_DESPESAS,
+    OBRIGATORIAS_LOCACOES, colunas_faltando, conflitos_locacoes, ler_csv_locacoes, preparar_despesas,
+    preparar_locacoes, primeiro_bloco_csv, primeiro_bloco_excel,
+)
+from hospedar.migracoes import inicializar_db
+from hospedar.ocupacao import (
+    administracao_por_unidade, calendario_ocupacao, formatar_calendario, ocupacao_diaria,
+    receita_no_periodo, resumo_ocupacao, totalizar_calendario,
+)
+from hospedar.relatorios import (
+    MESES_ABREV, administradora_em_lote, administradora_periodo, com_linha_total, despesas_por_mes_tipo,
+    ganhos_anuais, mensagem_administradora, noites_reservadas_por_mes, opcoes_despesas, opcoes_receita_lucro,
+    pacote_administradora, receita_lucro_por_mes, tabela_administradora,
+)
+from hospedar.resumo import aplicar_pendencias
+from hospedar.tarefas import (
+    ATIVOS, enviar_importacao_despesas, enviar_importacao_locacoes, ha_tarefas_ativas, tarefas_recentes,
+)
+
 # ============== CONFIGURAÇÃO DA PÁGINA ==============
 # Configuração da página para abrir com menu lateral fechado
 st.set_page_config(page_title="Hospedar", layout="wide", initial_sidebar_state="collapsed")
@@ -117,161 +141,15 @@ st.markdown(
 
 # ============== BANCO DE DADOS ======================
 
-def conectar():
-    return sqlite3.connect("hospedagem.db", check_same_thread=False)
-
-# Atualizar a tabela de unidades no banco de dados (com migração)
-def inicializar_db():
-    conn = conectar()
-    c = conn.cursor()
-
-    # Tabelas base (sem colunas novas em 'unidades' aqui, para permitir migração)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS unidades (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT,
-            localizacao TEXT,
-            capacidade INTEGER,
-            status TEXT
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS locacoes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            unidade_id INTEGER,
-            checkin DATE,
-            checkout DATE,
-            hospede TEXT,
-            valor REAL,
-            plataforma TEXT,
-            status_pagamento TEXT,
-            FOREIGN KEY(unidade_id) REFERENCES unidades(id)
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS despesas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            unidade_id INTEGER,
-            data DATE,
-            tipo TEXT,
-            valor REAL,
-            descricao TEXT,
-            FOREIGN KEY(unidade_id) REFERENCES unidades(id)
-        )
-    """)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS precos (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            unidade_id INTEGER,
-            temporada TEXT,
-            preco_base REAL,
-            FOREIGN KEY(unidade_id) REFERENCES unidades(id)
-        )
-    """)
-
-    # --- MIGRAÇÃO: garante colunas novas em 'unidades' ---
-    c.execute("PRAGMA table_info(unidades)")
-    cols = {row[1] for row in c.fetchall()}  # nomes das colunas existentes
-
-    if "administracao" not in cols:
-        c.execute("ALTER TABLE unidades ADD COLUMN administracao TEXT DEFAULT 'Não'")
-    if "percentual_administracao" not in cols:
-        c.execute("ALTER TABLE unidades ADD COLUMN percentual_administracao REAL DEFAULT 0.0")
-
-    conn.commit()
-    conn.close()
-
+# Cria/migra o esquema (versionado por PRAGMA user_version; só roda o que estiver pendente)
 inicializar_db()
 
 # ============== FUNÇÕES AUXILIARES ==================
-def get_unidades():
-    conn = conectar()
-    df = pd.read_sql("SELECT * FROM unidades", conn)
-    conn.close()
-    return df
-
-def get_locacoes():
-    conn = conectar()
-    df = pd.read_sql("SELECT * FROM locacoes", conn)
-    conn.close()
-    return df
-
-def get_despesas():
-    conn = conectar()
-    df = pd.read_sql("SELECT * FROM despesas", conn)
-    conn.close()
-    return df
-
-def get_precos():
-    conn = conectar()
-    df = pd.read_sql("SELECT * FROM precos", conn)
-    conn.close()
-    return df
-
-def _norm(s: str) -> str:
-    """Normaliza string para comparações (sem acento, lower, trim)."""
-    s = str(s or "").strip().lower()
-    s = unicodedata.normalize("NFKD", s)
-    return "".join(ch for ch in s if not unicodedata.combining(ch))
-
-def parse_valor_cell(x) -> float:
-    """Converte strings de dinheiro em float. Suporta 'R$ 1.234,56', '1,234.56', '1234,56', '1234.56', '(1.234,56)'. """
-    if x is None:
-        return 0.0
-    s = str(x).strip()
-    if s == "" or s.lower() in {"nan", "none"}:
-        return 0.0
-    neg = False
-    if s.startswith("(") and s.endswith(")"):
-        neg = True
-        s = s[1:-1]
-    s = re.sub(r"[^\d,.\-]", "", s)
-    if "," in s and "." in s:
-        if s.rfind(",") > s.rfind("."):
-            s = s.replace(".", "").replace(",", ".")
-        else:
-            s = s.replace(",", "")
-    elif "," in s:
-        s = s.replace(".", "").replace(",", ".")
-    try:
-        v = float(s)
-        return -v if neg else v
-    except Exception:
-        return 0.0
-
-def parse_valor_series(series: pd.Series) -> pd.Series:
-    return series.apply(parse_valor_cell)
-
 # ----- Helpers Mobile -----
 def card(col, titulo, valor, subtitulo=""):
     with col:
         st.metric(titulo, valor, delta=subtitulo)
 
-def resumo_ocupacao(locacoes_df: pd.DataFrame, inicio: date, fim: date):
-    """Retorna (noites_ocupadas, taxa_ocupacao%).
-    Day-use (checkin >= checkout) conta 1 noite no dia do check-in."""
-    if locacoes_df.empty or inicio > fim:
-        return 0, 0.0
-
-    noites_total, noites_ocupadas = 0, 0
-    unidades_ids = locacoes_df["unidade_id"].unique().tolist()
-    for uid in unidades_ids:
-        dias_janela = pd.date_range(inicio, fim, freq="D")
-        noites_total += len(dias_janela)
-        locs = locacoes_df[locacoes_df["unidade_id"] == uid]
-        for _, loc in locs.iterrows():
-            ci = pd.to_datetime(loc["checkin"]).date()
-            co = pd.to_datetime(loc["checkout"]).date()
-            if ci >= co:
-                if inicio <= ci <= fim:
-                    noites_ocupadas += 1
-            else:
-                dr = pd.date_range(max(ci, inicio), min(co, fim) - pd.Timedelta(days=1), freq="D")
-                noites_ocupadas += len([d for d in dr if inicio <= d.date() <= fim])
-
-    taxa = (noites_ocupadas / noites_total * 100) if noites_total else 0.0
-    return int(noites_ocupadas), round(taxa, 1)
-
 def render_locacao_card(row: pd.Series):
     st.markdown(
         f"""
@@ -286,6 +164,25 @@ def render_locacao_card(row: pd.Series):
         unsafe_allow_html=True
     )
 
+def painel_importacoes(tipo: str):
+    """Tarefas de importação em segundo plano; atualiza sozinho enquanto alguma estiver ativa."""
+    ativas = ha_tarefas_ativas(tipo)
+
+    @st.fragment(run_every=2 if ativas else None)
+    def _painel():
+        tarefas = tarefas_recentes(tipo)
+        if tarefas.empty:
+            return
+        st.markdown("**Importações em segundo plano**")
+        rodando = tarefas[tarefas["status"].isin(ATIVOS)]
+        for _, t in rodando.iterrows():
+            st.progress(float(t["progresso"]), text=f"#{t['id']} {t['arquivo']}: {t['status']} ({t['linhas']} linhas lidas)")
+        st.dataframe(tarefas.drop(columns=["progresso"]), use_container_width=True, hide_index=True)
+        if ativas and rodando.empty:
+            st.rerun()  # terminou: recarrega a página inteira com os dados novos
+
+    _painel()
+
 # ============== MENU LATERAL ========================
 st.sidebar.title("Menu Principal")
 
@@ -325,14 +222,12 @@ if aba == "Dashboard de Ocupação":
     with st.expander("🔍 Filtros", expanded=False):
         st.subheader("Filtros")
         unidades_dash = get_unidades()
-        locacoes_dash = get_locacoes()
-        despesas_dash = get_despesas()
 
         # Filtros de Ano e Mês
         st.subheader("Filtro de Período")
         col1, col2 = st.columns(2)
         with col1:
-            anos = sorted(set(pd.to_datetime(locacoes_dash["checkin"]).dt.year.dropna().unique()))
+            anos = anos_disponiveis("locacoes", "checkin")
             ano_sel = st.selectbox("Ano", anos, index=len(anos) - 1)
         with col2:
             # Adicionar "Todos os Meses" como opção
@@ -358,33 +253,16 @@ if aba == "Dashboard de Ocupação":
             ultimo_dia = monthrange(ano_sel, mes_sel)[1]  # Último dia do
             data_fim = date(ano_sel, mes_sel, ultimo_dia)  # Último dia do mês selecionado
 
-        # Filtrar locações e despesas pelo ano e mês selecionados
-        if  mes_sel == "Todos":
-            locacoes_dash = locacoes_dash[
-                pd.to_datetime(locacoes_dash["checkin"]).dt.year == ano_sel
-            ]
-            despesas_dash = despesas_dash[
-                pd.to_datetime(despesas_dash["data"]).dt.year == ano_sel
-            ]
-        else:
-            locacoes_dash = locacoes_dash[
-                (pd.to_datetime(locacoes_dash["checkin"]).dt.year == ano_sel) &
-                (pd.to_datetime(locacoes_dash["checkin"]).dt.month.isin(meses_filtrados))
-            ]
-            despesas_dash = despesas_dash[
-                (pd.to_datetime(despesas_dash["data"]).dt.year == ano_sel) &
-                (pd.to_datetime(despesas_dash["data"]).dt.month.isin(meses_filtrados))
-            ]
-
         # Filtro de unidades (adiciona multiselect)
         unidades_opts = sorted(unidades_dash["nome"].unique().tolist())
         unidades_sel = st.multiselect("Unidades", unidades_opts, default=unidades_opts)
+        unidades_ids_sel = unidades_dash[unidades_dash["nome"].isin(unidades_sel)]["id"].tolist() if unidades_sel else None
 
-        # Filtra unidades selecionadas
-        if unidades_sel:
-            unidades_ids_sel = unidades_dash[unidades_dash["nome"].isin(unidades_sel)]["id"].tolist()
-            locacoes_dash = locacoes_dash[locacoes_dash["unidade_id"].isin(unidades_ids_sel)]
-            despesas_dash = despesas_dash[despesas_dash["unidade_id"].isin(unidades_ids_sel)]
+        # Carrega só o período (check-in / data da despesa) e as unidades selecionadas
+        locacoes_dash = get_locacoes(inicio=data_inicio, fim=data_fim, por="checkin", unidade_ids=unidades_ids_sel)
+        despesas_dash = get_despesas(
+            inicio=data_inicio, fim=data_fim, unidade_ids=unidades_ids_sel, colunas=["unidade_id", "data", "valor"]
+        )
 
     # ====== Cards Mobile (resumo) ======
     if MOBILE is not None:
@@ -394,23 +272,7 @@ if aba == "Dashboard de Ocupação":
         noites_ocup, taxa = 0, 0.0
 
         # Receita no período (com day-use)
-        if not locacoes_dash.empty:
-            for _, loc in locacoes_dash.iterrows():
-                ci = pd.to_datetime(loc["checkin"]).date()
-                co = pd.to_datetime(loc["checkout"]).date()
-                val = float(loc.get("valor") or 0.0)
-
-                if ci >= co:
-                    # day-use: 1 diária no dia do check-in se dentro da janela
-                    if data_inicio <= ci <= data_fim:
-                        receita_periodo += val
-                else:
-                    noites_totais = (co - ci).days
-                    if noites_totais > 0:
-                        noites_no_periodo = pd.date_range(
-                            max(ci, data_inicio), min(co, data_fim) - pd.Timedelta(days=1), freq="D"
-                        )
-                        receita_periodo += (val / noites_totais) * len(noites_no_periodo)
+        receita_periodo = receita_no_periodo(locacoes_dash, data_inicio, data_fim)
 
         # Despesa no período
         if not despesas_dash.empty:
@@ -437,109 +299,23 @@ if aba == "Dashboard de Ocupação":
         card(c4, "🏨 Ocupação", f"{taxa:.1f}%" " -      " f"{noites_ocup} noites")
 
         # ====== Tabela calendário (desktop/overview) ======
-        dias_periodo = pd.date_range(start=data_inicio, end=data_fim, freq="D")[::-1]
-        dias_str = [d.strftime("%d/%m") for d in dias_periodo]
-
         # Filtra unidades para tabela (NÃO adiciona "Administração" como linha de unidade)
         unidades_dash_filtrado = unidades_dash[unidades_dash["nome"].isin(unidades_sel)] if unidades_sel else unidades_dash
 
-        index_nomes = (
-            unidades_dash_filtrado["nome"].tolist() if not unidades_dash_filtrado.empty else []
-        ) + ["Total R$"]
-
-        valores_num = pd.DataFrame(0.0, index=index_nomes, columns=dias_str)
-        tabela_icon = pd.DataFrame("", index=index_nomes, columns=dias_str)
-
-        if not unidades_dash_filtrado.empty and not locacoes_dash.empty:
-            for _, unidade in unidades_dash_filtrado.iterrows():
-                locs = locacoes_dash[locacoes_dash["unidade_id"] == unidade["id"]]
-                for _, loc in locs.iterrows():
-                    checkin = pd.to_datetime(loc["checkin"]).date()
-                    checkout = pd.to_datetime(loc["checkout"]).date()
-                    valor = float(loc.get("valor", 0) or 0)
-
-                    # ---- DAY-USE: conta 1 diária no dia do check-in ----
-                    if checkin >= checkout:
-                        dias_locados = [checkin]
-                    else:
-                        dr = pd.date_range(checkin, checkout - pd.Timedelta(days=1), freq="D").to_pydatetime()
-                        dias_locados = [d.date() for d in dr]
-
-                    num_diarias = max(1, len(dias_locados))
-                    valor_dia = (valor / num_diarias) if num_diarias > 0 else 0.0
-
-                    # Marca ocupação e soma valor
-                    for d in dias_locados:
-                        dia_str = d.strftime("%d/%m")
-                        if dia_str in dias_str:
-                            tabela_icon.loc[unidade["nome"], dia_str] = "🟧"
-                            valores_num.loc[unidade["nome"], dia_str] += valor_dia
-
-                    # Check-in / Check-out (sem sobrescrever 🟧)
-                    if data_inicio <= checkin <= data_fim:
-                        dia_checkin = checkin.strftime("%d/%m")
-                        if dia_checkin in dias_str and tabela_icon.loc[unidade["nome"], dia_checkin] == "":
-                            tabela_icon.loc[unidade["nome"], dia_checkin] = "🟦"
-                    if data_inicio <= checkout <= data_fim:
-                        dia_checkout = checkout.strftime("%d/%m")
-                        if dia_checkout in dias_str and tabela_icon.loc[unidade["nome"], dia_checkout] == "":
-                            tabela_icon.loc[unidade["nome"], dia_checkout] = "◧"
-
-        # Ocupação diária (evita divisão por zero)
-        denom = max(1, len(unidades_dash_filtrado))
-        ocupacao_diaria = (tabela_icon.apply(lambda col: col.value_counts().get("🟧", 0), axis=0) / denom) * 100
-
-        tabela_visual = tabela_icon.copy()
-        for extra_col in ["Total R$", "Valor Líquido (-13%)", "Total Administradora"]:
-            if extra_col not in tabela_visual.columns:
-                tabela_visual[extra_col] = ""
-
-        tabela_visual.loc["Ocupação (%)"] = ocupacao_diaria.map(lambda v: f"{v:.1f}%")
-
-        # Totais diários apenas das unidades (exclui a linha 'Total R$')
-        linhas_base = [idx for idx in valores_num.index if idx != "Total R$"]
-        valores_num.loc["Total R$", dias_str] = valores_num.loc[linhas_base, dias_str].sum(axis=0)
-
-        # Totais por linha (mês)
-        valores_num["Total R$"] = valores_num[dias_str].sum(axis=1)
-        valores_num["Valor Líquido (-13%)"] = valores_num["Total R$"] * 0.87
-
-        # -------- Coluna "Total Administradora" (por unidade, com % próprio) --------
-        admin_col = pd.Series(0.0, index=valores_num.index, dtype=float)
-        if not unidades_dash_filtrado.empty:
-            meta = unidades_dash_filtrado.set_index("nome")
-            for unit_name in meta.index:
-                admin_flag = str(meta.at[unit_name, "administracao"]) if "administracao" in meta.columns else "Não"
-                raw_pct = meta.at[unit_name, "percentual_administracao"] if "percentual_administracao" in meta.columns else 0.0
-                try:
-                    pct = float(raw_pct)
-                except Exception:
-                    pct = 0.0
-                if pd.isna(pct):
-                    pct = 0.0
-
-                if admin_flag == "Sim" and pct > 0:
-                    admin_col[unit_name] = valores_num.at[unit_name, "Total R$"] * (pct / 100.0)
-                else:
-                    admin_col[unit_name] = 0.0
-
-        # A linha "Total R$" recebe a soma das administrações das unidades
-        admin_col["Total R$"] = float(admin_col.drop(labels=["Total R$"], errors="ignore").sum())
-        valores_num["Total Administradora"] = admin_col
-        # ---------------------------------------------------------------------------
-
-        # Monta visual com valores formatados
-        for r in tabela_icon.index:
-            for c in dias_str:
-                v = float(valores_num.loc[r, c])
-                icone = tabela_icon.loc[r, c]
-                tabela_visual.loc[r, c] = f"{icone} {v:,.2f}".strip() if v > 0 else icone
+        valores_num, tabela_icon, dias_str = calendario_ocupacao(
+            unidades_dash_filtrado, locacoes_dash, data_inicio, data_fim
+        )
+        dias_str = dias_str[::-1]  # dias mais recentes primeiro
 
-        tabela_visual["Total R$"] = valores_num["Total R$"].map(lambda v: f"{v:,.2f}")
-        tabela_visual["Valor Líquido (-13%)"] = valores_num["Valor Líquido (-13%)"].map(lambda v: f"{v:,.2f}")
-        tabela_visual["Total Administradora"] = valores_num["Total Administradora"].map(lambda v: f"{v:,.2f}")
+        totalizar_calendario(valores_num, dias_str)
+        # "Total Administradora" por unidade, com % próprio
+        valores_num["Total Administradora"] = administracao_por_unidade(valores_num["Total R$"], unidades_dash_filtrado)
 
-        tabela_visual = tabela_visual[dias_str + ["Total R$", "Valor Líquido (-13%)", "Total Administradora"]]
+        tabela_visual = formatar_calendario(
+            tabela_icon, valores_num, dias_str, ["Total R$", "Valor Líquido (-13%)", "Total Administradora"]
+        )
+        ocupacao = ocupacao_diaria(tabela_icon, len(unidades_dash_filtrado))
+        tabela_visual.loc["Ocupação (%)"] = ocupacao.map(lambda v: f"{v:.1f}%")
 
         st.markdown(f"**Ocupação Geral ({data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')})**")
         st.dataframe(tabela_visual, use_container_width=True)
@@ -561,25 +337,25 @@ if aba == "Dashboard de Ocupação":
 
     # ====== Próximos movimentos ======
     st.markdown("### 📅 Próximos movimentos (7 dias)")
-    locacoes_dash = get_locacoes()  # garantir que está definido
-    if locacoes_dash.empty:
-        st.info("Sem movimentos no período.")
+    hoje = date.today()
+    ate = hoje + timedelta(days=7)
+    # Só as reservas que tocam a janela [hoje, hoje+7]
+    locacoes_dash = get_locacoes(
+        inicio=hoje, fim=ate, por="sobreposicao", colunas=["checkin", "checkout", "hospede", "plataforma"]
+    )
+    proximos = []
+    for _, loc in locacoes_dash.iterrows():
+        ci = pd.to_datetime(loc["checkin"]).date()
+        co = pd.to_datetime(loc["checkout"]).date()
+        if hoje <= ci <= ate:
+            proximos.append(("🟦 Check-in", ci, loc))
+        if hoje <= co <= ate:
+            proximos.append(("◧ Check-out", co, loc))
+    if not proximos:
+        st.info("Nada planejado para os próximos 7 dias.")
     else:
-        hoje = date.today()
-        ate = hoje + timedelta(days=7)
-        proximos = []
-        for _, loc in locacoes_dash.iterrows():
-            ci = pd.to_datetime(loc["checkin"]).date()
-            co = pd.to_datetime(loc["checkout"]).date()
-            if hoje <= ci <= ate:
-                proximos.append(("🟦 Check-in", ci, loc))
-            if hoje <= co <= ate:
-                proximos.append(("◧ Check-out", co, loc))
-        if not proximos:
-            st.info("Nada planejado para os próximos 7 dias.")
-        else:
-            for tipo, dia, loc in sorted(proximos, key=lambda x: x[1]):
-                st.write(f"{tipo} • {dia.strftime('%d/%m/%Y')} • {loc.get('hospede','')} • {loc.get('plataforma','')}")
+        for tipo, dia, loc in sorted(proximos, key=lambda x: x[1]):
+            st.write(f"{tipo} • {dia.strftime('%d/%m/%Y')} • {loc.get('hospede','')} • {loc.get('plataforma','')}")
 
 # =========================
 #  RELATÓRIO: NOITES POR DIA
@@ -589,53 +365,26 @@ if aba == "Noites Reservadas":
 
     # Carrega dados
     unidades_df = get_unidades()
-    locacoes_df = get_locacoes()
+    locacoes_df = get_locacoes(colunas=["id"])
 
     if unidades_df.empty or locacoes_df.empty:
         st.info("Cadastre unidades e locações para visualizar este relatório.")
     else:
-        # Junta para ter o nome da unidade
-        loc = locacoes_df.merge(unidades_df, left_on="unidade_id", right_on="id", suffixes=("", "_u"))
-
-        # Converte datas
-        loc["checkin"] = pd.to_datetime(loc["checkin"], errors="coerce")
-        loc["checkout"] = pd.to_datetime(loc["checkout"], errors="coerce")
-        loc = loc.dropna(subset=["checkin", "checkout"])
-
-        # Expande reserva em noites (cada dia entre checkin e checkout-1)
-        registros = []
-        for _, r in loc.iterrows():
-            ci = r["checkin"].date()
-            co = r["checkout"].date()
-            if ci >= co:
-                continue
-            nights = pd.date_range(ci, co - pd.Timedelta(days=1), freq="D")
-            for d in nights:
-                registros.append({"data_noite": d.date()})
-
-        if not registros:
+        # Noites (sem day-use) já somadas por unidade/mês no banco, a partir da tabela noites
+        noites_mes = noites_por_mes()
+
+        if noites_mes.empty:
             st.info("Não há noites reservadas para o período atual dos dados.")
         else:
-            nights_df = pd.DataFrame(registros)
-            nights_df["ano"] = pd.to_datetime(nights_df["data_noite"]).dt.year
-            nights_df["mes_num"] = pd.to_datetime(nights_df["data_noite"]).dt.month
-
             # Filtros
-            anos = sorted(nights_df["ano"].unique().tolist())
+            anos = sorted(noites_mes["ano"].unique().tolist())
             col_f1, col_f2 = st.columns([1, 3])
             with col_f1:
                 ano_sel = st.selectbox("Ano", anos, index=len(anos) - 1)
 
-            df_f = nights_df[(nights_df["ano"] == ano_sel)]
-
-            # Agrupa por mês
-            agg = df_f.groupby("mes_num").size().reset_index(name="noites")
-
-            # Meses (PT-BR)
-            mes_label = {1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun",
-                         7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"}
-            agg["mes"] = agg["mes_num"].map(mes_label)
-            ordem_meses = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+            # Agrupa por mês (memoizado por ano e versão dos dados)
+            agg = noites_reservadas_por_mes(ano_sel)
+            ordem_meses = MESES_ABREV
 
             # Gráfico
             fig = px.bar(
@@ -663,24 +412,13 @@ elif aba == "Relatório de Despesas":
     st.header("Despesas por Mês e Tipo")
 
     unidades_df = get_unidades()
-    despesas_df = get_despesas()
+    despesas_df = get_despesas(colunas=["id"])
 
     if unidades_df.empty or despesas_df.empty:
         st.info("Cadastre unidades e despesas para visualizar este relatório.")
     else:
-        # Merge despesas com unidades para ter nome
-        des = despesas_df.merge(unidades_df, left_on="unidade_id", right_on="id", suffixes=("", "_u"))
-        des["data"] = pd.to_datetime(des["data"], errors="coerce")
-        des = des.dropna(subset=["data"])
-        des["ano"] = des["data"].dt.year
-        des["mes_num"] = des["data"].dt.month
-        des["nome_mes"] = des["mes_num"].map({
-            1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun",
-            7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"
-        })
-
         # ---- Filtros ----
-        anos = sorted(des["ano"].unique())
+        anos, tipos_opts = opcoes_despesas()
         c1, c2, c3 = st.columns([1, 1, 2])
         with c1:
             ano_sel = st.selectbox("Ano", anos, index=len(anos) - 1)
@@ -693,18 +431,10 @@ elif aba == "Relatório de Despesas":
                 format_func=lambda x: "Todos" if x == "Todos" else f"{x} - {['Jan','Fev','Mar','Abr','Mai','Jun','Jul','Ago','Set','Out','Nov','Dez'][int(x)-1]}"
             )
         with c3:
-            tipos_opts = sorted(des["tipo"].dropna().unique()) if "tipo" in des.columns else []
             tipo_sel = st.multiselect("Tipo de Despesa", tipos_opts, default=tipos_opts)
 
-        # Aplicar filtros
-        df_f = des[des["ano"] == ano_sel].copy()
-        if mes_sel != "Todos":
-            df_f = df_f[pd.to_datetime(df_f["data"]).dt.month == int(mes_sel)]
-        if tipo_sel:
-            df_f = df_f[df_f["tipo"].isin(tipo_sel)]
-
-        # Tabela dinâmica (agregada por mês e tipo)
-        tabela_agg = df_f.groupby(["nome_mes", "tipo"], as_index=False)["valor"].sum()
+        # Tabela dinâmica (agregada por mês e tipo, memoizada pelos filtros)
+        tabela_agg = despesas_por_mes_tipo(ano_sel, None if mes_sel == "Todos" else int(mes_sel), tipo_sel)
         tabela_agg = tabela_agg.pivot_table(index="nome_mes", columns="tipo", values="valor", fill_value=0)
 
         # Gráfico de barras empilhadas
@@ -727,40 +457,14 @@ elif aba == "Análise de Receita e Lucro":
     st.header("Análise de Receita x Despesa com Lucro (por mês).")
 
     unidades_df = get_unidades()
-    locacoes_df = get_locacoes()
-    despesas_df = get_despesas()
+    locacoes_df = get_locacoes(colunas=["id"])
+    despesas_df = get_despesas(colunas=["id"])
 
     if unidades_df.empty or (locacoes_df.empty and despesas_df.empty):
         st.info("Cadastre unidades, locações e despesas para visualizar este relatório.")
     else:
-        # Filtrar unidades com status diferente de "Manutenção"
-        unidades_df = unidades_df[unidades_df["status"] != "Manutenção"]
-
-        # ---- Preparo base: juntar nome da unidade em locações e despesas ----
-        if not locacoes_df.empty:
-            loc = locacoes_df.merge(unidades_df, left_on="unidade_id", right_on="id", suffixes=("", "_u"))
-            loc["checkin"] = pd.to_datetime(loc["checkin"], errors="coerce")
-            loc = loc.dropna(subset=["checkin"])
-            loc["ano"] = loc["checkin"].dt.year
-            loc["mes_num"] = loc["checkin"].dt.month
-            loc["nome_unidade"] = loc["nome"]
-        else:
-            loc = pd.DataFrame(columns=["nome_unidade", "ano", "mes_num", "valor"])
-
-        if not despesas_df.empty:
-            des = despesas_df.merge(unidades_df, left_on="unidade_id", right_on="id", suffixes=("", "_u"))
-            des["data"] = pd.to_datetime(des["data"], errors="coerce")
-            des = des.dropna(subset=["data"])
-            des["ano"] = des["data"].dt.year
-            des["mes_num"] = des["data"].dt.month
-            des["nome_unidade"] = des["nome"]
-        else:
-            des = pd.DataFrame(columns=["nome_unidade", "ano", "mes_num", "valor"])
-
-        # ---- Filtros (Ano + Unidades) ----
-        anos_loc = loc["ano"].unique().tolist() if not loc.empty else []
-        anos_des = des["ano"].unique().tolist() if not des.empty else []
-        anos = sorted(set(anos_loc + anos_des))
+        # ---- Filtros (Ano + Unidades), sem unidades em manutenção ----
+        anos, unidades_opts = opcoes_receita_lucro()
         if not anos:
             st.info("Não há dados de anos para agrupar.")
         else:
@@ -768,39 +472,11 @@ elif aba == "Análise de Receita e Lucro":
             with c1:
                 ano_sel = st.selectbox("Ano", anos, index=len(anos) - 1)
             with c2:
-                unidades_opts = sorted(unidades_df["nome"].unique().tolist())
                 unidades_sel = st.multiselect("Unidades", unidades_opts, default=unidades_opts)
 
-            # Aplica filtros
-            loc_f = loc[loc["ano"] == ano_sel].copy()
-            des_f = des[des["ano"] == ano_sel].copy()
-            if unidades_sel:
-                loc_f = loc_f[loc_f["nome_unidade"].isin(unidades_sel)]
-                des_f = des_f[des_f["nome_unidade"].isin(unidades_sel)]
-
-            # ---- Agregações por mês ----
-            receita_m = (
-                loc_f.groupby("mes_num")["valor"].sum().rename("Receita").reset_index()
-                if not loc_f.empty else pd.DataFrame({"mes_num": [], "Receita": []})
-            )
-            despesa_m = (
-                des_f.groupby("mes_num")["valor"].sum().rename("Despesa").reset_index()
-                if not des_f.empty else pd.DataFrame({"mes_num": [], "Despesa": []})
-            )
-
-            # Grade completa Jan..Dez para mostrar zeros
-            base_meses = pd.DataFrame({"mes_num": list(range(1, 12 + 1))})
-            dfm = base_meses.merge(receita_m, on="mes_num", how="left") \
-                            .merge(despesa_m, on="mes_num", how="left")
-            dfm["Receita"] = dfm["Receita"].fillna(0.0)
-            dfm["Despesa"] = dfm["Despesa"].fillna(0.0)
-            dfm["Lucro"] = dfm["Receita"] - dfm["Despesa"]
-
-            mes_label = {1: "Jan", 2: "Fev", 3: "Mar", 4: "Abr", 5: "Mai", 6: "Jun",
-                         7: "Jul", 8: "Ago", 9: "Set", 10: "Out", 11: "Nov", 12: "Dez"}
-            ordem_meses = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
-            dfm["Mês"] = dfm["mes_num"].map(mes_label)
-            dfm = dfm.sort_values("mes_num")
+            # ---- Agregações por mês (grade Jan..Dez com zeros), memoizadas pelos filtros ----
+            dfm = receita_lucro_por_mes(ano_sel, unidades_sel)
+            ordem_meses = MESES_ABREV
 
             # ---- Gráfico combinado (barras + linha) ----
             fig = go.Figure()
@@ -833,28 +509,16 @@ elif aba == "Administradora":
     
     # Carregar dados
     unidades_df = get_unidades()
-    locacoes_df = get_locacoes()
+    anos = anos_disponiveis("locacoes", "checkin", "checkout")
 
-    if unidades_df.empty or locacoes_df.empty:
+    if unidades_df.empty or not anos:
         st.info("Cadastre unidades e locações para visualizar este relatório.")
     else:
         # Filtrar unidades com Administração = "Sim"
         unidades_admin = unidades_df[unidades_df["administracao"] == "Sim"]
 
-        # Merge locações com unidades para obter nome e % administração
-        loc = locacoes_df.merge(
-            unidades_admin[["id", "nome", "administracao", "percentual_administracao"]],
-            left_on="unidade_id", right_on="id", how="left", suffixes=("", "_u")
-        )
-
-        # Converte datas
-        loc["checkin"] = pd.to_datetime(loc["checkin"], errors="coerce").dt.date
-        loc["checkout"] = pd.to_datetime(loc["checkout"], errors="coerce").dt.date
-        loc = loc.dropna(subset=["checkin", "checkout"])
-
         # ----- Filtros -----
-        anos = sorted(set([d.year for d in loc["checkin"]] + [d.year for d in loc["checkout"]]))
-        plataformas_disponiveis = sorted(loc["plataforma"].dropna().unique())  # Plataformas disponíveis
+        plataformas_disponiveis = valores_distintos("locacoes", "plataforma")  # Plataformas disponíveis
         col1, col2, col3, col4 = st.columns([1, 1, 2, 2])
         with col1:
             ano_sel = st.selectbox("Ano", anos, index=len(anos) - 1)
@@ -880,64 +544,19 @@ elif aba == "Administradora":
             periodo_str = f"{mes_sel:02}/{ano_sel}"
             nome_mes = f"{mes_sel:02}"
 
-        # Mantém apenas reservas cujo checkout está no período selecionado
-        loc_f = loc[(loc["checkout"] >= period_start) & (loc["checkout"] <= period_end)].copy()
-
-        # Aplicar filtros adicionais
-        if unidades_sel:
-            loc_f = loc_f[loc_f["nome"].isin(unidades_sel)]
-        if "Todas" not in plataformas_sel:
-            loc_f = loc_f[loc_f["plataforma"].isin(plataformas_sel)]
+        # Reservas cujo checkout está no período, já filtradas por unidade e plataforma,
+        # com os cálculos por reserva (memoizados pelos filtros)
+        loc_f = administradora_periodo(
+            period_start, period_end,
+            unidade_ids=unidades_admin[unidades_admin["nome"].isin(unidades_sel)]["id"].tolist() if unidades_sel else None,
+            plataformas=None if "Todas" in plataformas_sel else plataformas_sel,
+        )
 
         if loc_f.empty:
             st.warning("Não há dados para os filtros selecionados.")
         else:
-            # ---- Cálculos por reserva (linhas da tabela) ----
-            def noites_no_periodo(ci: date, co: date) -> int:
-                # day-use: checkin >= checkout conta 1 se o check-in cair no período
-                if ci >= co:
-                    return 1 if (period_start <= ci <= period_end) else 0
-                ini = max(ci, period_start)
-                fim = min(co, period_end)
-                return max(0, (fim - ini).days)
-
-            def valor_periodo(row) -> float:
-                ci, co = row["checkin"], row["checkout"]
-                total = float(row.get("valor") or 0.0)
-                total_noites = 1 if ci >= co else max(1, (co - ci).days)
-                v_dia = total / total_noites
-                return v_dia * noites_no_periodo(ci, co)
-
-            def valor_adm(row, v_liquido) -> float:
-                flag = str(row.get("administracao", "Não"))
-                pct = row.get("percentual_administracao", 0.0)
-                try:
-                    pct = float(pct)
-                except Exception:
-                    pct = 0.0
-                if pd.isna(pct):
-                    pct = 0.0
-
-                return v_liquido * (pct / 100.0) if (flag == "Sim" and pct > 0) else 0.0
-
-            loc_f["Qtde de Noites"] = loc_f.apply(lambda r: noites_no_periodo(r["checkin"], r["checkout"]), axis=1)
-            loc_f["Valor total bruto"] = loc_f.apply(valor_periodo, axis=1)
-            loc_f["Valor total líquido"] = loc_f["Valor total bruto"] * 0.87  # Subtraindo 13%
-            loc_f["Valor administração"] = loc_f.apply(lambda r: valor_adm(r, r["Valor total líquido"]), axis=1)
-
             # Monta a tabela final
-            tabela = loc_f.rename(columns={
-                "nome": "Unidade",
-                "checkin": "Check-in",
-                "checkout": "Check-out",
-                "plataforma": "Plataforma",
-                "hospede": "Hóspede"
-            })
-            tabela = tabela[[
-                "Unidade", "Hóspede", "Plataforma", "Check-in", "Check-out",
-                "Qtde de Noites", "Valor total bruto", "Valor total líquido", "Valor administração"
-            ]]
-            tabela = tabela.sort_values(["Unidade", "Check-in", "Check-out"]).reset_index(drop=True)
+            tabela = tabela_administradora(loc_f)
 
             # Totais do período 
             tot_noites = int(tabela["Qtde de Noites"].sum())
@@ -947,18 +566,7 @@ elif aba == "Administradora":
             st.caption(f"Totais no período — Noites: {tot_noites} • Valor Bruto: R$ {tot_valor_bruto:,.2f} • Valor Líquido: R$ {tot_valor_liquido:,.2f} • Administração: R$ {tot_adm:,.2f}")
 
             # Adicionar linha de totais
-            totais = {
-                "Unidade": "Total",
-                "Hóspede": "",
-                "Plataforma": "",
-                "Check-in": "",
-                "Check-out": "",
-                "Qtde de Noites": tabela["Qtde de Noites"].sum(),
-                "Valor total bruto": tabela["Valor total bruto"].sum(),
-                "Valor total líquido": tabela["Valor total líquido"].sum(),
-                "Valor administração": tabela["Valor administração"].sum(),
-            }
-            tabela = pd.concat([tabela, pd.DataFrame([totais])], ignore_index=True)
+            tabela = com_linha_total(tabela)
 
             # Exibir com formatação monetária
             tabela_fmt = tabela.copy()
@@ -978,30 +586,8 @@ elif aba == "Administradora":
             with colw3:
                 detalhar = st.checkbox("Detalhar reservas", value=False, help="Inclui cada linha da tabela na mensagem")
 
-            def br_money(v: float) -> str:
-                return f"R$ {v:,.2f}"
-
             # Monta a mensagem com base nos dados filtrados
-            linhas = [
-                f"Relatório da Administradora — Período: {periodo_str}",
-                f"Noites: {int(loc_f['Qtde de Noites'].sum())}",
-
-
-                f"Valor total líquido: {br_money(loc_f['Valor total líquido'].sum())}",
-                f"Valor administração: {br_money(loc_f['Valor administração'].sum())}",
-            ]
-
-            if detalhar:
-                linhas.append("")
-                linhas.append("Detalhes por reserva:")
-                for _, r in loc_f.iterrows():
-                    linhas.append(
-                        f"- {r['nome']} | {r['plataforma']} | {r['checkin'].strftime('%d/%m/%Y')}→{r['checkout'].strftime('%d/%m/%Y')} | "
-                        f"Noites: {int(r['Qtde de Noites'])} | Valor bruto: {br_money(r['Valor total bruto'])} | "
-                        f"Valor líquido: {br_money(r['Valor total líquido'])} | Administração: {br_money(r['Valor administração'])}"
-                    )
-
-            msg = "\n".join(linhas)
+            msg = mensagem_administradora(loc_f, periodo_str, detalhar)
 
             cbtn1, cbtn2 = st.columns(2)
             with cbtn1:
@@ -1024,41 +610,48 @@ elif aba == "Administradora":
             with st.expander("Pré-visualizar mensagem"):
                 st.text(msg)
 
+        # --------- Fechamento em lote (todas as unidades x meses do filtro) ---------
+        st.subheader("Fechamento em lote")
+        st.caption(
+            f"Demonstrativo de cada unidade em cada mês do filtro ({'ano todo' if mes_sel == 'Todos' else periodo_str}), "
+            "com as unidades e plataformas selecionadas: CSV, XLSX, HTML e a mensagem de WhatsApp/e-mail de cada um, num ZIP."
+        )
+        detalhar_lote = st.checkbox("Detalhar reservas nas mensagens", value=False, key="detalhar_lote")
+        if st.button("Gerar demonstrativos", key="gerar_lote"):
+            locacoes_ano = get_locacoes(
+                inicio=date(ano_sel, 1, 1), fim=date(ano_sel, 12, 31), por="checkout",
+                unidade_ids=unidades_admin[unidades_admin["nome"].isin(unidades_sel)]["id"].tolist() if unidades_sel else None,
+                plataformas=None if "Todas" in plataformas_sel else plataformas_sel,
+            )
+            lote = administradora_em_lote(
+                locacoes_ano, unidades_df, ano_sel, meses=None if mes_sel == "Todos" else [mes_sel], por="checkout"
+            )
+            if lote.empty:
+                st.warning("Não há reservas para os filtros selecionados.")
+            else:
+                pacote, indice = pacote_administradora(lote, ano_sel, com_hospede=True, detalhar=detalhar_lote)
+                st.success(f"{len(indice)} demonstrativos gerados.")
+                st.download_button(
+                    label="📦 Baixar demonstrativos (ZIP)",
+                    data=pacote,
+                    file_name=f"demonstrativos_administradora_{ano_sel}_{nome_mes}.zip",
+                    mime="application/zip"
+                )
+                st.dataframe(indice.drop(columns=["Arquivo", "Mensagem"]), use_container_width=True)
+
 # ============== RELATÓRIO DE GANHOS ANUAIS ========================
 # ---- Filtros ----
 elif aba == "Relatório de Ganhos Anuais":
     st.header("Ganhos e Despesas Anuais por Unidade e Ano")
 
-    # Carregar dados
+    # Carregar dados: somas por unidade/ano/mês já agregadas no banco (não as linhas)
     unidades_df = get_unidades()
-    locacoes_df = get_locacoes()
-    despesas_df = get_despesas()
+    locacoes = ganhos_por_mes("locacoes", date.today())  # por check-in
+    despesas = ganhos_por_mes("despesas", date.today())
 
-    if unidades_df.empty or (locacoes_df.empty and despesas_df.empty):
+    if unidades_df.empty or (locacoes.empty and despesas.empty):
         st.info("Cadastre unidades, locações e despesas para visualizar este relatório.")
     else:
-        # ---------- BASES ----------
-        # Locações + nome da unidade
-        locacoes = locacoes_df.merge(
-            unidades_df, left_on="unidade_id", right_on="id", suffixes=("", "_u")
-        )
-        locacoes["checkin"] = pd.to_datetime(locacoes["checkin"], errors="coerce")
-        locacoes["checkout"] = pd.to_datetime(locacoes["checkout"], errors="coerce")
-        locacoes = locacoes.dropna(subset=["checkin", "checkout"])
-        locacoes["ano"] = locacoes["checkin"].dt.year
-        locacoes["mes"] = locacoes["checkin"].dt.month
-        locacoes["valor"] = locacoes["valor"].fillna(0.0)
-
-        # Despesas + nome da unidade
-        despesas = despesas_df.merge(
-            unidades_df, left_on="unidade_id", right_on="id", suffixes=("", "_u")
-        )
-        despesas["data"] = pd.to_datetime(despesas["data"], errors="coerce")
-        despesas = despesas.dropna(subset=["data"])
-        despesas["ano"] = despesas["data"].dt.year
-        despesas["mes"] = despesas["data"].dt.month
-        despesas["valor"] = despesas["valor"].fillna(0.0)
-
         # ---------- FILTROS ----------
         ano_atual = date.today().year
         anos_loc = locacoes["ano"].unique().tolist() if not locacoes.empty else []
@@ -1094,74 +687,16 @@ elif aba == "Relatório de Ganhos Anuais":
             meses_filtrados = meses_sel
 
         # ---------- BASE ANUAL (FILTRADA POR ANO, MÊS E DATAS FUTURAS) ----------
-        hoje = date.today()  # Data atual
-
-        # Filtrar locações para incluir registros futuros
-        loc_base = locacoes[
-            ((locacoes["ano"].isin(anos_sel)) & (locacoes["mes"].isin(meses_filtrados))) |
-            (locacoes["checkin"].dt.date >= hoje)  # Inclui registros com check-in futuro
-        ].copy()
-
-        # Filtrar despesas para incluir registros futuros
-        desp_base = despesas[
-            ((despesas["ano"].isin(anos_sel)) & (despesas["mes"].isin(meses_filtrados))) |
-            (despesas["data"].dt.date >= hoje)  # Inclui registros com data futura
-        ].copy()
-
-        if unidades_sel:
-            loc_base = loc_base[loc_base["nome"].isin(unidades_sel)]
-            desp_base = desp_base[desp_base["nome"].isin(unidades_sel)]
-
-        # Agregações por ano e unidade
-        ganhos_por_unidade_ano = (
-            loc_base.groupby(["nome", "ano"], as_index=False)["valor"]
-            .sum()
-            .rename(columns={"nome": "Unidade", "ano": "Ano", "valor": "Ganhos (R$)"})
-        )
-        despesas_por_unidade_ano = (
-            desp_base.groupby(["nome", "ano"], as_index=False)["valor"]
-            .sum()
-            .rename(columns={"nome": "Unidade", "ano": "Ano", "valor": "Despesas (R$)"})
-        )
-
-        ganhos_despesas = pd.merge(
-            ganhos_por_unidade_ano,
-            despesas_por_unidade_ano,
-            on=["Unidade", "Ano"],
-            how="outer"
-        ).fillna(0.0)
-        ganhos_despesas["Lucro (R$)"] = (
-            ganhos_despesas["Ganhos (R$)"] - ganhos_despesas["Despesas (R$)"]
+        # Pivot anual com totais por unidade e "Total Geral", totais do ano vigente e a visão
+        # por meses (esta NÃO altera a soma anual); tudo memoizado pelos filtros
+        tabela_pivot, ganhos_despesas, vis_mes, ganhos_ano_vigente, despesas_ano_vigente_val = ganhos_anuais(
+            anos_sel, unidades_sel, date.today(), meses=meses_filtrados,
+            meses_visao=meses_sel if meses_sel and len(meses_sel) < 12 else None,
         )
 
-        # Pivot anual
-        tabela_pivot = ganhos_despesas.pivot(
-            index="Unidade",
-            columns="Ano",
-            values=["Ganhos (R$)", "Despesas (R$)", "Lucro (R$)"]
-        ).fillna(0.0)
-
-        # Totais por unidade
-        tabela_pivot[("Total por Unidade", "Ganhos (R$)")] = tabela_pivot["Ganhos (R$)"].sum(axis=1)
-        tabela_pivot[("Total por Unidade", "Despesas (R$)")] = tabela_pivot["Despesas (R$)"].sum(axis=1)
-        tabela_pivot[("Total por Unidade", "Lucro (R$)")] = tabela_pivot["Lucro (R$)"].sum(axis=1)
-
-        # Totais gerais por ano
-        totais_gerais = tabela_pivot.sum(axis=0).to_frame().T
-        totais_gerais.index = ["Total Geral"]
-        tabela_pivot = pd.concat([tabela_pivot, totais_gerais])
-
         st.dataframe(tabela_pivot.style.format("R$ {:,.2f}"), use_container_width=True)
 
         # ---------- Totais do ano vigente (FILTRADO POR MÊS) ----------
-        locacoes_ano_vigente = locacoes[
-            (locacoes["ano"] == ano_atual) & (locacoes["mes"].isin(meses_filtrados))
-        ]
-        despesas_ano_vigente = despesas[
-            (despesas["ano"] == ano_atual) & (despesas["mes"].isin(meses_filtrados))
-        ]
-        ganhos_ano_vigente = locacoes_ano_vigente["valor"].sum()
-        despesas_ano_vigente_val = despesas_ano_vigente["valor"].sum()
         lucro_ano_vigente = ganhos_ano_vigente - despesas_ano_vigente_val
 
         st.subheader(f"Totais do Ano Vigente ({ano_atual})")
@@ -1169,28 +704,6 @@ elif aba == "Relatório de Ganhos Anuais":
         st.metric("Despesas do Ano", f"R$ {despesas_ano_vigente_val:,.2f}")
         st.metric("Lucro do Ano", f"R$ {lucro_ano_vigente:,.2f}")
 
-        # ---------- (Opcional) Visão por meses (NÃO altera soma anual) ----------
-        if meses_sel and len(meses_sel) < 12:
-            loc_mes = loc_base[loc_base["checkin"].dt.month.isin(meses_sel)].copy()
-            desp_mes = desp_base[desp_base["data"].dt.month.isin(meses_sel)].copy()
-
-            gd_mes = (
-                loc_mes.groupby(["nome", "ano"], as_index=False)["valor"]
-                .sum()
-                .rename(columns={"nome": "Unidade", "ano": "Ano", "valor": "Ganhos (R$)"})
-            )
-            dd_mes = (
-                desp_mes.groupby(["nome", "ano"], as_index=False)["valor"]
-                .sum()
-                .rename(columns={"nome": "Unidade", "ano": "Ano", "valor": "Despesas (R$)"})
-            )
-            vis_mes = pd.merge(gd_mes, dd_mes, on=["Unidade", "Ano"], how="outer").fillna(0.0)
-        
-            
-        else:
-            
-            vis_mes = ganhos_despesas.copy()
-
         # Gráfico
         df_long = vis_mes.melt(
             id_vars=["Unidade", "Ano"],
@@ -1233,8 +746,8 @@ elif aba == "Cadastro de Unidades":
         ) if administracao == "Sim" else 0.0
         enviar = st.form_submit_button("Cadastrar", use_container_width=MOBILE)
         if enviar and nome:
+            conn = conectar()
             try:
-                conn = conectar()
                 conn.execute(
                     """
                     INSERT INTO unidades (nome, localizacao, capacidade, status, administracao, percentual_administracao)
@@ -1252,27 +765,19 @@ elif aba == "Cadastro de Unidades":
     st.subheader("Unidades Cadastradas")
     unidades = get_unidades()
     if not unidades.empty:
-        edited_df = st.data_editor(
-            unidades[["id", "nome", "localizacao", "capacidade", "status", "administracao", "percentual_administracao"]],
-            num_rows="dynamic", use_container_width=True, key="editor_unidades"
-        )
+        grade = unidades[["id", "nome", "localizacao", "capacidade", "status", "administracao", "percentual_administracao"]]
+        st.data_editor(grade, num_rows="dynamic", use_container_width=True, key="editor_unidades")
         if st.button("Salvar Alterações nas Unidades"):
+            # Só as linhas alteradas, incluídas ou removidas no editor vão para o banco
+            colunas = ["nome", "localizacao", "capacidade", "status", "administracao", "percentual_administracao"]
+            editadas, novas, excluidas = mudancas_editor(st.session_state.get("editor_unidades"), grade, colunas)
             conn = conectar()
             try:
-                for _, row in edited_df.iterrows():
-                    conn.execute(
-                        """
-                        UPDATE unidades
-                        SET nome=?, localizacao=?, capacidade=?, status=?, administracao=?, percentual_administracao=?
-                        WHERE id=?
-                        """,
-                        (
-                            row["nome"], row["localizacao"], int(row["capacidade"]), row["status"],
-                            row["administracao"], float(row["percentual_administracao"]), int(row["id"])
-                        )
-                    )
-                conn.commit()
-                st.success("Alterações salvas!")
+                alt, inc, exc = gravar_mudancas(
+                    conn, "unidades", colunas, editadas, novas, excluidas,
+                    conversores={"capacidade": int, "percentual_administracao": float},
+                )
+                st.success(f"Alterações salvas! ({alt} alteradas, {inc} incluídas, {exc} excluídas)")
             except Exception as e:
                 st.error(f"Erro ao salvar alterações: {e}")
             finally:
@@ -1325,113 +830,78 @@ elif aba == "Locações":
         if enviar and unidade:
             unidade_id = int(unidades.loc[unidades["nome"] == unidade, "id"].values[0])
             conn = conectar()
-            conn.execute(
-                "INSERT INTO locacoes (unidade_id, checkin, checkout, hospede, valor, plataforma, status_pagamento) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (unidade_id, str(checkin), str(checkout), hospede, valor, plataforma, status_pagamento)
-            )
-            conn.commit()
-            conn.close()
-            st.success("Locação cadastrada!")
+            try:
+                # Uma consulta no índice (unidade_id, checkin, checkout) antes de gravar
+                conflitos = conflitos_reserva(conn, unidade_id, checkin, checkout)
+                if conflitos.empty:
+                    conn.execute(
+                        "INSERT INTO locacoes (unidade_id, checkin, checkout, hospede, valor, plataforma, status_pagamento) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (unidade_id, str(checkin), str(checkout), hospede, valor, plataforma, status_pagamento)
+                    )
+                    aplicar_pendencias(conn)
+                    conn.commit()
+            finally:
+                conn.close()
+            if conflitos.empty:
+                st.success("Locação cadastrada!")
+            else:
+                st.error("Já existe reserva nessas noites para esta unidade. A locação não foi cadastrada.")
+                st.dataframe(conflitos, use_container_width=True)
 
     # ------ Importação CSV com ; ------
     st.subheader("Importar Locações (CSV com ;)")
 
     modo_import = st.radio(
-        "Modo de importação", ["Acrescentar (append)", "Sobrescrever (limpar antes)"],
+        "Modo de importação", ["Acrescentar (append)", "Sobrescrever (limpar antes)", "Atualizar pelo código da reserva (upsert)"],
         horizontal=not MOBILE
     )
+    if modo_import == "Sobrescrever (limpar antes)":
+        st.warning(AVISO_SOBRESCREVER_LOCACOES)
     csv_file = st.file_uploader("Selecione o CSV", type=["csv"])
     if csv_file is not None:
-        try:
-            df_csv = pd.read_csv(csv_file, sep=";", encoding="latin-1", dtype=str)
-        except UnicodeDecodeError:
-            df_csv = pd.read_csv(csv_file, sep=";", encoding="utf-8-sig", dtype=str)
-
-        df_csv.columns = [c.strip().lower() for c in df_csv.columns]
-        df_csv = df_csv.applymap(lambda x: x.strip() if isinstance(x, str) else x)
-
-        alias = {
-            "unidade": ["unidade", "unit", "nome_unidade", "apto", "apartamento", "imovel", "imóvel"],
-            "checkin": ["checkin", "check-in", "data_checkin", "entrada", "inicio", "início"],
-            "checkout": ["checkout", "check-out", "data_checkout", "saida", "saída", "fim", "final"],
-            "hospede": ["hospede", "hóspede", "cliente", "nome_hospede"],
-            "valor": ["valor", "valor_total", "preco", "preço", "amount", "price"],
-            "plataforma": ["plataforma", "canal", "origem"],
-            "status_pagamento": ["status_pagamento", "pagamento", "status", "payment_status"]
-        }
-        def pick(col_alts):
-            for c in col_alts:
-                if c in df_csv.columns:
-                    return c
-            return None
-        selected = {k: pick(v) for k, v in alias.items()}
-        rename_map = {v: k for k, v in selected.items() if v is not None}
-        df_csv = df_csv.rename(columns=rename_map)
-
-        obrigatorias = ["unidade", "checkin", "checkout"]
-        faltando = [c for c in obrigatorias if c not in df_csv.columns]
+        # Arquivos grandes: prévia só do primeiro bloco; a importação lê o resto em blocos
+        em_blocos = csv_file.size > CSV_EM_BLOCOS_BYTES
+        df_csv = primeiro_bloco_csv(csv_file) if em_blocos else ler_csv_locacoes(csv_file)
+        faltando = colunas_faltando(df_csv, OBRIGATORIAS_LOCACOES)
         st.info(f"Colunas lidas: {list(df_csv.columns)}")
 
         if faltando:
             st.error(f"Faltam colunas obrigatórias no CSV: {', '.join(faltando)}")
         else:
-            for col in ["checkin", "checkout"]:
-                df_csv[col] = pd.to_datetime(df_csv[col], dayfirst=True, errors="coerce").dt.date
-
-            if "valor" in df_csv.columns:
-                df_csv["valor"] = parse_valor_series(df_csv["valor"])
-            else:
-                df_csv["valor"] = 0.0
-
-            if "plataforma" not in df_csv.columns:
-                df_csv["plataforma"] = "Direto"
-            else:
-                df_csv["plataforma"] = df_csv["plataforma"].fillna("Direto").astype(str)
-
-            if "status_pagamento" not in df_csv.columns:
-                df_csv["status_pagamento"] = "Pendente"
-            else:
-                df_csv["status_pagamento"] = df_csv["status_pagamento"].fillna("Pendente").astype(str)
+            df_csv = preparar_locacoes(df_csv)
+            if em_blocos:
+                st.info(
+                    f"Arquivo grande: a prévia e as sobreposições abaixo cobrem só as primeiras {len(df_csv)} linhas. "
+                    "A importação lê o arquivo inteiro em blocos."
+                )
 
             st.dataframe(
                 df_csv[["unidade","hospede","checkin","checkout","valor","plataforma","status_pagamento"]].head(20),
                 use_container_width=True, height=360
             )
 
+            # Sobreposições são mostradas antes de gravar; essas linhas são puladas na importação
+            conflitos = conflitos_locacoes(
+                df_csv, get_unidades(), sobrescrever=modo_import == "Sobrescrever (limpar antes)",
+                atualizar=modo_import.startswith("Atualizar"),
+            )
+            if not conflitos.empty:
+                st.warning(f"{len(conflitos)} linha(s) se sobrepõem a outra reserva da mesma unidade e serão puladas.")
+                st.dataframe(conflitos, use_container_width=True)
+
             if st.button("Importar para o sistema", use_container_width=MOBILE):
                 unidades_df = get_unidades()
                 if unidades_df.empty:
                     st.error("Não há unidades cadastradas. Cadastre antes de importar.")
                 else:
-                    conn = conectar(); cur = conn.cursor()
-                    if modo_import == "Sobrescrever (limpar antes)":
-                        cur.execute("DELETE FROM locacoes")
-                        conn.commit()
-
-                    mapa_unidade = {_norm(n): int(i) for n, i in zip(unidades_df["nome"], unidades_df["id"])}
-                    inseridos, pulados = 0, 0
-                    for _, row in df_csv.iterrows():
-                        try:
-                            uid = mapa_unidade.get(_norm(row.get("unidade")))
-                            ci = row.get("checkin"); co = row.get("checkout")
-                            if not uid or pd.isna(ci) or pd.isna(co):
-                                pulados += 1
-                                continue
-                            hosp = str(row.get("hospede") or "").strip()
-                            val = float(row.get("valor") or 0.0)
-                            plat = str(row.get("plataforma") or "Direto").strip()
-                            stat = str(row.get("status_pagamento") or "Pendente").strip()
-                            cur.execute(
-                                "INSERT INTO locacoes (unidade_id, checkin, checkout, hospede, valor, plataforma, status_pagamento) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                                (uid, str(ci), str(co), hosp, val, plat, stat)
-                            )
-                            inseridos += 1
-                        except Exception:
-                            pulados += 1
-                            continue
-                    conn.commit(); conn.close()
-                    msg_pref = " (tabela limpa antes)" if modo_import.startswith("Sobre") else " (adicionados)"
-                    st.success(f"Importação concluída{msg_pref}. Inseridos: {inseridos} | Pulados: {pulados}")
+                    job_id = enviar_importacao_locacoes(
+                        csv_file.getvalue(), csv_file.name, modo_import,
+                        sobrescrever=modo_import == "Sobrescrever (limpar antes)",
+                        atualizar=modo_import.startswith("Atualizar"),
+                    )
+                    st.success(f"Importação enviada (tarefa #{job_id}). Acompanhe o andamento abaixo; dá para continuar usando o sistema.")
+
+    painel_importacoes("locacoes")
 
     # ------ Listagem / Edição / Exclusão ------
     st.subheader("Locações Registradas")
@@ -1440,17 +910,13 @@ elif aba == "Locações":
     ano_corrente = date.today().year
     mes_corrente = date.today().month
 
-    # Carregar locações antes de usar
-    locacoes = get_locacoes()
-
     # Adicionar filtros de ano, mês e unidades
-    # anos_disponiveis: atende vazio e garante inteiros válidos
-    checkout_years = pd.to_datetime(locacoes.get("checkout", pd.Series(dtype='object')), errors="coerce").dt.year.dropna().astype(int).unique().tolist()
-    anos_disponiveis = sorted(checkout_years)
-    anos_opts = ["Todos"] + anos_disponiveis
-    if anos_disponiveis and ano_corrente in anos_disponiveis:
-        default_ano_idx = anos_disponiveis.index(ano_corrente) + 1
-    elif anos_disponiveis:
+    # anos com check-out registrado (consulta só os anos, não as locações)
+    anos_checkout = anos_disponiveis("locacoes", "checkout")
+    anos_opts = ["Todos"] + anos_checkout
+    if anos_checkout and ano_corrente in anos_checkout:
+        default_ano_idx = anos_checkout.index(ano_corrente) + 1
+    elif anos_checkout:
         default_ano_idx = 1
     else:
         default_ano_idx = 0
@@ -1466,16 +932,26 @@ elif aba == "Locações":
     unidades_opcoes = unidades["nome"].tolist() if not unidades.empty else []
     unidades_filtro = st.multiselect("Filtrar por unidades", ["Todas"] + unidades_opcoes, default=["Todas"])
 
-    # Aplicar os filtros
-    if not locacoes.empty and not unidades.empty:
-        locacoes = locacoes.merge(unidades, left_on="unidade_id", right_on="id", suffixes=("", "_unidade"))
-        if ano_loca_filtro != "Todos":
-            locacoes = locacoes[pd.to_datetime(locacoes["checkout"]).dt.year == int(ano_loca_filtro)]
+    # Aplicar os filtros: ano/mês de check-out e unidades vão direto para o SQL
+    inicio_filtro, fim_filtro = None, None
+    if ano_loca_filtro != "Todos":
+        ano_f = int(ano_loca_filtro)
         if mes_loca_filtro != "Todos":
+            mes_f = int(mes_loca_filtro)
+            inicio_filtro, fim_filtro = date(ano_f, mes_f, 1), date(ano_f, mes_f, monthrange(ano_f, mes_f)[1])
+        else:
+            inicio_filtro, fim_filtro = date(ano_f, 1, 1), date(ano_f, 12, 31)
+    ids_filtro = None if "Todas" in unidades_filtro else unidades[unidades["nome"].isin(unidades_filtro)]["id"].tolist()
+    locacoes = get_locacoes(inicio=inicio_filtro, fim=fim_filtro, por="checkout", unidade_ids=ids_filtro)
+
+    if not unidades.empty:
+        locacoes = locacoes.merge(unidades, left_on="unidade_id", right_on="id", suffixes=("", "_unidade"))
+        if ano_loca_filtro == "Todos" and mes_loca_filtro != "Todos":
+            # mês sem ano não vira intervalo de datas: filtra aqui
             locacoes = locacoes[pd.to_datetime(locacoes["checkout"]).dt.month == int(mes_loca_filtro)]
-        if "Todas" not in unidades_filtro:
-            locacoes = locacoes[locacoes["nome"].isin(unidades_filtro)]
 
+        # O editor trabalha só com as locações; a linha de total é apenas para exibição
+        locacoes_base = locacoes
         if not locacoes.empty:
             # Calcular o total da coluna "valor"
             total_valor = locacoes["valor"].sum()
@@ -1516,32 +992,43 @@ elif aba == "Locações":
             st.markdown("**Visualização (valor formatado - pt-BR)**")
             st.dataframe(locacoes_display[["id", "nome", "checkin", "checkout", "hospede", "valor", "plataforma", "status_pagamento"]], use_container_width=True, height=300)
 
-            edited_df = st.data_editor(
-                locacoes[["id", "nome", "checkin", "checkout", "hospede", "valor", "plataforma", "status_pagamento"]],
-                num_rows="dynamic", use_container_width=True, key="editor_locacoes"
-            )
+            grade = locacoes_base[["id", "nome", "checkin", "checkout", "hospede", "valor", "plataforma", "status_pagamento"]]
+            st.data_editor(grade, num_rows="dynamic", use_container_width=True, key="editor_locacoes")
             if st.button("Salvar Alterações nas Locações"):
-                conn = conectar()
-                try:
-                    for _, row in edited_df.iterrows():
-                        conn.execute(
-                            "UPDATE locacoes SET checkin=?, checkout=?, hospede=?, valor=?, plataforma=?, status_pagamento=? WHERE id=?",
-                            (row["checkin"], row["checkout"], row["hospede"], float(row["valor"]), row["plataforma"], row["status_pagamento"], int(row["id"]))
+                # Só as linhas alteradas, incluídas ou removidas no editor vão para o banco
+                colunas = ["checkin", "checkout", "hospede", "valor", "plataforma", "status_pagamento"]
+                editadas, novas, excluidas = mudancas_editor(st.session_state.get("editor_locacoes"), grade, colunas)
+                novas = com_unidade_id(novas, unidades)
+                alteradas = pd.concat(
+                    [datas_alteradas(editadas, locacoes_base), novas[["unidade_id", "checkin", "checkout"]]], ignore_index=True
+                )
+                conflitos = conflitos_no_banco(alteradas, ignorar_ids=alteradas["id"].dropna().tolist() + excluidas)
+                if not conflitos.empty:
+                    st.error("As novas datas se sobrepõem a outra reserva da mesma unidade. Nada foi salvo.")
+                    st.dataframe(conflitos, use_container_width=True)
+                else:
+                    conn = conectar()
+                    try:
+                        alt, inc, exc = gravar_mudancas(
+                            conn, "locacoes", colunas, editadas, novas, excluidas,
+                            colunas_novas=["unidade_id"] + colunas, conversores={"valor": float},
                         )
-                    conn.commit()
-                    st.success("Alterações salvas! Recarregue a página para ver os dados atualizados.")
-                except Exception as e:
-                    st.error(f"Erro ao salvar alterações: {e}")
-                finally:
-                    conn.close()
+                        st.success(f"Alterações salvas! ({alt} alteradas, {inc} incluídas, {exc} excluídas) Recarregue a página para ver os dados atualizados.")
+                    except Exception as e:
+                        st.error(f"Erro ao salvar alterações: {e}")
+                    finally:
+                        conn.close()
 
             st.subheader("Excluir Locação")
-            id_excluir = st.selectbox("Selecione o ID da locação para excluir", locacoes["id"])
+            id_excluir = st.selectbox("Selecione o ID da locação para excluir", locacoes_base["id"])
             if st.button("Excluir Locação"):
                 conn = conectar()
-                conn.execute("DELETE FROM locacoes WHERE id=?", (int(id_excluir),))
-                conn.commit()
-                conn.close()
+                try:
+                    conn.execute("DELETE FROM locacoes WHERE id=?", (int(id_excluir),))
+                    aplicar_pendencias(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
                 st.success(f"Locação {id_excluir} excluída!")
 else:
     st.info("Cadastre unidades e locações para visualizar e editar aqui.")
@@ -1561,12 +1048,15 @@ if aba == "Despesas":
         if enviar and unidade:
             unidade_id = int(unidades.loc[unidades["nome"] == unidade, "id"].values[0])
             conn = conectar()
-            conn.execute(
-                "INSERT INTO despesas (unidade_id, data, tipo, valor, descricao) VALUES (?, ?, ?, ?, ?)",
-                (unidade_id, str(data_desp), tipo, valor, descricao)
-            )
-            conn.commit()
-            conn.close()
+            try:
+                conn.execute(
+                    "INSERT INTO despesas (unidade_id, data, tipo, valor, descricao) VALUES (?, ?, ?, ?, ?)",
+                    (unidade_id, str(data_desp), tipo, valor, descricao)
+                )
+                aplicar_pendencias(conn)
+                conn.commit()
+            finally:
+                conn.close()
             st.success("Despesa registrado!")
 
     st.subheader("Despesas Registradas")
@@ -1590,20 +1080,20 @@ if aba == "Despesas":
             st.metric("Total filtrado", f"R$ {total:,.2f}")
             st.dataframe(despesas_filtradas[["id","nome","data","tipo","valor","descricao"]], use_container_width=True, height=420)
         else:
-            edited_df = st.data_editor(
-                despesas_filtradas[["id", "nome", "data", "tipo", "valor", "descricao"]],
-                num_rows="dynamic", use_container_width=True, key="editor_despesas"
-            )
+            grade = despesas_filtradas[["id", "nome", "data", "tipo", "valor", "descricao"]]
+            st.data_editor(grade, num_rows="dynamic", use_container_width=True, key="editor_despesas")
             if st.button("Salvar Alterações nas Despesas"):
+                # Só as linhas alteradas, incluídas ou removidas no editor vão para o banco
+                colunas = ["data", "tipo", "valor", "descricao"]
+                editadas, novas, excluidas = mudancas_editor(st.session_state.get("editor_despesas"), grade, colunas)
+                novas = com_unidade_id(novas, unidades)
                 conn = conectar()
                 try:
-                    for _, row in edited_df.iterrows():
-                        conn.execute(
-                            "UPDATE despesas SET data=?, tipo=?, valor=?, descricao=? WHERE id=?",
-                            (row["data"], row["tipo"], float(row["valor"]), row["descricao"], int(row["id"]))
-                        )
-                    conn.commit()
-                    st.success("Alterações salvas! Recarregue a página para ver os dados atualizados.")
+                    alt, inc, exc = gravar_mudancas(
+                        conn, "despesas", colunas, editadas, novas, excluidas,
+                        colunas_novas=["unidade_id"] + colunas, conversores={"valor": float},
+                    )
+                    st.success(f"Alterações salvas! ({alt} alteradas, {inc} incluídas, {exc} excluídas) Recarregue a página para ver os dados atualizados.")
                 except Exception as e:
                     st.error(f"Erro ao salvar alterações: {e}")
                 finally:
@@ -1620,40 +1110,22 @@ if aba == "Despesas":
         excel_file = st.file_uploader("Selecione o arquivo Excel", type=["xlsx", "xls"], key="upload_despesas")
         if excel_file is not None:
             try:
-                # Ler o arquivo Excel
-                df_excel = pd.read_excel(excel_file, dtype=str)
-                df_excel.columns = [c.strip().lower() for c in df_excel.columns]  # Normalizar nomes das colunas
-                df_excel = df_excel.applymap(lambda x: x.strip() if isinstance(x, str) else x)
-
-                # Mapear colunas esperadas
-                alias = {
-                    "unidade": ["unidade", "unit", "nome_unidade", "apto", "apartamento", "imovel", "imóvel"],
-                    "data": ["data", "date", "data_despesa"],
-                    "tipo": ["tipo", "categoria", "tipo_despesa"],
-                    "valor": ["valor", "valor_total", "preco", "preço", "amount", "price"],
-                    "descricao": ["descricao", "descrição", "detalhes", "observacao", "observação"]
-                }
-
-                def pick(col_alts):
-                    for c in col_alts:
-                        if c in df_excel.columns:
-                            return c
-                    return None
-
-                selected = {k: pick(v) for k, v in alias.items()}
-                rename_map = {v: k for k, v in selected.items() if v is not None}
-                df_excel = df_excel.rename(columns=rename_map)
+                # Prévia: só o primeiro bloco da planilha (colunas mapeadas pelos apelidos);
+                # a importação lê o arquivo inteiro em blocos
+                df_excel = primeiro_bloco_excel(excel_file)
 
                 # Verificar colunas obrigatórias
-                obrigatorias = ["unidade", "data", "tipo", "valor"]
-                faltando = [c for c in obrigatorias if c not in df_excel.columns]
+                faltando = colunas_faltando(df_excel, OBRIGATORIAS_DESPESAS)
                 if faltando:
                     st.error(f"Faltam colunas obrigatórias no Excel: {', '.join(faltando)}")
                 else:
                     # Converter colunas
-                    df_excel["data"] = pd.to_datetime(df_excel["data"], dayfirst=True, errors="coerce").dt.date
-                    df_excel["valor"] = parse_valor_series(df_excel["valor"])
-                    df_excel["descricao"] = df_excel["descricao"].fillna("")
+                    df_excel = preparar_despesas(df_excel)
+                    if len(df_excel) >= LINHAS_POR_BLOCO:
+                        st.info(
+                            f"Planilha grande: a prévia abaixo cobre só as primeiras {len(df_excel)} linhas. "
+                            "A importação lê o arquivo inteiro em blocos."
+                        )
 
                     # Exibir prévia dos dados
                     st.dataframe(
@@ -1667,54 +1139,29 @@ if aba == "Despesas":
                             if unidades_df.empty:
                                 st.error("Não há unidades cadastradas. Cadastre unidades antes de importar despesas.")
                             else:
-                                conn = conectar()
-                                cur = conn.cursor()
-
-                                if modo_import_despesas == "Sobrescrever (limpar antes)":
-                                    cur.execute("DELETE FROM despesas")
-                                    conn.commit()
-
-                                mapa_unidade = {_norm(n): int(i) for n, i in zip(unidades_df["nome"], unidades_df["id"])}
-                                inseridos, pulados = 0, 0
-
-                                for _, row in df_excel.iterrows():
-                                    try:
-                                        unidade_id = mapa_unidade.get(_norm(row.get("unidade")))
-                                        data = row.get("data")
-                                        tipo = row.get("tipo")
-                                        valor = float(row.get("valor") or 0.0)
-                                        descricao = row.get("descricao", "")
-
-                                        if not unidade_id or pd.isna(data) or not tipo:
-                                            pulados += 1
-                                            continue
-
-                                        cur.execute(
-                                            "INSERT INTO despesas (unidade_id, data, tipo, valor, descricao) VALUES (?, ?, ?, ?, ?)",
-                                            (unidade_id, str(data), tipo, valor, descricao)
-                                        )
-                                        inseridos += 1
-                                    except Exception:
-                                        pulados += 1
-                                        continue
-
-                                conn.commit()
-                                conn.close()
-
-                                msg_pref = " (tabela limpa antes)" if modo_import_despesas.startswith("Sobre") else " (adicionados)"
-                                st.success(f"Importação concluída{msg_pref}. Inseridos: {inseridos} | Pulados: {pulados}")
+                                job_id = enviar_importacao_despesas(
+                                    excel_file.getvalue(), excel_file.name, modo_import_despesas,
+                                    sobrescrever=modo_import_despesas == "Sobrescrever (limpar antes)",
+                                )
+                                st.success(f"Importação enviada (tarefa #{job_id}). Acompanhe o andamento abaixo; dá para continuar usando o sistema.")
                         except Exception as e:
                             st.error(f"Erro ao processar o arquivo Excel: {e}")
             except Exception as e:
                 st.error(f"Erro ao processar o arquivo Excel: {e}")
 
+        painel_importacoes("despesas")
+
         st.subheader("Excluir Despesa")
         if not despesas_filtradas.empty:
             id_excluir = st.selectbox("Selecione o ID da despesa para excluir", despesas_filtradas["id"], key="excluir_despesa")
             if st.button("Excluir Despesa"):
                 conn = conectar()
-                conn.execute("DELETE FROM despesas WHERE id=?", (int(id_excluir),))
-                conn.commit(); conn.close()
+                try:
+                    conn.execute("DELETE FROM despesas WHERE id=?", (int(id_excluir),))
+                    aplicar_pendencias(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
                 st.success(f"Despesa {id_excluir} excluída!")
 
         st.subheader("Copiar Despesa")
@@ -1723,11 +1170,15 @@ if aba == "Despesas":
             if st.button("Copiar Despesa"):
                 despesa_copiar = despesas_filtradas.loc[despesas_filtradas["id"] == id_copiar].iloc[0]
                 conn = conectar()
-                conn.execute(
-                    "INSERT INTO despesas (unidade_id, data, tipo, valor, descricao) VALUES (?, ?, ?, ?, ?)",
-                    (int(despesa_copiar["unidade_id"]), despesa_copiar["data"], despesa_copiar["tipo"], float(despesa_copiar["valor"]), despesa_copiar["descricao"])
-                )
-                conn.commit(); conn.close()
+                try:
+                    conn.execute(
+                        "INSERT INTO despesas (unidade_id, data, tipo, valor, descricao) VALUES (?, ?, ?, ?, ?)",
+                        (int(despesa_copiar["unidade_id"]), despesa_copiar["data"], despesa_copiar["tipo"], float(despesa_copiar["valor"]), despesa_copiar["descricao"])
+                    )
+                    aplicar_pendencias(conn)
+                    conn.commit()
+                finally:
+                    conn.close()
                 st.success(f"Despesa {id_copiar} copiada!")
     else:
         st.info("Cadastre unidades e despesas para visualizar e editar aqui.")
@@ -1745,11 +1196,14 @@ elif aba == "Precificação":
         if enviar and unidade:
             unidade_id = int(unidades.loc[unidades["nome"] == unidade, "id"].values[0])
             conn = conectar()
-            conn.execute(
-                "INSERT INTO precos (unidade_id, temporada, preco_base) VALUES (?, ?, ?)",
-                (unidade_id, temporada, preco_base)
-            )
-            conn.commit(); conn.close()
+            try:
+                conn.execute(
+                    "INSERT INTO precos (unidade_id, temporada, preco_base) VALUES (?, ?, ?)",
+                    (unidade_id, temporada, preco_base)
+                )
+                conn.commit()
+            finally:
+                conn.close()
             st.success("Preço cadastrado!")
 
     st.subheader("Preços Base Cadastrados")
@@ -0,0 +1 @@
+"""Núcleo compartilhado pelos apps Streamlit de hospedagem (app.py, app3.py, hospedagem.py)."""
@@ -0,0 +1,96 @@
+# hospedar/banco.py
+"""Camada de conexão com o SQLite.
+
+O Streamlit reexecuta o script inteiro a cada clique; por isso o pool vive
+neste módulo importado, que sobrevive entre os reruns do mesmo processo.
+"""
+import os
+import queue
+import sqlite3
+import threading
+
+DB_PATH = os.environ.get("HOSPEDAGEM_DB", "hospedagem.db")
+
+POOL_MAX = 4              # conexões ociosas mantidas abertas por processo
+BUSY_TIMEOUT_MS = 5000    # espera pelo lock do escritor antes de falhar
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",          # leitores não bloqueiam o escritor
+    "PRAGMA synchronous=NORMAL",        # seguro com WAL e bem mais rápido que FULL
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA cache_size=-16000",         # ~16 MB de cache de páginas
+    "PRAGMA mmap_size=134217728",       # 128 MB de leitura via mmap
+    "PRAGMA temp_store=MEMORY",
+)
+
+_pool = queue.LifoQueue(maxsize=POOL_MAX)
+
+
+class ConexaoPool(sqlite3.Connection):
+    """Conexão que, ao ser "fechada", volta para o pool em vez de fechar o arquivo."""
+
+    _emprestada = False
+
+    def close(self):
+        if not self._emprestada:
+            return
+        self._emprestada = False
+        if self.in_transaction:
+            self.rollback()  # mesmo efeito do close() original: descarta o que não foi commitado
+        try:
+            _pool.put_nowait(self)
+        except queue.Full:
+            super().close()
+
+    def fechar(self):
+        """Fecha de fato a conexão (usado ao esvaziar o pool)."""
+        self._emprestada = False
+        super().close()
+
+
+def _abrir() -> ConexaoPool:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        factory=ConexaoPool,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def conectar() -> ConexaoPool:
+    """Empresta uma conexão do pool (ou abre uma nova). Devolva com conn.close()."""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _abrir()
+    conn._emprestada = True
+    return conn
+
+
+def fechar_pool():
+    """Fecha todas as conexões ociosas do pool."""
+    while True:
+        try:
+            _pool.get_nowait().fechar()
+        except queue.Empty:
+            break
+
+
+_vigia = None
+_vigia_lock = threading.Lock()
+
+
+def versao_dados() -> int:
+    """Valor de PRAGMA data_version visto por uma conexão dedicada, que nunca escreve.
+
+    Como o pragma muda sempre que *outra* conexão faz commit, essa conexão
+    enxerga as escritas do pool, de outros processos e de ferramentas externas.
+    """
+    global _vigia
+    with _vigia_lock:
+        if _vigia is None:
+            _vigia = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        return _vigia.execute("PRAGMA data_version").fetchone()[0]
@@ -0,0 +1,148 @@
+# hospedar/conflitos.py
+"""Detecção de reservas sobrepostas (overbooking) na mesma unidade.
+
+Duas reservas conflitam quando dividem alguma noite: cada uma ocupa
+[checkin, checkout), e um day-use ocupa o dia do check-in. Check-out e
+check-in no mesmo dia não é conflito.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from hospedar.dados import get_locacoes
+from hospedar.ocupacao import _dias
+
+COLUNAS_CONFLITO = ["linha", "unidade_id", "checkin", "checkout", "conflita_com"]
+
+
+def _fim_noites(checkin: date, checkout: date) -> date:
+    return max(checkout, checkin + timedelta(days=1))
+
+
+def conflitos_reserva(conn, unidade_id: int, checkin: date, checkout: date, ignorar_id=None) -> pd.DataFrame:
+    """Reservas da unidade que dividem noites com a nova — uma consulta no índice (unidade_id, checkin, checkout)."""
+    # Compara só a data (como conflitos_lote): um checkout gravado com hora, "2024-01-02 11:00",
+    # não pode parecer passar do dia 2. O `checkin < ?` em texto só delimita a faixa no índice
+    sql = (
+        "SELECT id, checkin, checkout, hospede FROM locacoes "
+        "WHERE unidade_id = ? AND checkin < ? AND date(checkin) < ? "
+        "AND MAX(date(checkout), date(checkin, '+1 day')) > ?"
+    )
+    fim = str(_fim_noites(checkin, checkout))
+    params = [int(unidade_id), fim, fim, str(checkin)]
+    if ignorar_id is not None:
+        sql += " AND id <> ?"
+        params.append(int(ignorar_id))
+    return pd.read_sql(sql + " ORDER BY checkin", conn, params=params)
+
+
+def _intervalos(df: pd.DataFrame):
+    """(unidade, início, fim das noites, válida) em dias; day-use vai até o dia seguinte."""
+    ci, ok_ci = _dias(df["checkin"])
+    co, ok_co = _dias(df["checkout"])
+    uid = pd.to_numeric(df["unidade_id"], errors="coerce")
+    ok = ok_ci & ok_co & uid.notna().to_numpy()
+    return uid.fillna(0).to_numpy(dtype=np.int64), ci, np.maximum(co, ci + 1), ok
+
+
+def _maximo_acumulado(fim: np.ndarray):
+    """Máximo acumulado de `fim` e a posição de quem o detém."""
+    maximo = np.maximum.accumulate(fim)
+    dono = np.maximum.accumulate(np.where(fim == maximo, np.arange(len(fim)), 0))
+    return maximo, dono
+
+
+def conflitos_lote(lote: pd.DataFrame, existentes: pd.DataFrame = None) -> pd.DataFrame:
+    """Linhas de `lote` que conflitam entre si ou com `existentes`, por ordenação e varredura.
+
+    As duas tabelas precisam de unidade_id, checkin e checkout; `existentes`
+    também de id. Entre duas linhas do lote, só a de check-in mais tarde é
+    apontada. Conflitos só entre existentes não entram. Retorna uma linha por
+    linha do lote em conflito (`linha` é o rótulo do índice de `lote`), com a
+    primeira reserva encontrada em `conflita_com`.
+    """
+    if lote.empty:
+        return pd.DataFrame(columns=COLUNAS_CONFLITO)
+
+    uid, ci, fim, ok = _intervalos(lote)
+    rotulos = lote.index.to_numpy()
+    pos = np.flatnonzero(ok)
+    if len(pos) == 0:
+        return pd.DataFrame(columns=COLUNAS_CONFLITO)
+
+    if existentes is None or existentes.empty:
+        e_uid = e_ci = e_fim = np.empty(0, dtype=np.int64)
+        e_ids = np.empty(0)
+    else:
+        e_uid, e_ci, e_fim, e_ok = _intervalos(existentes)
+        e_uid, e_ci, e_fim = e_uid[e_ok], e_ci[e_ok], e_fim[e_ok]
+        e_ids = existentes["id"].to_numpy()[e_ok]
+
+    # Chaves (unidade, dia) num só inteiro: cada unidade vira uma faixa que não se mistura com as outras
+    base = min(ci[pos].min(), e_ci.min(initial=ci[pos].min()))
+    largura = int(max(fim[pos].max(), e_fim.max(initial=0)) - base) + 2
+    chave_ci = uid[pos] * largura + (ci[pos] - base)
+    chave_fim = uid[pos] * largura + (fim[pos] - base)
+
+    achados = {}
+
+    # ---- Lote x existentes: busca binária na lista ordenada dos existentes ----
+    if len(e_ci):
+        ordem_e = np.argsort(e_uid * largura + (e_ci - base), kind="stable")
+        e_ci = (e_uid * largura + (e_ci - base))[ordem_e]
+        e_fim = (e_uid * largura + (e_fim - base))[ordem_e]
+        e_ids = e_ids[ordem_e]
+        maximo_e, dono_e = _maximo_acumulado(e_fim)
+        # existentes com check-in antes do fim da linha; o maior fim entre eles decide
+        k = np.searchsorted(e_ci, chave_fim, side="left")
+        conflita = np.zeros(len(pos), dtype=bool)
+        conflita[k > 0] = maximo_e[k[k > 0] - 1] > chave_ci[k > 0]
+        for i in np.flatnonzero(conflita):
+            achados[pos[i]] = f"locação {e_ids[dono_e[k[i] - 1]]}"
+
+    # ---- Lote x lote: varredura por check-in; conflita se começa antes do maior fim anterior ----
+    ordem = np.lexsort((chave_fim, chave_ci))
+    maximo, dono = _maximo_acumulado(chave_fim[ordem])
+    for k in np.flatnonzero(chave_ci[ordem][1:] < maximo[:-1]) + 1:
+        outra = pos[ordem[dono[k - 1]]]
+        achados.setdefault(pos[ordem[k]], f"linha {rotulos[outra]}")
+
+    linhas = sorted(achados)
+    return pd.DataFrame({
+        "linha": rotulos[linhas],
+        "unidade_id": uid[linhas],
+        "checkin": lote["checkin"].to_numpy()[linhas],
+        "checkout": lote["checkout"].to_numpy()[linhas],
+        "conflita_com": [achados[i] for i in linhas],
+    }, columns=COLUNAS_CONFLITO)
+
+
+def conflitos_no_banco(lote: pd.DataFrame, ignorar_ids=()) -> pd.DataFrame:
+    """conflitos_lote contra as locações gravadas nas unidades e no período do lote.
+
+    `ignorar_ids` tira do lado do banco as reservas que o próprio lote substitui
+    (edição)."""
+    if lote.empty:
+        return conflitos_lote(lote)
+    uid, ci, fim, ok = _intervalos(lote)
+    if not ok.any():
+        return conflitos_lote(lote)
+    existentes = get_locacoes(
+        inicio=pd.to_datetime(ci[ok].min(), unit="D").date(),
+        fim=pd.to_datetime(fim[ok].max(), unit="D").date(),
+        por="sobreposicao", unidade_ids=sorted(set(uid[ok].tolist())),
+        colunas=["id", "unidade_id", "checkin", "checkout"],
+    )
+    return conflitos_lote(lote, existentes[~existentes["id"].isin(list(ignorar_ids))])
+
+
+def datas_alteradas(editado: pd.DataFrame, original: pd.DataFrame) -> pd.DataFrame:
+    """Linhas do data_editor cujo check-in ou check-out mudou (id, unidade_id, checkin, checkout)."""
+    antes = original[["id", "unidade_id", "checkin", "checkout"]]
+    m = editado[["id", "checkin", "checkout"]].merge(antes, on="id", how="inner", suffixes=("", "_antes"))
+    mudou = (
+        (m["checkin"].astype(str) != m["checkin_antes"].astype(str))
+        | (m["checkout"].astype(str) != m["checkout_antes"].astype(str))
+    )
+    return m.loc[mudou, ["id", "unidade_id", "checkin", "checkout"]]
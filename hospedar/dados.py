@@ -0,0 +1,345 @@
+# hospedar/dados.py
+"""Carregadores de dados (SELECT -> DataFrame) com os filtros empurrados para o SQL.
+
+Os resultados ficam em memória, indexados pelos filtros e pela versão dos
+dados (PRAGMA data_version): qualquer INSERT/UPDATE/DELETE commitado muda a
+versão e invalida o cache sem que quem escreve precise avisar. Os relatórios
+prontos (memo_relatorio) usam a mesma chave num cache à parte, limitado também
+pela memória.
+"""
+import functools
+import re
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from hospedar.banco import conectar, versao_dados
+from hospedar.resumo import consulta_resumo
+
+CACHE_MAX = 64  # entradas (combinações de filtros) mantidas por processo
+RELATORIOS_MAX = 128  # relatórios prontos mantidos por processo
+RELATORIOS_MAX_BYTES = 64 * 1024 * 1024  # e a memória (estimada) que eles podem ocupar
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_geracao = 0
+
+_relatorios = OrderedDict()  # chave -> (versão, resultado, bytes)
+_relatorios_bytes = 0
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _ident(nome: str) -> str:
+    """Valida nomes de tabela/coluna antes de interpolá-los no SQL."""
+    if not _IDENT.match(str(nome)):
+        raise ValueError(f"Identificador inválido: {nome!r}")
+    return nome
+
+
+def _dia(d) -> str:
+    return str(pd.to_datetime(d).date())
+
+
+def _dia_seguinte(d) -> str:
+    return str(pd.to_datetime(d).date() + timedelta(days=1))
+
+
+def _congelar(v):
+    """Converte filtros em uma chave hashable e estável (listas, datas, numpy)."""
+    if isinstance(v, (list, tuple, set, pd.Series, pd.Index, np.ndarray)):
+        itens = [_congelar(x) for x in v]
+        return tuple(sorted(itens, key=repr)) if isinstance(v, set) else tuple(itens)
+    if isinstance(v, dict):
+        return tuple(sorted((k, _congelar(x)) for k, x in v.items()))
+    if isinstance(v, (date, pd.Timestamp)):
+        return str(pd.Timestamp(v).date())
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+def invalidar_cache():
+    """Descarta o cache (ex.: depois de mudar o esquema fora das conexões do app)."""
+    global _geracao, _relatorios_bytes
+    with _cache_lock:
+        _cache.clear()
+        _relatorios.clear()
+        _relatorios_bytes = 0
+        _geracao += 1
+
+
+def _memo(func):
+    """Memoiza o carregador pela combinação (filtros, versão dos dados)."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        chave = (func.__name__, _congelar(args), _congelar(kwargs))
+        versao = (versao_dados(), _geracao)
+        with _cache_lock:
+            hit = _cache.get(chave)
+            if hit is not None and hit[0] == versao:
+                _cache.move_to_end(chave)
+                return hit[1].copy()
+        resultado = func(*args, **kwargs)
+        with _cache_lock:
+            _cache[chave] = (versao, resultado)
+            _cache.move_to_end(chave)
+            while len(_cache) > CACHE_MAX:
+                _cache.popitem(last=False)
+        # Quem chama recebe uma cópia e pode alterá-la sem sujar o cache
+        return resultado.copy()
+    return wrapper
+
+
+def _tamanho(v) -> int:
+    """Memória aproximada de um resultado (DataFrames pelo memory_usage profundo)."""
+    if isinstance(v, pd.DataFrame):
+        return int(v.memory_usage(index=True, deep=True).sum())
+    if isinstance(v, pd.Series):
+        return int(v.memory_usage(index=True, deep=True))
+    if isinstance(v, (list, tuple)):
+        return sys.getsizeof(v) + sum(_tamanho(x) for x in v)
+    if isinstance(v, dict):
+        return sys.getsizeof(v) + sum(_tamanho(x) for x in v.values())
+    return sys.getsizeof(v)
+
+
+def _copia(v):
+    """Cópia dos DataFrames/Series de um resultado (também dentro de listas, tuplas e dicts)."""
+    if isinstance(v, (pd.DataFrame, pd.Series)):
+        return v.copy()
+    if isinstance(v, (list, tuple)):
+        return type(v)(_copia(x) for x in v)
+    if isinstance(v, dict):
+        return {k: _copia(x) for k, x in v.items()}
+    return v
+
+
+def memo_relatorio(func):
+    """Memoiza um relatório pronto pela chave (relatório, filtros normalizados, versão dos dados).
+
+    Como o _memo, mas limitado por RELATORIOS_MAX entradas e por
+    RELATORIOS_MAX_BYTES: os menos usados saem primeiro e um resultado maior
+    que o limite não é guardado. Cada chamada recebe uma cópia.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        global _relatorios_bytes
+        chave = (func.__module__, func.__qualname__, _congelar(args), _congelar(kwargs))
+        versao = (versao_dados(), _geracao)
+        with _cache_lock:
+            hit = _relatorios.get(chave)
+            if hit is not None and hit[0] == versao:
+                _relatorios.move_to_end(chave)
+                return _copia(hit[1])
+        resultado = func(*args, **kwargs)
+        tamanho = _tamanho(resultado)
+        with _cache_lock:
+            antigo = _relatorios.pop(chave, None)
+            if antigo is not None:
+                _relatorios_bytes -= antigo[2]
+            if tamanho <= RELATORIOS_MAX_BYTES:
+                _relatorios[chave] = (versao, resultado, tamanho)
+                _relatorios_bytes += tamanho
+            while len(_relatorios) > RELATORIOS_MAX or _relatorios_bytes > RELATORIOS_MAX_BYTES:
+                _relatorios_bytes -= _relatorios.popitem(last=False)[1][2]
+        return _copia(resultado)
+    return wrapper
+
+
+def _ler(tabela: str, where: list, params: list, colunas=None) -> pd.DataFrame:
+    cols = ", ".join(_ident(c) for c in colunas) if colunas else "*"
+    sql = f"SELECT {cols} FROM {_ident(tabela)}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    conn = conectar()
+    try:
+        return pd.read_sql(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def _filtro_em(coluna: str, valores, where: list, params: list, conv=str):
+    if valores is None:
+        return
+    valores = [conv(v) for v in valores]
+    where.append(f"{coluna} IN ({', '.join('?' * len(valores))})")
+    params.extend(valores)
+
+
+def _filtro_data(coluna: str, inicio, fim, where: list, params: list):
+    # Intervalo semiaberto [inicio, fim + 1 dia): aceita também valores gravados com hora.
+    if inicio is not None:
+        where.append(f"{coluna} >= ?")
+        params.append(_dia(inicio))
+    if fim is not None:
+        where.append(f"{coluna} < ?")
+        params.append(_dia_seguinte(fim))
+
+
+@_memo
+def get_unidades():
+    return _ler("unidades", [], [])
+
+
+@_memo
+def get_locacoes(inicio=None, fim=None, por="checkin", unidade_ids=None, plataformas=None, colunas=None):
+    """Locações filtradas no banco.
+
+    `por` define como a janela [inicio, fim] é aplicada:
+    "checkin"/"checkout" filtram pela data indicada; "sobreposicao" traz as
+    reservas que tocam a janela (checkin <= fim e checkout >= inicio).
+    Filtros None não são aplicados.
+    """
+    where, params = [], []
+    if por == "sobreposicao":
+        _filtro_data("checkout", inicio, None, where, params)
+        _filtro_data("checkin", None, fim, where, params)
+    elif por in ("checkin", "checkout"):
+        _filtro_data(por, inicio, fim, where, params)
+    else:
+        raise ValueError(f"Filtro de período desconhecido: {por!r}")
+    _filtro_em("unidade_id", unidade_ids, where, params, conv=int)
+    _filtro_em("plataforma", plataformas, where, params)
+    return _ler("locacoes", where, params, colunas)
+
+
+@_memo
+def get_despesas(inicio=None, fim=None, unidade_ids=None, tipos=None, colunas=None):
+    """Despesas com data em [inicio, fim], filtradas por unidade/tipo no banco."""
+    where, params = [], []
+    _filtro_data("data", inicio, fim, where, params)
+    _filtro_em("unidade_id", unidade_ids, where, params, conv=int)
+    _filtro_em("tipo", tipos, where, params)
+    return _ler("despesas", where, params, colunas)
+
+
+@_memo
+def noites_por_mes(inicio=None, fim=None, unidade_ids=None, day_use=False):
+    """Noites e receita rateada por (unidade_id, ano, mes), agregadas no banco a partir da tabela `noites`.
+
+    Só entram unidades cadastradas; day-use (1 diária no check-in) só com `day_use=True`.
+    """
+    where, params = [], []
+    if not day_use:
+        where.append("n.day_use = 0")
+    _filtro_data("n.data", inicio, fim, where, params)
+    _filtro_em("n.unidade_id", unidade_ids, where, params, conv=int)
+    sql = (
+        "SELECT n.unidade_id, CAST(substr(n.data, 1, 4) AS INTEGER) AS ano, "
+        "CAST(substr(n.data, 6, 2) AS INTEGER) AS mes, COUNT(*) AS noites, SUM(n.valor) AS receita "
+        "FROM noites n JOIN unidades u ON u.id = n.unidade_id"
+    )
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " GROUP BY n.unidade_id, ano, mes ORDER BY n.unidade_id, ano, mes"
+    conn = conectar()
+    try:
+        return pd.read_sql(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+# Data de cada tabela no relatório de ganhos e a condição para a linha entrar
+_GANHOS = {
+    "locacoes": ("checkin", "date(t.checkin) IS NOT NULL AND date(t.checkout) IS NOT NULL"),
+    "despesas": ("data", "date(t.data) IS NOT NULL"),
+}
+
+
+@_memo
+def ganhos_por_mes(tabela: str, hoje) -> pd.DataFrame:
+    """Valores de `tabela` ("locacoes"/"despesas") somados no banco por (unidade_id, ano, mes).
+
+    Uma linha por grupo, não por registro: colunas unidade_id, nome, ano, mes,
+    futuro e valor (nulo conta 0). Locações entram pelo check-in e precisam de
+    check-in e check-out válidos; só unidades cadastradas. `futuro` separa,
+    dentro do mês, o que tem data >= `hoje`.
+    """
+    data, validas = _GANHOS[tabela]
+    sql = f"""
+        SELECT t.unidade_id, u.nome,
+               CAST(strftime('%Y', t.{data}) AS INTEGER) AS ano,
+               CAST(strftime('%m', t.{data}) AS INTEGER) AS mes,
+               date(t.{data}) >= ? AS futuro, TOTAL(t.valor) AS valor
+        FROM {tabela} t JOIN unidades u ON u.id = t.unidade_id
+        WHERE {validas}
+        GROUP BY t.unidade_id, ano, mes, futuro
+        ORDER BY t.unidade_id, ano, mes, futuro
+    """
+    conn = conectar()
+    try:
+        ganhos = pd.read_sql(sql, conn, params=[_dia(hoje)])
+    finally:
+        conn.close()
+    ganhos["futuro"] = ganhos["futuro"].astype(bool)
+    return ganhos
+
+
+@_memo
+def _resumo(tabela: str, ano=None, unidade_ids=None, tipos=None):
+    where, params = [], []
+    if ano is not None:
+        where.append("ano = ?")
+        params.append(int(ano))
+    _filtro_em("unidade_id", unidade_ids, where, params, conv=int)
+    _filtro_em("tipo", tipos, where, params)
+    # Só leitura: células ainda pendentes vêm recalculadas das tabelas base, sem esperar pelo escritor
+    sql = f"SELECT * FROM ({consulta_resumo(_ident(tabela))})"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY unidade_id, ano, mes" + (", tipo" if tabela == "resumo_despesas" else "")
+    conn = conectar()
+    try:
+        return pd.read_sql(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def resumo_mensal(ano=None, unidade_ids=None):
+    """Resumo por (unidade_id, ano, mes): receita e reservas pelo check-in, noites, despesa e despesas.
+
+    Lê a tabela resumo_mensal, que só é recalculada nas células que mudaram.
+    """
+    return _resumo("resumo_mensal", ano, unidade_ids)
+
+
+def resumo_despesas(ano=None, unidade_ids=None, tipos=None):
+    """Despesas por (unidade_id, ano, mes, tipo), da tabela resumo_despesas."""
+    return _resumo("resumo_despesas", ano, unidade_ids, tipos)
+
+
+@_memo
+def get_precos():
+    return _ler("precos", [], [])
+
+
+@_memo
+def anos_disponiveis(tabela: str, *colunas) -> list:
+    """Anos (int) presentes nas colunas de data informadas, sem carregar as linhas."""
+    partes = [
+        f"SELECT DISTINCT CAST(substr({c}, 1, 4) AS INTEGER) FROM {_ident(tabela)} "
+        f"WHERE {c} GLOB '[0-9][0-9][0-9][0-9]-*'"
+        for c in map(_ident, colunas)
+    ]
+    conn = conectar()
+    try:
+        return sorted({row[0] for row in conn.execute(" UNION ".join(partes))})
+    finally:
+        conn.close()
+
+
+@_memo
+def valores_distintos(tabela: str, coluna: str) -> list:
+    """Valores distintos (não nulos) de uma coluna, em ordem."""
+    conn = conectar()
+    try:
+        coluna = _ident(coluna)
+        sql = f"SELECT DISTINCT {coluna} FROM {_ident(tabela)} WHERE {coluna} IS NOT NULL ORDER BY 1"
+        return [row[0] for row in conn.execute(sql)]
+    finally:
+        conn.close()
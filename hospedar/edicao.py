@@ -0,0 +1,101 @@
+# hospedar/edicao.py
+"""Gravação das grades st.data_editor a partir das mudanças que o próprio editor registra.
+
+O editor guarda em st.session_state[key] as células alteradas (edited_rows),
+as linhas incluídas (added_rows) e as removidas (deleted_rows), sempre pela
+posição na grade original. Só essas linhas vão para o banco, numa transação.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from hospedar.importacao import mapa_unidades
+from hospedar.resumo import aplicar_pendencias
+from hospedar.valores import normalizar
+
+
+def _valor_sql(v):
+    """Valor do pandas/numpy em algo que o sqlite3 aceita (NaN/NaT -> NULL, datas -> 'AAAA-MM-DD')."""
+    if v is None or (np.ndim(v) == 0 and pd.isna(v)):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return str(v.date())
+    if isinstance(v, date):
+        return str(v)
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+def mudancas_editor(estado: dict, original: pd.DataFrame, colunas: list):
+    """Separa o estado do editor em (editadas, novas, excluidas).
+
+    `editadas` traz id + `colunas` com os valores finais das linhas em que
+    alguma dessas colunas mudou; `novas`, as linhas incluídas que não estão
+    em branco, com as colunas da grade; `excluidas`, os ids removidos.
+    """
+    estado = estado or {}
+    removidas = {int(p) for p in estado.get("deleted_rows", []) if int(p) < len(original)}
+
+    linhas = []
+    for pos, mudou in (estado.get("edited_rows") or {}).items():
+        pos = int(pos)
+        mudou = {c: v for c, v in mudou.items() if c in colunas}
+        if pos in removidas or pos >= len(original) or not mudou:
+            continue
+        atual = original.iloc[pos]
+        linhas.append({"id": atual["id"], **{c: atual[c] for c in colunas}, **mudou})
+    editadas = pd.DataFrame(linhas, columns=["id"] + list(colunas))
+
+    incluidas = [
+        r for r in (estado.get("added_rows") or [])
+        if any(not (v is None or v == "" or (np.ndim(v) == 0 and pd.isna(v))) for v in r.values())
+    ]
+    novas = pd.DataFrame(incluidas, columns=[c for c in original.columns if c != "id"])
+
+    excluidas = [_valor_sql(original.iloc[p]["id"]) for p in sorted(removidas)]
+    return editadas, novas, excluidas
+
+
+def com_unidade_id(novas: pd.DataFrame, unidades_df: pd.DataFrame) -> pd.DataFrame:
+    """Linhas novas com unidade_id casado pelo nome; as de unidade desconhecida ficam de fora."""
+    mapa = mapa_unidades(unidades_df)
+    novas = novas.assign(unidade_id=novas["nome"].map(lambda n: mapa.get(normalizar(n))))
+    return novas[novas["unidade_id"].notna()]
+
+
+def gravar_mudancas(conn, tabela: str, colunas: list, editadas: pd.DataFrame, novas: pd.DataFrame,
+                    excluidas: list, colunas_novas=None, conversores=None):
+    """DELETE/UPDATE/INSERT das mudanças com executemany, numa transação. Retorna (alteradas, incluidas, excluidas).
+
+    `colunas_novas` (padrão: `colunas`) são as colunas gravadas nas linhas
+    incluídas; `conversores` mapeia coluna -> função aplicada aos valores não nulos.
+    """
+    conversores = conversores or {}
+    colunas_novas = list(colunas_novas or colunas)
+
+    def tuplas(df, cols):
+        return [
+            tuple(_valor_sql(conversores[c](v) if c in conversores and _valor_sql(v) is not None else v)
+                  for c, v in zip(cols, linha))
+            for linha in df[cols].itertuples(index=False, name=None)
+        ]
+
+    sets = ", ".join(f"{c}=?" for c in colunas)
+    try:
+        if excluidas:
+            conn.executemany(f"DELETE FROM {tabela} WHERE id=?", [(int(i),) for i in excluidas])
+        if not editadas.empty:
+            conn.executemany(f"UPDATE {tabela} SET {sets} WHERE id=?", tuplas(editadas.assign(id=editadas["id"].astype(int)), list(colunas) + ["id"]))
+        if not novas.empty:
+            conn.executemany(
+                f"INSERT INTO {tabela} ({', '.join(colunas_novas)}) VALUES ({', '.join('?' * len(colunas_novas))})",
+                tuplas(novas, colunas_novas)
+            )
+        aplicar_pendencias(conn)  # o resumo mensal sai atualizado no mesmo commit
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(editadas), len(novas), len(excluidas)
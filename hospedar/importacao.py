@@ -0,0 +1,510 @@
+# hospedar/importacao.py
+"""Importação de locações (CSV com ;) e despesas (Excel) com mapeamento de colunas por apelido."""
+import codecs
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+
+from hospedar.banco import conectar
+from hospedar.conflitos import conflitos_lote, conflitos_no_banco
+from hospedar.resumo import aplicar_pendencias
+from hospedar.valores import normalizar, parse_valor_series
+
+ALIAS_LOCACOES = {
+    "unidade": ["unidade", "unit", "nome_unidade", "apto", "apartamento", "imovel", "imóvel"],
+    "checkin": ["checkin", "check-in", "data_checkin", "entrada", "inicio", "início"],
+    "checkout": ["checkout", "check-out", "data_checkout", "saida", "saída", "fim", "final"],
+    "hospede": ["hospede", "hóspede", "cliente", "nome_hospede"],
+    "valor": ["valor", "valor_total", "preco", "preço", "amount", "price"],
+    "plataforma": ["plataforma", "canal", "origem"],
+    "status_pagamento": ["status_pagamento", "pagamento", "status", "payment_status"],
+    "codigo_reserva": ["codigo_reserva", "código_reserva", "codigo", "código", "cod_reserva", "id_reserva",
+                       "confirmation code", "confirmation_code", "reservation_code", "booking_id"]
+}
+OBRIGATORIAS_LOCACOES = ["unidade", "checkin", "checkout"]
+
+ALIAS_DESPESAS = {
+    "unidade": ["unidade", "unit", "nome_unidade", "apto", "apartamento", "imovel", "imóvel"],
+    "data": ["data", "date", "data_despesa"],
+    "tipo": ["tipo", "categoria", "tipo_despesa"],
+    "valor": ["valor", "valor_total", "preco", "preço", "amount", "price"],
+    "descricao": ["descricao", "descrição", "detalhes", "observacao", "observação"]
+}
+OBRIGATORIAS_DESPESAS = ["unidade", "data", "tipo", "valor"]
+
+
+def padronizar_colunas(df: pd.DataFrame, alias: dict) -> pd.DataFrame:
+    """Normaliza cabeçalhos/células e renomeia o primeiro apelido encontrado de cada coluna."""
+    df.columns = [c.strip().lower() for c in df.columns]
+    df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+
+    def pick(col_alts):
+        for c in col_alts:
+            if c in df.columns:
+                return c
+        return None
+
+    selected = {k: pick(v) for k, v in alias.items()}
+    rename_map = {v: k for k, v in selected.items() if v is not None}
+    return df.rename(columns=rename_map)
+
+
+def colunas_faltando(df: pd.DataFrame, obrigatorias: list) -> list:
+    return [c for c in obrigatorias if c not in df.columns]
+
+
+def mapa_unidades(unidades_df: pd.DataFrame) -> dict:
+    """Nome normalizado -> id, para casar a coluna "unidade" das planilhas."""
+    return {normalizar(n): int(i) for n, i in zip(unidades_df["nome"], unidades_df["id"])}
+
+
+# ---------------- Locações (CSV) ----------------
+# Acima deste tamanho o CSV é lido e gravado em blocos, sem montar o arquivo inteiro em memória
+CSV_EM_BLOCOS_BYTES = 20 * 1024 * 1024
+LINHAS_POR_BLOCO = 50_000
+_LEITURA_BYTES = 1024 * 1024
+AVISO_SOBRESCREVER_LOCACOES = (
+    f"Sobrescrever apaga as locações atuais junto com o primeiro bloco de {LINHAS_POR_BLOCO:_} linhas do arquivo. "
+    "Em arquivos maiores que isso, se a importação falhar num bloco seguinte, as locações antigas não voltam: "
+    "ficam só as linhas já importadas. Guarde uma cópia do banco antes."
+).replace("_", ".")
+
+
+def detectar_codificacao(arquivo) -> str:
+    """Codificação do CSV: BOM -> utf-8-sig; arquivo inteiro UTF-8 válido -> utf-8; senão latin-1.
+
+    O arquivo todo é validado (em pedaços, sem guardar o conteúdo) antes da
+    leitura: um acento em latin-1 no fim do arquivo não pode derrubar a
+    importação em blocos depois que os primeiros já foram gravados.
+    """
+    inicio = arquivo.tell()
+    try:
+        pedaco = arquivo.read(_LEITURA_BYTES)
+        if isinstance(pedaco, str):
+            return "utf-8"
+        if pedaco.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        decodificador = codecs.getincrementaldecoder("utf-8")()
+        try:
+            while pedaco:
+                # final=False: um caractere cortado entre dois pedaços não conta como erro
+                decodificador.decode(pedaco, final=False)
+                pedaco = arquivo.read(_LEITURA_BYTES)
+            decodificador.decode(b"", final=True)
+        except UnicodeDecodeError:
+            return "latin-1"
+        return "utf-8"
+    finally:
+        arquivo.seek(inicio)
+
+
+def ler_csv_locacoes(arquivo) -> pd.DataFrame:
+    df_csv = pd.read_csv(arquivo, sep=";", encoding=detectar_codificacao(arquivo), dtype=str)
+    return padronizar_colunas(df_csv, ALIAS_LOCACOES)
+
+
+def blocos_csv_locacoes(arquivo, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Lê o CSV em blocos de `linhas_por_bloco` linhas, já com as colunas padronizadas."""
+    leitor = pd.read_csv(
+        arquivo, sep=";", encoding=detectar_codificacao(arquivo), dtype=str, chunksize=linhas_por_bloco
+    )
+    with leitor:
+        for bloco in leitor:
+            yield padronizar_colunas(bloco, ALIAS_LOCACOES)
+
+
+def primeiro_bloco_csv(arquivo, linhas_por_bloco=LINHAS_POR_BLOCO) -> pd.DataFrame:
+    """Só o primeiro bloco do CSV (prévia de arquivos grandes); o arquivo volta para o início."""
+    inicio = arquivo.tell()
+    try:
+        return next(blocos_csv_locacoes(arquivo, linhas_por_bloco))
+    finally:
+        arquivo.seek(inicio)
+
+
+def preparar_locacoes(df_csv: pd.DataFrame) -> pd.DataFrame:
+    """Converte datas/valor e preenche plataforma e status ausentes."""
+    for col in ["checkin", "checkout"]:
+        df_csv[col] = pd.to_datetime(df_csv[col], dayfirst=True, errors="coerce").dt.date
+
+    if "valor" in df_csv.columns:
+        df_csv["valor"] = parse_valor_series(df_csv["valor"])
+    else:
+        df_csv["valor"] = 0.0
+
+    if "plataforma" not in df_csv.columns:
+        df_csv["plataforma"] = "Direto"
+    else:
+        df_csv["plataforma"] = df_csv["plataforma"].fillna("Direto").astype(str)
+
+    if "status_pagamento" not in df_csv.columns:
+        df_csv["status_pagamento"] = "Pendente"
+    else:
+        df_csv["status_pagamento"] = df_csv["status_pagamento"].fillna("Pendente").astype(str)
+
+    if "codigo_reserva" in df_csv.columns:
+        codigo = _texto(df_csv["codigo_reserva"], "")
+        df_csv["codigo_reserva"] = codigo.where(codigo != "", None)
+    return df_csv
+
+
+def ids_unidades(nomes: pd.Series, unidades_df: pd.DataFrame) -> pd.Series:
+    """unidade_id de cada nome da planilha (NaN quando não casa); normaliza só os nomes distintos."""
+    mapa_unidade = mapa_unidades(unidades_df)
+    distintos = pd.Series(nomes.dropna().unique())
+    ids = dict(zip(distintos, distintos.map(lambda n: mapa_unidade.get(normalizar(n)))))
+    return nomes.map(ids).astype(float)
+
+
+def _texto(serie: pd.Series, padrao: str) -> pd.Series:
+    """Texto aparado; vazio ou ausente vira `padrao`."""
+    vazio = serie.isna() | (serie.astype(str) == "")
+    return serie.astype(str).where(~vazio, padrao).str.strip()
+
+
+def _coluna(df: pd.DataFrame, nome: str) -> pd.Series:
+    return df[nome] if nome in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+
+def ids_por_codigo(codigos) -> dict:
+    """Código da reserva -> id das locações já gravadas com esses códigos."""
+    codigos = sorted({c for c in codigos if isinstance(c, str) and c})
+    achados = {}
+    conn = conectar()
+    try:
+        # Em lotes, abaixo do limite de parâmetros por consulta
+        for i in range(0, len(codigos), 500):
+            parte = codigos[i:i + 500]
+            achados.update(conn.execute(
+                f"SELECT codigo_reserva, id FROM locacoes WHERE codigo_reserva IN ({', '.join('?' * len(parte))})",
+                parte
+            ).fetchall())
+    finally:
+        conn.close()
+    return achados
+
+
+def conflitos_locacoes(df_csv: pd.DataFrame, unidades_df: pd.DataFrame, sobrescrever=False,
+                       atualizar=False) -> pd.DataFrame:
+    """Linhas do CSV preparado que se sobrepõem a reservas gravadas (ou, ao sobrescrever, só entre si).
+
+    Ao atualizar, a reserva gravada com o mesmo código da linha não conta:
+    é ela que a linha vai substituir.
+    """
+    lote = df_csv[["checkin", "checkout"]].assign(unidade_id=ids_unidades(df_csv["unidade"], unidades_df))
+    if sobrescrever:
+        return conflitos_lote(lote)
+    ignorar = ids_por_codigo(_coluna(df_csv, "codigo_reserva")).values() if atualizar else ()
+    return conflitos_no_banco(lote, ignorar_ids=list(ignorar))
+
+
+# Motivos de descarte, na ordem em que são conferidos
+MOTIVO_UNIDADE = "unidade não cadastrada"
+MOTIVO_DATA = "check-in/check-out inválido"
+MOTIVO_CODIGO_REPETIDO = "código de reserva repetido no arquivo"
+MOTIVO_CODIGO_CADASTRADO = "código de reserva já cadastrado"
+MOTIVO_CONFLITO = "sobreposição com outra reserva"
+
+_COLUNAS_LOCACAO = ["unidade_id", "checkin", "checkout", "hospede", "valor", "plataforma", "status_pagamento",
+                    "codigo_reserva"]
+
+_INSERT_LOCACAO = (
+    f"INSERT INTO locacoes ({', '.join(_COLUNAS_LOCACAO)}) VALUES ({', '.join('?' * len(_COLUNAS_LOCACAO))})"
+)
+# Reimportação: a linha com código já gravado atualiza a locação, e só quando algum campo mudou
+_UPSERT_LOCACAO = _INSERT_LOCACAO + f"""
+    ON CONFLICT(codigo_reserva) DO UPDATE SET
+        {', '.join(f"{c}=excluded.{c}" for c in _COLUNAS_LOCACAO[:-1])}
+    WHERE ({', '.join(_COLUNAS_LOCACAO[:-1])}) IS NOT ({', '.join(f"excluded.{c}" for c in _COLUNAS_LOCACAO[:-1])})
+"""
+
+
+def importar_locacoes(df_csv: pd.DataFrame, unidades_df: pd.DataFrame, sobrescrever=False, atualizar=False):
+    """Grava as locações preparadas num único executemany, pulando as inválidas e as sobrepostas.
+
+    Tudo roda numa transação (inclusive a limpeza ao sobrescrever). Com
+    `atualizar`, linhas cujo código de reserva já está gravado atualizam a
+    locação (INSERT ... ON CONFLICT DO UPDATE) em vez de serem puladas; linhas
+    sem código são sempre inseridas. Código repetido no arquivo: vale a última
+    linha. Retorna (inseridos, atualizados, pulados, motivos), com
+    motivos = {motivo: quantidade}.
+    """
+    uid = ids_unidades(df_csv["unidade"], unidades_df)
+    codigo = _coluna(df_csv, "codigo_reserva")
+    motivo = pd.Series(None, index=df_csv.index, dtype=object)
+    motivo[uid.isna()] = MOTIVO_UNIDADE
+    datas_ok = df_csv["checkin"].notna() & df_csv["checkout"].notna()
+    motivo[motivo.isna() & ~datas_ok] = MOTIVO_DATA
+    com_codigo = codigo.notna() & motivo.isna()
+    motivo[com_codigo & codigo.where(com_codigo).duplicated(keep="last")] = MOTIVO_CODIGO_REPETIDO
+    cadastrados = ids_por_codigo(codigo[motivo.isna()]) if not sobrescrever else {}
+    if not atualizar:
+        motivo[motivo.isna() & codigo.isin(list(cadastrados))] = MOTIVO_CODIGO_CADASTRADO
+    if motivo.isna().any():
+        candidatas = df_csv[motivo.isna().to_numpy()]
+        em_conflito = df_csv.index.isin(conflitos_locacoes(candidatas, unidades_df, sobrescrever, atualizar)["linha"])
+        motivo[motivo.isna() & em_conflito] = MOTIVO_CONFLITO
+
+    ok = motivo.isna().to_numpy()
+    validas = df_csv[ok]
+    valor = pd.to_numeric(_coluna(validas, "valor"), errors="coerce").fillna(0.0)
+    registros = pd.DataFrame({
+        "unidade_id": uid[ok].astype(int),
+        "checkin": validas["checkin"].astype(str),
+        "checkout": validas["checkout"].astype(str),
+        "hospede": _texto(_coluna(validas, "hospede"), ""),
+        "valor": valor.astype(float),
+        "plataforma": _texto(_coluna(validas, "plataforma"), "Direto"),
+        "status_pagamento": _texto(_coluna(validas, "status_pagamento"), "Pendente"),
+        "codigo_reserva": codigo[ok],
+    })
+    existentes = int(registros["codigo_reserva"].isin(list(cadastrados)).sum()) if atualizar else 0
+
+    conn = conectar()
+    try:
+        if sobrescrever:
+            conn.execute("DELETE FROM locacoes")
+        cur = conn.executemany(_UPSERT_LOCACAO if atualizar else _INSERT_LOCACAO, registros[_COLUNAS_LOCACAO].itertuples(index=False, name=None))
+        # rowcount soma inserções e atualizações efetivas; o upsert sem mudança não conta
+        atualizados = max(cur.rowcount, 0) - (len(registros) - existentes) if atualizar else 0
+        aplicar_pendencias(conn)  # o resumo mensal sai atualizado no mesmo commit
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(registros) - existentes, atualizados, int((~ok).sum()), motivo.value_counts().to_dict()
+
+
+def importar_csv_em_blocos(arquivo, unidades_df: pd.DataFrame, sobrescrever=False, atualizar=False,
+                           linhas_por_bloco=LINHAS_POR_BLOCO, progresso=None):
+    """Importa o CSV bloco a bloco (preparar -> validar -> gravar), com memória constante.
+
+    Cada bloco é gravado e commitado antes do próximo ser lido; ao sobrescrever,
+    a tabela é limpa só no primeiro. A checagem de sobreposição de cada bloco
+    enxerga os blocos anteriores, já gravados. `progresso(fracao, linhas_lidas)`
+    é chamado depois de cada bloco. Retorna (inseridos, atualizados, pulados, motivos).
+
+    Ao sobrescrever, a limpeza é commitada com o primeiro bloco: se um bloco
+    seguinte falhar (CSV malformado, erro ao gravar), as locações antigas já
+    foram apagadas e ficam só os blocos anteriores. O erro levantado diz isso
+    (ver AVISO_SOBRESCREVER_LOCACOES). Um arquivo de um bloco só é atômico.
+    """
+    inicio = arquivo.tell()
+    total = arquivo.seek(0, os.SEEK_END) - inicio
+    arquivo.seek(inicio)
+
+    inseridos, atualizados, pulados, motivos, lidas = 0, 0, 0, {}, 0
+    try:
+        for bloco in blocos_csv_locacoes(arquivo, linhas_por_bloco):
+            faltando = colunas_faltando(bloco, OBRIGATORIAS_LOCACOES)
+            if faltando:
+                raise ValueError(f"Faltam colunas obrigatórias no CSV: {', '.join(faltando)}")
+            ins, atu, pul, mot = importar_locacoes(
+                preparar_locacoes(bloco), unidades_df, sobrescrever=sobrescrever and lidas == 0, atualizar=atualizar
+            )
+            inseridos, atualizados, pulados, lidas = inseridos + ins, atualizados + atu, pulados + pul, lidas + len(bloco)
+            for motivo, n in mot.items():
+                motivos[motivo] = motivos.get(motivo, 0) + n
+            if progresso is not None:
+                progresso(min((arquivo.tell() - inicio) / total, 1.0) if total else 1.0, lidas)
+    except Exception as e:
+        if sobrescrever and lidas:
+            raise ValueError(
+                f"Importação interrompida depois de {lidas} linhas ({e}). As locações antigas já tinham sido "
+                f"apagadas; ficaram só as {inseridos} importadas até aqui."
+            ) from e
+        raise
+    return inseridos, atualizados, pulados, motivos
+
+
+# ---------------- Despesas (Excel) ----------------
+def ler_excel_despesas(arquivo) -> pd.DataFrame:
+    return padronizar_colunas(pd.read_excel(arquivo, dtype=str), ALIAS_DESPESAS)
+
+
+# Textos que o pd.read_excel trata como ausentes (na_values padrão do pandas)
+_AUSENTES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+
+def _texto_celula(v):
+    """Célula como o pd.read_excel(dtype=str) + padronizar_colunas a entregam: texto aparado ou NaN.
+
+    Número inteiro vira "5" (não "5.0"), data vira "AAAA-MM-DD hh:mm:ss" e
+    células de erro (#DIV/0!, ...) ficam ausentes.
+    """
+    if v is None:
+        return np.nan
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    elif isinstance(v, str) and (v in _AUSENTES or v in ERROR_CODES):
+        return np.nan
+    return str(v).strip()
+
+
+def _indices_alias(cabecalho: list, alias: dict) -> dict:
+    """Coluna padronizada -> posição no cabeçalho, com a mesma escolha de padronizar_colunas."""
+    nomes = ["" if c is None else str(c).strip().lower() for c in cabecalho]
+    indices = {}
+    for coluna, alternativas in alias.items():
+        for alt in alternativas:
+            if alt in nomes:
+                indices[coluna] = nomes.index(alt)  # repetida: vale a primeira, como no pandas
+                break
+    return indices
+
+
+def _vazia(linha) -> bool:
+    return all(v is None or v == "" for v in linha)
+
+
+def blocos_excel_despesas(arquivo, linhas_por_bloco=LINHAS_POR_BLOCO, progresso=None):
+    """Lê a primeira planilha em blocos, só com as colunas mapeadas por ALIAS_DESPESAS.
+
+    A planilha é percorrida linha a linha (openpyxl read_only, iter_rows com
+    values_only), sem montar a pasta de trabalho em memória, e de cada linha só
+    as colunas mapeadas viram texto. Os valores saem iguais aos de
+    ler_excel_despesas (linhas vazias no fim são descartadas; no meio, viram
+    linhas em branco). `progresso(fracao, linhas_lidas)` é chamado a cada bloco
+    entregue. Arquivo que não é .xlsx (.xls) cai no ler_excel_despesas, num
+    bloco só.
+    """
+    inicio = arquivo.tell()
+    eh_xlsx = zipfile.is_zipfile(arquivo)
+    arquivo.seek(inicio)
+    if not eh_xlsx:
+        df_excel = ler_excel_despesas(arquivo)  # .xls: lido inteiro, num bloco só
+        yield df_excel
+        if progresso is not None:
+            progresso(1.0, len(df_excel))
+        return
+
+    livro = load_workbook(arquivo, read_only=True, data_only=True, keep_links=False)
+    try:
+        planilha = livro.worksheets[0]
+        total = max((planilha.max_row or 1) - 1, 1)  # pelo <dimension>, quando existe; só para o progresso
+        # O <dimension> pode estar errado (alguns geradores gravam "A1"): lê até a última linha do arquivo.
+        # Assim cada linha sai com o próprio tamanho e as ausentes do XML saem vazias, ()
+        planilha.reset_dimensions()
+        linhas = planilha.iter_rows(values_only=True)
+        indices = _indices_alias(list(next(linhas, ())), ALIAS_DESPESAS)  # cabeçalho na linha 1
+        colunas, posicoes = list(indices), list(indices.values())
+        bloco, vazias, lidas = [], 0, 0
+        for linha in linhas:
+            if _vazia(linha):
+                vazias += 1  # só entra se aparecer uma linha com dados depois
+                continue
+            bloco.extend([[np.nan] * len(colunas)] * vazias)
+            vazias = 0
+            bloco.append([_texto_celula(linha[i] if i < len(linha) else None) for i in posicoes])
+            if len(bloco) >= linhas_por_bloco:
+                lidas += len(bloco)
+                yield pd.DataFrame(bloco, columns=colunas, dtype=object)
+                if progresso is not None:
+                    progresso(min(lidas / total, 1.0), lidas)
+                bloco = []
+        if bloco or lidas == 0:
+            lidas += len(bloco)
+            yield pd.DataFrame(bloco, columns=colunas, dtype=object)
+            if progresso is not None:
+                progresso(1.0, lidas)
+    finally:
+        livro.close()
+
+
+def primeiro_bloco_excel(arquivo, linhas_por_bloco=LINHAS_POR_BLOCO) -> pd.DataFrame:
+    """Só o primeiro bloco da planilha (prévia); o arquivo volta para o início."""
+    inicio = arquivo.tell()
+    blocos = blocos_excel_despesas(arquivo, linhas_por_bloco)
+    try:
+        return next(blocos)
+    finally:
+        blocos.close()
+        arquivo.seek(inicio)
+
+
+def preparar_despesas(df_excel: pd.DataFrame) -> pd.DataFrame:
+    df_excel["data"] = pd.to_datetime(df_excel["data"], dayfirst=True, errors="coerce").dt.date
+    df_excel["valor"] = parse_valor_series(df_excel["valor"])
+    df_excel["descricao"] = _coluna(df_excel, "descricao").fillna("")
+    return df_excel
+
+
+# Motivos de descarte das despesas, na ordem em que são conferidos
+MOTIVO_DATA_DESPESA = "data inválida"
+MOTIVO_TIPO = "tipo ausente"
+
+_COLUNAS_DESPESA = ["unidade_id", "data", "tipo", "valor", "descricao"]
+_INSERT_DESPESA = (
+    f"INSERT INTO despesas ({', '.join(_COLUNAS_DESPESA)}) VALUES ({', '.join('?' * len(_COLUNAS_DESPESA))})"
+)
+
+
+def importar_despesas(df_excel: pd.DataFrame, unidades_df: pd.DataFrame, sobrescrever=False):
+    """Grava as despesas preparadas num único executemany, pulando as inválidas.
+
+    A validação é por coluna, sobre o que preparar_despesas converteu: unidade
+    não cadastrada, data que não virou data e tipo vazio descartam a linha. Tudo
+    roda numa transação (inclusive a limpeza ao sobrescrever). Retorna
+    (inseridos, pulados, motivos), com motivos = {motivo: quantidade}.
+    """
+    uid = ids_unidades(df_excel["unidade"], unidades_df)
+    tipo = _texto(_coluna(df_excel, "tipo"), "")
+    motivo = pd.Series(None, index=df_excel.index, dtype=object)
+    motivo[uid.isna()] = MOTIVO_UNIDADE
+    motivo[motivo.isna() & df_excel["data"].isna()] = MOTIVO_DATA_DESPESA
+    motivo[motivo.isna() & (tipo == "")] = MOTIVO_TIPO
+
+    ok = motivo.isna().to_numpy()
+    validas = df_excel[ok]
+    registros = pd.DataFrame({
+        "unidade_id": uid[ok].astype(int),
+        "data": validas["data"].astype(str),
+        "tipo": tipo[ok],
+        "valor": pd.to_numeric(_coluna(validas, "valor"), errors="coerce").fillna(0.0).astype(float),
+        "descricao": _coluna(validas, "descricao").fillna("").astype(str),
+    })
+
+    conn = conectar()
+    try:
+        if sobrescrever:
+            conn.execute("DELETE FROM despesas")
+        conn.executemany(_INSERT_DESPESA, registros[_COLUNAS_DESPESA].itertuples(index=False, name=None))
+        aplicar_pendencias(conn)  # o resumo mensal sai atualizado no mesmo commit
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(registros), int((~ok).sum()), motivo.value_counts().to_dict()
+
+
+def importar_excel_em_blocos(arquivo, unidades_df: pd.DataFrame, sobrescrever=False,
+                             linhas_por_bloco=LINHAS_POR_BLOCO, progresso=None):
+    """Importa a planilha de despesas bloco a bloco (ler -> preparar -> gravar), com memória constante.
+
+    Cada bloco é gravado e commitado antes do próximo ser lido; ao sobrescrever,
+    a tabela é limpa só no primeiro. `progresso(fracao, linhas_lidas)` é chamado
+    depois de cada bloco. Retorna (inseridos, pulados, motivos).
+    """
+    inseridos, pulados, motivos, primeiro = 0, 0, {}, True
+    for bloco in blocos_excel_despesas(arquivo, linhas_por_bloco, progresso):
+        faltando = colunas_faltando(bloco, OBRIGATORIAS_DESPESAS)
+        if faltando:
+            raise ValueError(f"Faltam colunas obrigatórias no Excel: {', '.join(faltando)}")
+        ins, pul, mot = importar_despesas(
+            preparar_despesas(bloco), unidades_df, sobrescrever=sobrescrever and primeiro
+        )
+        inseridos, pulados, primeiro = inseridos + ins, pulados + pul, False
+        for motivo, n in mot.items():
+            motivos[motivo] = motivos.get(motivo, 0) + n
+    return inseridos, pulados, motivos
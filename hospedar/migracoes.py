@@ -0,0 +1,333 @@
+# hospedar/migracoes.py
+"""Migrações de esquema versionadas por PRAGMA user_version.
+
+Cada passo roda uma única vez, em ordem, dentro de uma transação; nas
+inicializações seguintes basta ler o user_version para saber que não há nada
+a fazer. Passos novos entram no fim de MIGRACOES com o próximo número.
+"""
+from hospedar.banco import conectar
+from hospedar.resumo import aplicar_pendencias, marcar_pendente, marcar_tudo
+
+
+def _m001_tabelas_base(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS unidades (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT,
+            localizacao TEXT,
+            capacidade INTEGER,
+            status TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS locacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            unidade_id INTEGER,
+            checkin DATE,
+            checkout DATE,
+            hospede TEXT,
+            valor REAL,
+            plataforma TEXT,
+            status_pagamento TEXT,
+            FOREIGN KEY(unidade_id) REFERENCES unidades(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS despesas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            unidade_id INTEGER,
+            data DATE,
+            tipo TEXT,
+            valor REAL,
+            descricao TEXT,
+            FOREIGN KEY(unidade_id) REFERENCES unidades(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS precos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            unidade_id INTEGER,
+            temporada TEXT,
+            preco_base REAL,
+            FOREIGN KEY(unidade_id) REFERENCES unidades(id)
+        )
+    """)
+
+
+def _m002_administracao(conn):
+    # Bancos anteriores ao versionamento podem já ter as colunas
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(unidades)")}
+    if "administracao" not in cols:
+        conn.execute("ALTER TABLE unidades ADD COLUMN administracao TEXT DEFAULT 'Não'")
+    if "percentual_administracao" not in cols:
+        conn.execute("ALTER TABLE unidades ADD COLUMN percentual_administracao REAL DEFAULT 0.0")
+
+
+# Índices secundários usados pelos filtros dos relatórios (unidade, período, data).
+INDICES = {
+    "idx_locacoes_unidade_periodo": "CREATE INDEX IF NOT EXISTS idx_locacoes_unidade_periodo ON locacoes(unidade_id, checkin, checkout)",
+    "idx_locacoes_checkin": "CREATE INDEX IF NOT EXISTS idx_locacoes_checkin ON locacoes(checkin)",
+    "idx_locacoes_checkout": "CREATE INDEX IF NOT EXISTS idx_locacoes_checkout ON locacoes(checkout)",
+    "idx_despesas_unidade_data": "CREATE INDEX IF NOT EXISTS idx_despesas_unidade_data ON despesas(unidade_id, data)",
+    "idx_despesas_data": "CREATE INDEX IF NOT EXISTS idx_despesas_data ON despesas(data)",
+    "idx_precos_unidade_temporada": "CREATE INDEX IF NOT EXISTS idx_precos_unidade_temporada ON precos(unidade_id, temporada)",
+}
+
+
+def _m003_indices(conn):
+    for sql in INDICES.values():
+        conn.execute(sql)
+    # Atualiza as estatísticas do planejador para ele passar a usar os índices novos
+    conn.execute("ANALYZE")
+
+
+# Tabela fato de noites: uma linha por noite de cada reserva (day-use = 1 linha no check-in),
+# com o valor rateado por diária. Triggers em locacoes mantêm as linhas em dia.
+CALENDARIO_INICIO, CALENDARIO_FIM = "1990-01-01", "2100-12-31"
+
+
+def _noites_da_reserva(r: str, origem: str = "") -> list:
+    """INSERTs que expandem a reserva `r` nas suas noites.
+
+    Nos triggers `r` é NEW; na carga inicial, o alias de `origem` ("locacoes l").
+    """
+    tabelas = f"{origem} JOIN calendario c" if origem else "calendario c"
+    de = f"FROM {origem} " if origem else ""
+    return [
+        f"""INSERT INTO noites (locacao_id, unidade_id, data, valor, day_use)
+            SELECT {r}.id, {r}.unidade_id, c.dia,
+                   COALESCE({r}.valor, 0) / (julianday(date({r}.checkout)) - julianday(date({r}.checkin))), 0
+            FROM {tabelas}
+            WHERE c.dia >= date({r}.checkin) AND c.dia < date({r}.checkout)""",
+        f"""INSERT INTO noites (locacao_id, unidade_id, data, valor, day_use)
+            SELECT {r}.id, {r}.unidade_id, date({r}.checkin), COALESCE({r}.valor, 0), 1
+            {de}WHERE date({r}.checkout) <= date({r}.checkin)""",
+    ]
+
+
+def _m004_noites(conn):
+    # Triggers não aceitam WITH RECURSIVE: as noites saem de uma tabela de dias
+    conn.execute("CREATE TABLE IF NOT EXISTS calendario (dia TEXT PRIMARY KEY) WITHOUT ROWID")
+    conn.execute(f"""
+        INSERT OR IGNORE INTO calendario (dia)
+        WITH RECURSIVE d(dia) AS (
+            SELECT '{CALENDARIO_INICIO}'
+            UNION ALL SELECT date(dia, '+1 day') FROM d WHERE dia < '{CALENDARIO_FIM}'
+        )
+        SELECT dia FROM d
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS noites (
+            locacao_id INTEGER NOT NULL,
+            unidade_id INTEGER,
+            data TEXT NOT NULL,
+            valor REAL NOT NULL,
+            day_use INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (locacao_id, data)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_noites_unidade_data ON noites(unidade_id, data)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_noites_data ON noites(data)")
+
+    corpo = ";\n".join(_noites_da_reserva("NEW"))
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_noites_insert AFTER INSERT ON locacoes
+        BEGIN
+            {corpo};
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_noites_update AFTER UPDATE OF unidade_id, checkin, checkout, valor ON locacoes
+        WHEN OLD.unidade_id IS NOT NEW.unidade_id OR OLD.checkin IS NOT NEW.checkin
+          OR OLD.checkout IS NOT NEW.checkout OR OLD.valor IS NOT NEW.valor
+        BEGIN
+            DELETE FROM noites WHERE locacao_id = OLD.id;
+            {corpo};
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_noites_delete AFTER DELETE ON locacoes
+        BEGIN
+            DELETE FROM noites WHERE locacao_id = OLD.id;
+        END
+    """)
+
+    # Carga inicial com as reservas que já existem
+    conn.execute("DELETE FROM noites")
+    for sql in _noites_da_reserva("l", "locacoes l"):
+        conn.execute(sql)
+    conn.execute("ANALYZE noites")
+
+
+# Triggers do resumo: (tabela, colunas que mexem no resumo, coluna da data)
+_TABELAS_RESUMO = (
+    ("locacoes", "unidade_id, checkin, valor", "checkin"),
+    ("noites", "unidade_id, data, day_use", "data"),
+    ("despesas", "unidade_id, data, tipo, valor", "data"),
+)
+
+
+def _triggers_resumo(conn):
+    # Triggers só anotam as células afetadas; o recálculo fica para aplicar_pendencias
+    for tabela, colunas, data in _TABELAS_RESUMO:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_resumo_{tabela}_insert AFTER INSERT ON {tabela}
+            BEGIN
+                {marcar_pendente("NEW.unidade_id", f"NEW.{data}")};
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_resumo_{tabela}_update AFTER UPDATE OF {colunas} ON {tabela}
+            BEGIN
+                {marcar_pendente("OLD.unidade_id", f"OLD.{data}")};
+                {marcar_pendente("NEW.unidade_id", f"NEW.{data}")};
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_resumo_{tabela}_delete AFTER DELETE ON {tabela}
+            BEGIN
+                {marcar_pendente("OLD.unidade_id", f"OLD.{data}")};
+            END
+        """)
+
+
+def _m005_resumo_mensal(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_mensal (
+            unidade_id INTEGER NOT NULL,
+            ano INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            receita REAL NOT NULL DEFAULT 0,
+            reservas INTEGER NOT NULL DEFAULT 0,
+            noites INTEGER NOT NULL DEFAULT 0,
+            despesa REAL NOT NULL DEFAULT 0,
+            despesas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (unidade_id, ano, mes)
+        ) WITHOUT ROWID
+    """)
+    # tipo pode ser NULL: fica numa tabela com rowid, indexada pela célula
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_despesas (
+            unidade_id INTEGER NOT NULL,
+            ano INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            tipo TEXT,
+            despesa REAL NOT NULL DEFAULT 0,
+            despesas INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_resumo_despesas_celula ON resumo_despesas(unidade_id, ano, mes, tipo)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_resumo_despesas_ano ON resumo_despesas(ano, mes)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_pendente (
+            unidade_id INTEGER NOT NULL,
+            ano INTEGER NOT NULL,
+            mes INTEGER NOT NULL,
+            PRIMARY KEY (unidade_id, ano, mes)
+        ) WITHOUT ROWID
+    """)
+
+    _triggers_resumo(conn)
+
+    # Carga inicial
+    conn.execute("DELETE FROM resumo_mensal")
+    conn.execute("DELETE FROM resumo_despesas")
+    marcar_tudo(conn)
+    aplicar_pendencias(conn)
+
+
+def _m006_codigo_reserva(conn):
+    # Código da reserva na plataforma (opcional): chave da reimportação com upsert.
+    # Índice único comum: NULLs não colidem, então locações sem código continuam livres.
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(locacoes)")}
+    if "codigo_reserva" not in cols:
+        conn.execute("ALTER TABLE locacoes ADD COLUMN codigo_reserva TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_locacoes_codigo_reserva ON locacoes(codigo_reserva)")
+
+    # Triggers do resumo criados com INSERT OR IGNORE falham dentro de um upsert: recria
+    for tabela, _colunas, _data in _TABELAS_RESUMO:
+        for evento in ("insert", "update", "delete"):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_resumo_{tabela}_{evento}")
+    _triggers_resumo(conn)
+
+
+def _m007_jobs(conn):
+    # Importações em segundo plano (hospedar.tarefas): status, progresso e resumo final de cada uma
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            arquivo TEXT,
+            modo TEXT,
+            status TEXT NOT NULL,
+            progresso REAL NOT NULL DEFAULT 0,
+            linhas INTEGER NOT NULL DEFAULT 0,
+            inseridos INTEGER,
+            atualizados INTEGER,
+            pulados INTEGER,
+            motivos TEXT,
+            erro TEXT,
+            pid INTEGER,
+            criado_em TEXT NOT NULL,
+            iniciado_em TEXT,
+            concluido_em TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_tipo_status ON jobs(tipo, status)")
+
+
+def _m008_jobs_instancia(conn):
+    # Token de cada execução do servidor: o pid sozinho se repete depois de um reinício (pid 1 em contêiner)
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+    if "instancia" not in cols:
+        conn.execute("ALTER TABLE jobs ADD COLUMN instancia TEXT")
+
+
+# (versão, descrição, passo) — sempre em ordem crescente de versão
+MIGRACOES = [
+    (1, "tabelas base", _m001_tabelas_base),
+    (2, "colunas de administração em unidades", _m002_administracao),
+    (3, "índices secundários", _m003_indices),
+    (4, "tabela fato de noites mantida por triggers", _m004_noites),
+    (5, "resumo mensal por unidade mantido de forma incremental", _m005_resumo_mensal),
+    (6, "código da reserva com índice único em locacoes", _m006_codigo_reserva),
+    (7, "tabela de tarefas de importação em segundo plano", _m007_jobs),
+    (8, "token da execução do servidor em jobs", _m008_jobs_instancia),
+]
+
+VERSAO_ATUAL = MIGRACOES[-1][0]
+
+
+def versao_esquema(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrar(conn) -> list:
+    """Aplica as migrações pendentes numa transação. Retorna as versões aplicadas."""
+    if versao_esquema(conn) >= VERSAO_ATUAL:
+        return []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Relê com o lock de escrita: outro processo pode ter migrado enquanto esperávamos
+        atual = versao_esquema(conn)
+        aplicadas = []
+        for versao, _descricao, passo in MIGRACOES:
+            if versao > atual:
+                passo(conn)
+                aplicadas.append(versao)
+        if aplicadas:
+            conn.execute(f"PRAGMA user_version = {int(aplicadas[-1])}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return aplicadas
+
+
+def inicializar_db():
+    """Garante o esquema atualizado; custa um PRAGMA quando não há migração pendente."""
+    conn = conectar()
+    try:
+        return migrar(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,399 @@
+# hospedar/ocupacao.py
+"""Motor de ocupação: noites, receita proporcional ao período e calendário por unidade.
+
+Convenções usadas em todos os apps:
+- a noite do check-out não é cobrada (reserva ocupa [checkin, checkout));
+- day-use (checkin >= checkout) conta 1 diária no dia do check-in.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+LIQUIDO_FATOR = 0.87  # valor líquido = bruto - 13%
+
+
+def noites_no_periodo(ci: date, co: date, inicio: date, fim: date) -> int:
+    """Noites da reserva dentro de [inicio, fim]; day-use conta 1 se o check-in cair no período."""
+    if ci >= co:
+        return 1 if (inicio <= ci <= fim) else 0
+    ini = max(ci, inicio)
+    ate = min(co, fim)
+    return max(0, (ate - ini).days)
+
+
+def valor_no_periodo(ci: date, co: date, valor: float, inicio: date, fim: date) -> float:
+    """Parte do valor da reserva proporcional às noites dentro de [inicio, fim]."""
+    total_noites = 1 if ci >= co else max(1, (co - ci).days)
+    v_dia = float(valor or 0.0) / total_noites
+    return v_dia * noites_no_periodo(ci, co, inicio, fim)
+
+
+# Códigos de status da matriz unidade x dia
+LIVRE, OCUPADO, CHECKIN, CHECKOUT, DAY_USE = 0, 1, 2, 3, 4
+ICONES = np.array(["", "🟧", "🟦", "◧", "🟧"], dtype=object)
+
+_NOITE, _MARCA_CHECKIN, _MARCA_CHECKOUT = 0, 1, 2  # fases dentro de uma reserva
+
+
+def _dias(valores) -> tuple:
+    """Datas -> (dias desde 1970-01-01 como int64, máscara de datas válidas)."""
+    d = pd.to_datetime(pd.Series(valores), errors="coerce", format="mixed").dt.normalize()
+    validas = d.notna().to_numpy()
+    return d.to_numpy(dtype="datetime64[D]").astype(np.int64), validas
+
+
+def _dia_epoca(d) -> int:
+    return int(np.datetime64(pd.Timestamp(d).date(), "D").astype(np.int64))
+
+
+def reservas_em_dias(locacoes_df: pd.DataFrame) -> tuple:
+    """(checkin, checkout, valor, validas): datas em dias desde 1970-01-01 e valor ausente como 0."""
+    ci, ok_ci = _dias(locacoes_df["checkin"])
+    co, ok_co = _dias(locacoes_df["checkout"])
+    validas = ok_ci & ok_co
+    if "valor" in locacoes_df.columns:
+        valor = pd.to_numeric(locacoes_df["valor"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+    else:
+        valor = np.zeros(len(locacoes_df))
+    return np.where(validas, ci, 0), np.where(validas, co, 0), valor, validas
+
+
+def periodos_mensais(inicio: date, fim: date) -> list:
+    """Divide [inicio, fim] em meses: [(inicio, fim), ...] recortados nas pontas."""
+    meses = pd.date_range(pd.Timestamp(inicio).replace(day=1), fim, freq="MS")
+    return [
+        (max(m.date(), inicio), min((m + pd.offsets.MonthEnd(0)).date(), fim))
+        for m in meses
+    ]
+
+
+def ratear(locacoes_df: pd.DataFrame, periodos: list, ate_fim=True) -> tuple:
+    """Noites e receita de cada reserva em cada período, numa passada só.
+
+    `periodos` é uma lista de (inicio, fim); retorna duas matrizes reservas x
+    períodos, (noites, receita). A receita é rateada por diária: valor / noites
+    da reserva, e day-use vale 1 diária no dia do check-in.
+
+    Com `ate_fim` o período inclui a noite de `fim`, então meses consecutivos
+    contam cada noite uma única vez. `ate_fim=False` é a regra de
+    noites_no_periodo, usada no card de receita e na Administradora: a noite de
+    `fim` fica de fora, mas um day-use em `fim` conta.
+    """
+    ci, co, valor, validas = reservas_em_dias(locacoes_df)
+    a = np.array([_dia_epoca(p[0]) for p in periodos], dtype=np.int64)
+    b = np.array([_dia_epoca(p[1]) for p in periodos], dtype=np.int64)
+    limite = b + 1 if ate_fim else b
+
+    ci_, co_ = ci[:, None], co[:, None]
+    noites = np.where(
+        ci_ >= co_,
+        (ci_ >= a) & (ci_ <= b),
+        np.maximum(0, np.minimum(co_, limite) - np.maximum(ci_, a)),
+    )
+    noites = np.where(validas[:, None], noites, 0).astype(np.int64)
+    total_noites = np.where(ci >= co, 1, np.maximum(1, co - ci))
+    receita = (valor / total_noites)[:, None] * noites
+    return noites, receita
+
+
+def noites_por_reserva(locacoes_df: pd.DataFrame, inicio: date, fim: date) -> np.ndarray:
+    """Versão vetorizada de `noites_no_periodo` para todas as reservas (datas inválidas contam 0)."""
+    return ratear(locacoes_df, [(inicio, fim)], ate_fim=False)[0][:, 0]
+
+
+def receita_no_periodo(locacoes_df: pd.DataFrame, inicio: date, fim: date) -> float:
+    """Receita das reservas rateada por noite dentro de [inicio, fim] (com day-use)."""
+    if locacoes_df.empty:
+        return 0.0
+    return float(ratear(locacoes_df, [(inicio, fim)], ate_fim=False)[1].sum())
+
+
+def rateio_mensal(locacoes_df: pd.DataFrame, inicio: date, fim: date) -> pd.DataFrame:
+    """Noites e receita rateadas por unidade e mês de [inicio, fim] (colunas unidade_id, ano, mes, noites, receita)."""
+    colunas = ["unidade_id", "ano", "mes", "noites", "receita"]
+    periodos = periodos_mensais(inicio, fim) if inicio <= fim else []
+    if locacoes_df.empty or not periodos:
+        return pd.DataFrame(columns=colunas)
+
+    noites, receita = ratear(locacoes_df, periodos)
+    codigos, unidades = pd.factorize(locacoes_df["unidade_id"])
+    ok = codigos >= 0
+    noites_u = np.zeros((len(unidades), len(periodos)), dtype=np.int64)
+    receita_u = np.zeros((len(unidades), len(periodos)))
+    np.add.at(noites_u, codigos[ok], noites[ok])
+    np.add.at(receita_u, codigos[ok], receita[ok])
+
+    return pd.DataFrame({
+        "unidade_id": np.repeat(unidades, len(periodos)),
+        "ano": np.tile([p[0].year for p in periodos], len(unidades)),
+        "mes": np.tile([p[0].month for p in periodos], len(unidades)),
+        "noites": noites_u.ravel(),
+        "receita": receita_u.ravel(),
+    }, columns=colunas)
+
+
+def ocupacao_por_unidade(locacoes_df: pd.DataFrame, inicio: date, fim: date) -> pd.DataFrame:
+    """Noites ocupadas e taxa (%) de cada unidade com reserva, em [inicio, fim].
+
+    Colunas: unidade_id, noites, dias (noites disponíveis na janela) e taxa."""
+    if locacoes_df.empty or inicio > fim:
+        return pd.DataFrame({"unidade_id": [], "noites": [], "dias": [], "taxa": []})
+
+    codigos, unidades = pd.factorize(locacoes_df["unidade_id"], use_na_sentinel=False)
+    noites = np.bincount(codigos, weights=noites_por_reserva(locacoes_df, inicio, fim),
+                         minlength=len(unidades)).astype(np.int64)
+    dias = (fim - inicio).days + 1
+    return pd.DataFrame({
+        "unidade_id": unidades,
+        "noites": noites,
+        "dias": dias,
+        "taxa": np.round(noites / dias * 100, 1),
+    })
+
+
+def resumo_ocupacao(locacoes_df: pd.DataFrame, inicio: date, fim: date):
+    """Retorna (noites_ocupadas, taxa_ocupacao%) somando as unidades com reserva.
+    Day-use (checkin >= checkout) conta 1 noite no dia do check-in."""
+    por_unidade = ocupacao_por_unidade(locacoes_df, inicio, fim)
+    if por_unidade.empty:
+        return 0, 0.0
+
+    noites_ocupadas = int(por_unidade["noites"].sum())
+    noites_total = int(por_unidade["dias"].sum())
+    taxa = (noites_ocupadas / noites_total * 100) if noites_total else 0.0
+    return noites_ocupadas, round(taxa, 1)
+
+
+def _reservas_em_linhas(unidade_ids, locacoes_df: pd.DataFrame, inicio: date):
+    """Arrays alinhados (linha da unidade, checkin, checkout, valor, ordem), em offsets de dia a partir de `inicio`."""
+    pos = {}
+    for i, uid in enumerate(unidade_ids):
+        pos.setdefault(uid, i)
+    linha = locacoes_df["unidade_id"].map(pos)
+    ci, co, valor, validas = reservas_em_dias(locacoes_df)
+    ok = linha.notna().to_numpy() & validas
+    base = _dia_epoca(inicio)
+    ordem = np.arange(len(locacoes_df))[ok]
+    return linha[ok].to_numpy(dtype=np.int64), ci[ok] - base, co[ok] - base, valor[ok], ordem
+
+
+def _primeiro_por_celula(celula: np.ndarray, chave: np.ndarray, ultimo=False) -> np.ndarray:
+    """Índices do evento de menor (ou maior) chave em cada célula."""
+    ordem = np.lexsort((chave, celula))
+    if ultimo:
+        ordem = ordem[::-1]
+    _, primeiros = np.unique(celula[ordem], return_index=True)
+    return ordem[primeiros]
+
+
+def matriz_ocupacao(unidade_ids, locacoes_df: pd.DataFrame, inicio: date, fim: date,
+                    day_use=True, sobrescrever_marcas=False, metodo="noites"):
+    """Matrizes unidade x dia do período: (valores por diária, códigos de status).
+
+    Cada reserva vira um intervalo de offsets [checkin, checkout) — ou só o dia
+    do check-in, para day-use — recortado para a janela, e tudo é preenchido
+    de uma vez. As regras de marcação são as do calendário original,
+    processado reserva a reserva na ordem de `locacoes_df`:
+    - a diária (🟧) sempre ocupa a célula;
+    - check-in/check-out só entram em célula sem diária, e a primeira marca fica
+      (com `sobrescrever_marcas`, vale o último evento: diária, check-in e
+      check-out de cada reserva, nessa ordem).
+
+    `metodo="diferenca"` soma valores e ocupação com arrays de diferença
+    (custo proporcional ao nº de reservas, não ao de noites), útil em janelas
+    longas com muitas estadias compridas; as somas podem diferir da expansão
+    nos últimos bits de ponto flutuante. Como precisa da ordem de cada noite,
+    o modo `sobrescrever_marcas` sempre usa a expansão por noite.
+    """
+    n_unid = len(unidade_ids)
+    n_dias = max(0, (fim - inicio).days + 1)
+    valores = np.zeros((n_unid, n_dias))
+    status = np.zeros((n_unid, n_dias), dtype=np.int8)
+    if n_unid == 0 or n_dias == 0 or locacoes_df.empty:
+        return valores, status
+
+    linha, ci, co, valor, ordem = _reservas_em_linhas(unidade_ids, locacoes_df, inicio)
+    if len(linha) == 0:
+        return valores, status
+
+    # ---- Diárias: [checkin, checkout); day-use conta 1 diária no dia do check-in ----
+    eh_day_use = ci >= co
+    usar = ~eh_day_use | day_use
+    ini = ci
+    fim_excl = np.where(eh_day_use, ci + 1, co)
+    valor_dia = valor / (fim_excl - ini)  # sempre >= 1 diária
+
+    s = np.clip(ini, 0, n_dias)
+    e = np.clip(fim_excl, 0, n_dias)
+    qtd = np.where(usar, np.maximum(e - s, 0), 0)
+    codigo_noite = np.where(eh_day_use, DAY_USE, OCUPADO).astype(np.int8)
+
+    if metodo == "diferenca" and not sobrescrever_marcas:
+        tem = qtd > 0
+        dif_valor = np.zeros((n_unid, n_dias + 1))
+        dif_noites = np.zeros((n_unid, n_dias + 1), dtype=np.int64)
+        regular = tem & ~eh_day_use
+        np.add.at(dif_valor, (linha[tem], s[tem]), valor_dia[tem])
+        np.add.at(dif_valor, (linha[tem], e[tem]), -valor_dia[tem])
+        np.add.at(dif_noites, (linha[regular], s[regular]), 1)
+        np.add.at(dif_noites, (linha[regular], e[regular]), -1)
+        noites = np.cumsum(dif_noites, axis=1)[:, :n_dias]
+        day_uses = np.zeros((n_unid, n_dias), dtype=np.int64)
+        du = tem & eh_day_use
+        np.add.at(day_uses, (linha[du], s[du]), 1)
+        valores = np.cumsum(dif_valor, axis=1)[:, :n_dias]
+        ocupada = (noites > 0) | (day_uses > 0)
+        # A soma acumulada deixa resíduos de arredondamento (~1e-13) onde o valor é zero
+        valores[~ocupada | (np.abs(valores) < 1e-6)] = 0.0
+        status[day_uses > 0] = DAY_USE
+        status[noites > 0] = OCUPADO
+        ev_linha = ev_dia = ev_cod = ev_chave = np.empty(0, dtype=np.int64)
+    else:
+        # Expande cada reserva em suas diárias dentro da janela (na ordem das reservas)
+        idx = np.repeat(np.arange(len(linha)), qtd)
+        desloc = np.arange(len(idx)) - np.repeat(np.cumsum(qtd) - qtd, qtd)
+        n_linha, n_dia = linha[idx], s[idx] + desloc
+        np.add.at(valores, (n_linha, n_dia), valor_dia[idx])
+        ev_linha, ev_dia = n_linha, n_dia
+        ev_cod = codigo_noite[idx].astype(np.int64)
+        ev_chave = ordem[idx] * 3 + _NOITE
+
+    # ---- Marcas de check-in / check-out (só dentro da janela) ----
+    m_linha = np.concatenate([linha, linha])
+    m_dia = np.concatenate([ci, co])
+    m_cod = np.concatenate([np.full(len(ci), CHECKIN), np.full(len(co), CHECKOUT)])
+    m_chave = np.concatenate([ordem * 3 + _MARCA_CHECKIN, ordem * 3 + _MARCA_CHECKOUT])
+    dentro = (m_dia >= 0) & (m_dia < n_dias)
+    m_linha, m_dia, m_cod, m_chave = m_linha[dentro], m_dia[dentro], m_cod[dentro], m_chave[dentro]
+
+    if sobrescrever_marcas:
+        # Vale o último evento de cada célula
+        ev_linha = np.concatenate([ev_linha, m_linha])
+        ev_dia = np.concatenate([ev_dia, m_dia])
+        ev_cod = np.concatenate([ev_cod, m_cod])
+        ev_chave = np.concatenate([ev_chave, m_chave])
+        if len(ev_linha):
+            sel = _primeiro_por_celula(ev_linha * n_dias + ev_dia, ev_chave, ultimo=True)
+            status[ev_linha[sel], ev_dia[sel]] = ev_cod[sel]
+        return valores, status
+
+    if len(ev_linha):
+        sel = _primeiro_por_celula(ev_linha * n_dias + ev_dia, ev_chave, ultimo=True)
+        status[ev_linha[sel], ev_dia[sel]] = ev_cod[sel]
+    if len(m_linha):
+        sel = _primeiro_por_celula(m_linha * n_dias + m_dia, m_chave)
+        livre = status[m_linha[sel], m_dia[sel]] == LIVRE
+        status[m_linha[sel][livre], m_dia[sel][livre]] = m_cod[sel][livre]
+    return valores, status
+
+
+def calendario_ocupacao(unidades_df: pd.DataFrame, locacoes_df: pd.DataFrame, inicio: date, fim: date,
+                        day_use=True, sobrescrever_marcas=False, metodo="noites"):
+    """Calendário unidade x dia do período.
+
+    Retorna (valores_num, tabela_icon, dias_str): valores rateados por diária e
+    marcas 🟧 (ocupado), 🟦 (check-in) e ◧ (check-out), com uma linha "Total R$"
+    zerada no fim. `day_use=False` ignora reservas sem noites; com
+    `sobrescrever_marcas` as marcas de check-in/out substituem o 🟧.
+    Veja matriz_ocupacao para as regras e o `metodo`.
+    """
+    dias_str = [d.strftime("%d/%m") for d in pd.date_range(start=inicio, end=fim, freq="D")]
+    nomes = unidades_df["nome"].tolist() if not unidades_df.empty else []
+    ids = unidades_df["id"].tolist() if not unidades_df.empty else []
+
+    valores, status = matriz_ocupacao(ids, locacoes_df, inicio, fim, day_use, sobrescrever_marcas, metodo)
+
+    index_nomes = nomes + ["Total R$"]
+    valores_num = pd.DataFrame(
+        np.vstack([valores, np.zeros((1, len(dias_str)))]), index=index_nomes, columns=dias_str
+    )
+    tabela_icon = pd.DataFrame(
+        np.vstack([ICONES[status], np.full((1, len(dias_str)), "", dtype=object)]),
+        index=index_nomes, columns=dias_str
+    )
+    return valores_num, tabela_icon, dias_str
+
+
+def ocupacao_diaria(tabela_icon: pd.DataFrame, num_unidades: int) -> pd.Series:
+    """Percentual de unidades com 🟧 em cada dia (evita divisão por zero)."""
+    denom = max(1, num_unidades)
+    return ((tabela_icon == "🟧").sum(axis=0) / denom) * 100
+
+
+def totalizar_calendario(valores_num: pd.DataFrame, dias_str: list) -> pd.DataFrame:
+    """Preenche a linha "Total R$" (soma das unidades) e as colunas de total e líquido."""
+    # Totais diários apenas das unidades (exclui a linha 'Total R$')
+    linhas_base = [idx for idx in valores_num.index if idx != "Total R$"]
+    valores_num.loc["Total R$", dias_str] = valores_num.loc[linhas_base, dias_str].sum(axis=0)
+
+    # Totais por linha (período)
+    valores_num["Total R$"] = valores_num[dias_str].sum(axis=1)
+    valores_num["Valor Líquido (-13%)"] = valores_num["Total R$"] * LIQUIDO_FATOR
+    return valores_num
+
+
+def taxa_administracao(flag, raw_pct) -> float:
+    """Percentual efetivo da administradora: vale só com administracao = "Sim" e % > 0."""
+    try:
+        pct = float(raw_pct)
+    except Exception:
+        pct = 0.0
+    if pd.isna(pct):
+        pct = 0.0
+    return pct if (str(flag) == "Sim" and pct > 0) else 0.0
+
+
+def taxas_administracao(flags, pcts) -> np.ndarray:
+    """Versão vetorizada de `taxa_administracao` para colunas (administracao, percentual_administracao).
+
+    Cada percentual distinto é limpo uma vez só, pela própria taxa_administracao,
+    então o resultado é o mesmo linha a linha.
+    """
+    sim = (pd.Series(flags, dtype=object).astype(str) == "Sim").to_numpy()
+    codigos, distintos = pd.factorize(pd.Series(pcts, dtype=object))
+    limpos = np.array([taxa_administracao("Sim", p) for p in distintos] + [0.0], dtype=float)
+    return np.where(sim, limpos[codigos], 0.0)  # código -1 (ausente) cai no 0.0 do fim
+
+
+def administracao_por_unidade(totais: pd.Series, unidades_df: pd.DataFrame, percentual=None) -> pd.Series:
+    """Valor da administradora por linha do calendário.
+
+    Sem `percentual`, usa o cadastro de cada unidade (administracao = "Sim" e
+    percentual_administracao > 0) e a linha "Total R$" recebe a soma das
+    unidades. Com `percentual`, aplica a mesma taxa fixa a todas as linhas.
+    """
+    if percentual is not None:
+        return totais * (percentual / 100.0)
+
+    admin_col = pd.Series(0.0, index=totais.index, dtype=float)
+    if not unidades_df.empty:
+        meta = unidades_df.set_index("nome")
+        for unit_name in meta.index:
+            admin_flag = str(meta.at[unit_name, "administracao"]) if "administracao" in meta.columns else "Não"
+            raw_pct = meta.at[unit_name, "percentual_administracao"] if "percentual_administracao" in meta.columns else 0.0
+            pct = taxa_administracao(admin_flag, raw_pct)
+
+            if pct > 0:
+                admin_col[unit_name] = totais.at[unit_name] * (pct / 100.0)
+            else:
+                admin_col[unit_name] = 0.0
+
+    # A linha "Total R$" recebe a soma das administrações das unidades
+    admin_col["Total R$"] = float(admin_col.drop(labels=["Total R$"], errors="ignore").sum())
+    return admin_col
+
+
+def formatar_calendario(tabela_icon: pd.DataFrame, valores_num: pd.DataFrame, dias_str: list,
+                        colunas_totais: list) -> pd.DataFrame:
+    """Tabela de exibição: "ícone valor" em cada dia e os totais formatados, na ordem de `dias_str`."""
+    icones = tabela_icon[dias_str].to_numpy(dtype=object)
+    vals = valores_num.loc[tabela_icon.index, dias_str].to_numpy(dtype=float)
+    celulas = icones.copy()
+    com_valor = vals > 0
+    celulas[com_valor] = [f"{i} {v:,.2f}".strip() for i, v in zip(icones[com_valor], vals[com_valor])]
+
+    tabela_visual = pd.DataFrame(celulas, index=tabela_icon.index, columns=dias_str)
+    for col in colunas_totais:
+        tabela_visual[col] = valores_num[col].map(lambda v: f"{v:,.2f}")
+    return tabela_visual
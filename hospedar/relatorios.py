@@ -0,0 +1,533 @@
+# hospedar/relatorios.py
+"""Montagem dos relatórios (DataFrames prontos para exibir/exportar), sem Streamlit.
+
+As funções do fim do módulo carregam os dados pelos filtros e devolvem o
+relatório numérico já memoizado (memo_relatorio): voltar a uma combinação de
+filtros já vista, sem mudança nos dados, não recalcula nada.
+"""
+import io
+import re
+import zipfile
+from calendar import monthrange
+from datetime import date
+from html import escape
+
+import numpy as np
+import pandas as pd
+
+from hospedar.dados import (
+    ganhos_por_mes, get_despesas, get_locacoes, get_unidades, memo_relatorio, noites_por_mes, resumo_despesas,
+    resumo_mensal,
+)
+from hospedar.ocupacao import LIQUIDO_FATOR, ratear, reservas_em_dias, taxas_administracao
+from hospedar.valores import normalizar
+
+MESES_ABREV = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+MES_LABEL = {i + 1: m for i, m in enumerate(MESES_ABREV)}
+
+
+def br_money(v: float) -> str:
+    return f"R$ {v:,.2f}"
+
+
+_PONTO_VIRGULA = str.maketrans(",.", ".,")
+
+
+def formatar_reais(valores: pd.DataFrame) -> pd.DataFrame:
+    """Frame numérico -> texto "R$ 1.234,56" (separadores brasileiros) em todas as células.
+
+    Cada valor distinto é formatado uma vez só e o resultado é espalhado de
+    volta por índice; os distintos são comparados pelos bits do float.
+    """
+    numeros = valores.to_numpy(dtype=float)
+    distintos, posicoes = np.unique(numeros.view(np.int64).ravel(), return_inverse=True)
+    textos = np.array(
+        [f"R$ {v:,.2f}".translate(_PONTO_VIRGULA) for v in distintos.view(np.float64).tolist()], dtype=object
+    )
+    return pd.DataFrame(
+        textos[posicoes].reshape(numeros.shape), index=valores.index, columns=valores.columns
+    )
+
+
+def planilha_xlsx(tabela: pd.DataFrame, aba="Relatório") -> bytes:
+    """Conteúdo de um .xlsx com a tabela numa aba (para st.download_button)."""
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as excel:
+        tabela.to_excel(excel, sheet_name=aba, index=False)
+    return buf.getvalue()
+
+
+# ---------------- Administradora ----------------
+COLUNAS_VALOR_ADM = ["Qtde de Noites", "Valor total bruto", "Valor total líquido", "Valor administração"]
+
+
+def calcular_administradora(loc_f: pd.DataFrame, inicio: date, fim: date) -> pd.DataFrame:
+    """Acrescenta noites, bruto, líquido e administração de cada reserva dentro de [inicio, fim].
+
+    `loc_f` já vem com checkin/checkout como date e as colunas administracao /
+    percentual_administracao da unidade. Tudo em colunas: as datas são
+    recortadas no período por `ratear` e o percentual é limpo por valor distinto.
+    """
+    noites, bruto = ratear(loc_f, [(inicio, fim)], ate_fim=False)
+    return _valores_administradora(loc_f, noites[:, 0], bruto[:, 0])
+
+
+def _valores_administradora(loc_f: pd.DataFrame, noites, bruto) -> pd.DataFrame:
+    """Grava as COLUNAS_VALOR_ADM a partir das noites e do bruto já rateados de cada linha."""
+    n = len(loc_f)
+    pct = taxas_administracao(
+        loc_f["administracao"] if "administracao" in loc_f.columns else np.full(n, "Não", dtype=object),
+        loc_f["percentual_administracao"] if "percentual_administracao" in loc_f.columns else np.zeros(n),
+    )
+    loc_f["Qtde de Noites"] = noites
+    loc_f["Valor total bruto"] = bruto
+    loc_f["Valor total líquido"] = loc_f["Valor total bruto"] * LIQUIDO_FATOR  # Subtraindo 13%
+    liquido = loc_f["Valor total líquido"].to_numpy(dtype=float)
+    loc_f["Valor administração"] = np.multiply(liquido, pct / 100.0, out=np.zeros(n), where=pct > 0)
+    return loc_f
+
+
+def tabela_administradora(loc_f: pd.DataFrame, com_hospede=True) -> pd.DataFrame:
+    """Tabela por reserva (ordenada por unidade e datas) a partir de calcular_administradora."""
+    tabela = loc_f.rename(columns={
+        "nome": "Unidade",
+        "checkin": "Check-in",
+        "checkout": "Check-out",
+        "plataforma": "Plataforma",
+        "hospede": "Hóspede",
+    })
+    colunas = ["Unidade"] + (["Hóspede"] if com_hospede else []) + ["Plataforma", "Check-in", "Check-out"]
+    tabela = tabela[colunas + COLUNAS_VALOR_ADM]
+    return tabela.sort_values(["Unidade", "Check-in", "Check-out"]).reset_index(drop=True)
+
+
+def com_linha_total(tabela: pd.DataFrame) -> pd.DataFrame:
+    """Acrescenta a linha "Total" somando as colunas de valor."""
+    totais = {c: "" for c in tabela.columns}
+    totais["Unidade"] = "Total"
+    for c in COLUNAS_VALOR_ADM:
+        totais[c] = tabela[c].sum()
+    return pd.concat([tabela, pd.DataFrame([totais])], ignore_index=True)
+
+
+def mensagem_administradora(loc_f: pd.DataFrame, periodo_str: str, detalhar=False, unidade=None) -> str:
+    """Texto para WhatsApp/e-mail com os totais (e, opcionalmente, cada reserva)."""
+    linhas = [
+        f"Relatório da Administradora — Período: {periodo_str}",
+        *([f"Unidade: {unidade}"] if unidade is not None else []),
+        f"Noites: {int(loc_f['Qtde de Noites'].sum())}",
+
+
+        f"Valor total líquido: {br_money(loc_f['Valor total líquido'].sum())}",
+        f"Valor administração: {br_money(loc_f['Valor administração'].sum())}",
+    ]
+
+    if detalhar:
+        linhas.append("")
+        linhas.append("Detalhes por reserva:")
+        for _, r in loc_f.iterrows():
+            linhas.append(
+                f"- {r['nome']} | {r['plataforma']} | {r['checkin'].strftime('%d/%m/%Y')}→{r['checkout'].strftime('%d/%m/%Y')} | "
+                f"Noites: {int(r['Qtde de Noites'])} | Valor bruto: {br_money(r['Valor total bruto'])} | "
+                f"Valor líquido: {br_money(r['Valor total líquido'])} | Administração: {br_money(r['Valor administração'])}"
+            )
+
+    return "\n".join(linhas)
+
+
+# ---------------- Administradora em lote (fechamento do mês) ----------------
+def administradora_em_lote(locacoes_df: pd.DataFrame, unidades_df: pd.DataFrame, ano: int, meses=None,
+                           por="checkout") -> pd.DataFrame:
+    """Demonstrativos de todas as unidades com administração em cada mês de `ano`, numa passada só.
+
+    Uma linha por (reserva, mês) com as colunas de calcular_administradora e
+    `mes`; cada grupo (nome, mes) tem os mesmos números do relatório
+    interativo daquele mês. `por` é a regra de seleção desse relatório:
+    "checkout" (a reserva entra no mês do check-out) ou "sobreposicao" (entra
+    em todo mês que toca).
+    """
+    if por not in ("checkout", "sobreposicao"):
+        raise ValueError(f"Regra de seleção desconhecida: {por!r}")
+    meses = np.asarray(sorted(meses or range(1, 12 + 1)), dtype=np.int64)
+    periodos = [(date(ano, m, 1), date(ano, m, monthrange(ano, m)[1])) for m in meses]
+
+    admin = unidades_df[unidades_df["administracao"] == "Sim"]
+    loc = locacoes_df.merge(
+        admin[["id", "nome", "administracao", "percentual_administracao"]],
+        left_on="unidade_id", right_on="id", suffixes=("", "_u")
+    )
+    loc["checkin"] = pd.to_datetime(loc["checkin"], errors="coerce").dt.date
+    loc["checkout"] = pd.to_datetime(loc["checkout"], errors="coerce").dt.date
+    loc = loc.dropna(subset=["checkin", "checkout"]).reset_index(drop=True)
+
+    # Matriz reservas x meses: quem entra em cada demonstrativo e com quanto
+    ci, co, _, _ = reservas_em_dias(loc)
+    a = np.array([np.datetime64(p[0], "D") for p in periodos]).astype(np.int64)
+    b = np.array([np.datetime64(p[1], "D") for p in periodos]).astype(np.int64)
+    entra = (co[:, None] >= a) & ((co[:, None] <= b) if por == "checkout" else (ci[:, None] <= b))
+    noites, bruto = ratear(loc, periodos, ate_fim=False) if len(loc) else (np.zeros((0, len(periodos))),) * 2
+
+    linhas, cols = np.nonzero(entra)
+    lote = loc.iloc[linhas].reset_index(drop=True)
+    lote["mes"] = meses[cols]
+    return _valores_administradora(lote, noites[linhas, cols].astype(np.int64), bruto[linhas, cols])
+
+
+def _nome_arquivo(texto: str, usados: set) -> str:
+    base = re.sub(r"[^a-z0-9]+", "_", normalizar(texto)).strip("_") or "unidade"
+    nome, n = base, 1
+    while nome in usados:
+        n += 1
+        nome = f"{base}_{n}"
+    usados.add(nome)
+    return nome
+
+
+def _nome_aba(texto: str, usadas: set) -> str:
+    """Nome de aba válido no Excel (até 31 caracteres, sem []:*?/\\) e sem repetir."""
+    base = re.sub(r"[\[\]:*?/\\]", "-", str(texto)).strip("'")[:31] or "Unidade"
+    nome, n = base, 1
+    while nome.lower() in usadas:
+        n += 1
+        nome = f"{base[:31 - len(str(n)) - 1]}~{n}"
+    usadas.add(nome.lower())
+    return nome
+
+
+def _html_demonstrativo(titulo: str, tabela: pd.DataFrame) -> str:
+    fmt = tabela.copy()
+    for c in COLUNAS_VALOR_ADM[1:]:
+        fmt[c] = fmt[c].map(br_money)
+    return (
+        f'<!DOCTYPE html>\n<html lang="pt-BR"><head><meta charset="utf-8"><title>{escape(titulo)}</title></head>\n'
+        f"<body>\n<h2>{escape(titulo)}</h2>\n{fmt.to_html(index=False, border=1)}\n</body></html>\n"
+    )
+
+
+def pacote_administradora(lote: pd.DataFrame, ano: int, com_hospede=True, detalhar=False):
+    """ZIP com os demonstrativos do lote e o índice dos envios. Retorna (zip_bytes, indice).
+
+    Para cada unidade e mês: `AAAA-MM/<unidade>.csv` (números sem formatação,
+    como o CSV do app), `.html` (valores em R$) e `.txt` com a mensagem de
+    WhatsApp/e-mail; por mês, um `.xlsx` com uma aba por unidade. O índice
+    (também em `indice.csv`) traz uma linha por demonstrativo com os totais,
+    o assunto e a mensagem pronta.
+    """
+    indice, buf = [], io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for mes, do_mes in lote.groupby("mes", sort=True):
+            pasta = f"{ano}-{int(mes):02}"
+            periodo_str = f"{int(mes):02}/{ano}"
+            xlsx, abas, arquivos = io.BytesIO(), set(), set()
+            with pd.ExcelWriter(xlsx, engine="openpyxl") as excel:
+                for unidade, loc_u in do_mes.groupby("nome", sort=True):
+                    tabela = com_linha_total(tabela_administradora(loc_u, com_hospede=com_hospede))
+                    titulo = f"Relatório Administradora - {periodo_str} - {unidade}"
+                    base = f"{pasta}/{_nome_arquivo(unidade, arquivos)}"
+                    msg = mensagem_administradora(loc_u, periodo_str, detalhar, unidade=unidade)
+
+                    zf.writestr(f"{base}.csv", tabela.to_csv(index=False, sep=";").encode("utf-8-sig"))
+                    zf.writestr(f"{base}.html", _html_demonstrativo(titulo, tabela))
+                    zf.writestr(f"{base}.txt", msg)
+                    tabela.to_excel(excel, sheet_name=_nome_aba(unidade, abas), index=False)
+                    indice.append({
+                        "Unidade": unidade, "Mês": periodo_str, "Reservas": len(loc_u),
+                        **{c: loc_u[c].sum() for c in COLUNAS_VALOR_ADM},
+                        "Arquivo": base, "Assunto": titulo, "Mensagem": msg,
+                    })
+            zf.writestr(f"{pasta}/administradora_{pasta}.xlsx", xlsx.getvalue())
+
+        indice = pd.DataFrame(indice, columns=[
+            "Unidade", "Mês", "Reservas", *COLUNAS_VALOR_ADM, "Arquivo", "Assunto", "Mensagem",
+        ])
+        zf.writestr("indice.csv", indice.to_csv(index=False, sep=";").encode("utf-8-sig"))
+    return buf.getvalue(), indice
+
+
+# ---------------- Receita x despesa ----------------
+def com_nome_unidade(df: pd.DataFrame, unidades_df: pd.DataFrame, coluna_data: str) -> pd.DataFrame:
+    """Junta o cadastro da unidade e deriva ano/mes_num/nome_unidade da coluna de data."""
+    out = df.merge(unidades_df, left_on="unidade_id", right_on="id", suffixes=("", "_u"))
+    out[coluna_data] = pd.to_datetime(out[coluna_data], errors="coerce")
+    out = out.dropna(subset=[coluna_data])
+    out["ano"] = out[coluna_data].dt.year
+    out["mes_num"] = out[coluna_data].dt.month
+    out["nome_unidade"] = out["nome"]
+    return out
+
+
+def receita_despesa_mensal(loc_f: pd.DataFrame, des_f: pd.DataFrame) -> pd.DataFrame:
+    """Receita, despesa e lucro de Jan..Dez (meses sem movimento ficam zerados)."""
+    receita_m = (
+        loc_f.groupby("mes_num")["valor"].sum().rename("Receita").reset_index()
+        if not loc_f.empty else pd.DataFrame({"mes_num": [], "Receita": []})
+    )
+    despesa_m = (
+        des_f.groupby("mes_num")["valor"].sum().rename("Despesa").reset_index()
+        if not des_f.empty else pd.DataFrame({"mes_num": [], "Despesa": []})
+    )
+
+    # Grade completa Jan..Dez para mostrar zeros
+    base_meses = pd.DataFrame({"mes_num": list(range(1, 12 + 1))})
+    dfm = base_meses.merge(receita_m, on="mes_num", how="left") \
+                    .merge(despesa_m, on="mes_num", how="left")
+    dfm["Receita"] = dfm["Receita"].fillna(0.0)
+    dfm["Despesa"] = dfm["Despesa"].fillna(0.0)
+    dfm["Lucro"] = dfm["Receita"] - dfm["Despesa"]
+    dfm["Mês"] = dfm["mes_num"].map(MES_LABEL)
+    return dfm.sort_values("mes_num")
+
+
+# ---------------- Ganhos anuais ----------------
+def _soma_por_unidade_ano(df: pd.DataFrame, rotulo: str) -> pd.DataFrame:
+    return (
+        df.groupby(["nome", "ano"], as_index=False)["valor"]
+        .sum()
+        .rename(columns={"nome": "Unidade", "ano": "Ano", "valor": rotulo})
+    )
+
+
+def ganhos_despesas_por_unidade_ano(loc_base: pd.DataFrame, desp_base: pd.DataFrame, com_lucro=True) -> pd.DataFrame:
+    ganhos_despesas = pd.merge(
+        _soma_por_unidade_ano(loc_base, "Ganhos (R$)"),
+        _soma_por_unidade_ano(desp_base, "Despesas (R$)"),
+        on=["Unidade", "Ano"],
+        how="outer"
+    ).fillna(0.0)
+    if com_lucro:
+        ganhos_despesas["Lucro (R$)"] = ganhos_despesas["Ganhos (R$)"] - ganhos_despesas["Despesas (R$)"]
+    return ganhos_despesas
+
+
+def pivot_ganhos_anuais(ganhos_despesas: pd.DataFrame) -> pd.DataFrame:
+    """Unidade x (métrica, ano), com total por unidade e linha "Total Geral"."""
+    tabela_pivot = ganhos_despesas.pivot(
+        index="Unidade",
+        columns="Ano",
+        values=["Ganhos (R$)", "Despesas (R$)", "Lucro (R$)"]
+    ).fillna(0.0)
+
+    # Totais por unidade
+    tabela_pivot[("Total por Unidade", "Ganhos (R$)")] = tabela_pivot["Ganhos (R$)"].sum(axis=1)
+    tabela_pivot[("Total por Unidade", "Despesas (R$)")] = tabela_pivot["Despesas (R$)"].sum(axis=1)
+    tabela_pivot[("Total por Unidade", "Lucro (R$)")] = tabela_pivot["Lucro (R$)"].sum(axis=1)
+
+    # Totais gerais por ano
+    totais_gerais = tabela_pivot.sum(axis=0).to_frame().T
+    totais_gerais.index = ["Total Geral"]
+    return pd.concat([tabela_pivot, totais_gerais])
+
+
+# ---------------- Receita e despesa por unidade/mês/tipo ----------------
+def relatorio_receita_despesa_tipo(locacoes: pd.DataFrame, despesas: pd.DataFrame):
+    """Receita bruta e despesas por tipo para cada (unidade, ano, mês).
+
+    Recebe locações/despesas já com `nome`, `ano` e `mes`. Retorna
+    (relatorio, tipos_despesa); relatorio é None quando não há dados.
+    """
+    receita = pd.DataFrame(columns=["nome", "ano", "mes", "Receita Bruta"])
+    if not locacoes.empty:
+        receita = locacoes.groupby(["nome", "ano", "mes"])["valor"].sum().reset_index()
+        receita = receita.rename(columns={"valor": "Receita Bruta"})
+
+    despesa = pd.DataFrame(columns=["nome", "ano", "mes", "tipo", "Despesa"])
+    if not despesas.empty:
+        despesa = despesas.groupby(["nome", "ano", "mes", "tipo"])["valor"].sum().reset_index()
+        despesa = despesa.rename(columns={"valor": "Despesa"})
+
+    chaves = pd.concat([
+        receita[["nome", "ano", "mes"]],
+        despesa[["nome", "ano", "mes"]].drop_duplicates()
+    ], ignore_index=True).drop_duplicates()
+
+    tipos_despesa = despesa["tipo"].unique().tolist() if not despesa.empty else []
+    if chaves.empty:
+        return None, tipos_despesa
+
+    relatorio = chaves.copy()
+    relatorio = relatorio.merge(receita, on=["nome", "ano", "mes"], how="left")
+    relatorio["Receita Bruta"] = relatorio["Receita Bruta"].fillna(0.0)
+
+    if tipos_despesa:
+        # Uma coluna por tipo, todas de uma vez, na ordem em que os tipos aparecem
+        por_tipo = despesa.pivot_table(
+            index=["nome", "ano", "mes"], columns="tipo", values="Despesa", aggfunc="sum"
+        ).reindex(columns=tipos_despesa)
+        por_tipo.columns.name = None
+        relatorio = relatorio.merge(por_tipo.reset_index(), on=["nome", "ano", "mes"], how="left")
+
+    relatorio.fillna(0.0, inplace=True)
+    relatorio["Total Despesas"] = relatorio[tipos_despesa].sum(axis=1) if tipos_despesa else 0.0
+    relatorio["Lucro Líquido"] = relatorio["Receita Bruta"] - relatorio["Total Despesas"]
+    return relatorio, tipos_despesa
+
+
+def com_total_receita_despesa(relatorio: pd.DataFrame, colunas: list) -> pd.DataFrame:
+    """As `colunas` do relatório (nome, ano, mes e valores) com a linha TOTAL; números sem formatação."""
+    tabela = relatorio[colunas]
+    total = {colunas[0]: "TOTAL", colunas[1]: "", colunas[2]: "", **tabela[colunas[3:]].sum().to_dict()}
+    return pd.concat([tabela, pd.DataFrame([total])], ignore_index=True)
+
+
+# ---------------- Relatórios prontos (memoizados por filtros e versão dos dados) ----------------
+@memo_relatorio
+def noites_reservadas_por_mes(ano: int) -> pd.DataFrame:
+    """Noites (sem day-use) de todas as unidades em cada mês de `ano`: mes_num, noites e mes (rótulo)."""
+    noites_mes = noites_por_mes()
+    agg = (
+        noites_mes[noites_mes["ano"] == ano]
+        .groupby("mes", as_index=False)["noites"].sum()
+        .rename(columns={"mes": "mes_num"})
+    )
+    agg["mes"] = agg["mes_num"].map(MES_LABEL)
+    return agg
+
+
+@memo_relatorio
+def _base_despesas() -> pd.DataFrame:
+    des = com_nome_unidade(get_despesas(), get_unidades(), "data")
+    des["nome_mes"] = des["mes_num"].map(MES_LABEL)
+    return des
+
+
+@memo_relatorio
+def opcoes_despesas() -> tuple:
+    """(anos, tipos) para os filtros do relatório de despesas."""
+    des = _base_despesas()
+    tipos = sorted(des["tipo"].dropna().unique()) if "tipo" in des.columns else []
+    return sorted(des["ano"].unique()), tipos
+
+
+@memo_relatorio
+def despesas_por_mes_tipo(ano: int, mes=None, tipos=None) -> pd.DataFrame:
+    """Despesas de `ano` somadas por (nome_mes, tipo); `mes` e `tipos` (vazios: todos) filtram antes."""
+    des = _base_despesas()
+    df_f = des[des["ano"] == ano]
+    if mes is not None:
+        df_f = df_f[df_f["mes_num"] == int(mes)]
+    if tipos:
+        df_f = df_f[df_f["tipo"].isin(tipos)]
+    return df_f.groupby(["nome_mes", "tipo"], as_index=False)["valor"].sum()
+
+
+@memo_relatorio
+def _base_receita_lucro() -> tuple:
+    """Receita (pelo check-in) e despesa por unidade/mês do resumo mensal, sem unidades em manutenção."""
+    unidades_df = get_unidades()
+    unidades_df = unidades_df[unidades_df["status"] != "Manutenção"]
+    resumo = resumo_mensal(unidade_ids=unidades_df["id"].tolist())
+    resumo = resumo.merge(unidades_df[["id", "nome"]], left_on="unidade_id", right_on="id")
+    resumo = resumo.rename(columns={"nome": "nome_unidade", "mes": "mes_num"})
+    loc = resumo.loc[resumo["reservas"] > 0, ["nome_unidade", "ano", "mes_num", "receita"]].rename(columns={"receita": "valor"})
+    des = resumo.loc[resumo["despesas"] > 0, ["nome_unidade", "ano", "mes_num", "despesa"]].rename(columns={"despesa": "valor"})
+    return loc, des, sorted(unidades_df["nome"].unique().tolist())
+
+
+@memo_relatorio
+def opcoes_receita_lucro() -> tuple:
+    """(anos, unidades) para os filtros da análise de receita e lucro."""
+    loc, des, unidades = _base_receita_lucro()
+    anos_loc = loc["ano"].unique().tolist() if not loc.empty else []
+    anos_des = des["ano"].unique().tolist() if not des.empty else []
+    return sorted(set(anos_loc + anos_des)), unidades
+
+
+@memo_relatorio
+def receita_lucro_por_mes(ano: int, unidades=None) -> pd.DataFrame:
+    """Receita, despesa e lucro de Jan..Dez de `ano` (receita_despesa_mensal), nas `unidades` (vazio: todas)."""
+    loc, des, _ = _base_receita_lucro()
+    loc_f = loc[loc["ano"] == ano]
+    des_f = des[des["ano"] == ano]
+    if unidades:
+        loc_f = loc_f[loc_f["nome_unidade"].isin(unidades)]
+        des_f = des_f[des_f["nome_unidade"].isin(unidades)]
+    return receita_despesa_mensal(loc_f, des_f)
+
+
+@memo_relatorio
+def administradora_periodo(inicio: date, fim: date, unidade_ids=None, plataformas=None, por="checkout") -> pd.DataFrame:
+    """Reservas das unidades com administração em [inicio, fim] com as colunas de calcular_administradora.
+
+    `por` é o filtro de período de get_locacoes; vazio quando não há reservas.
+    """
+    unidades_admin = get_unidades()
+    unidades_admin = unidades_admin[unidades_admin["administracao"] == "Sim"]
+    locacoes_df = get_locacoes(inicio=inicio, fim=fim, por=por, unidade_ids=unidade_ids, plataformas=plataformas)
+
+    # Merge locações com unidades para obter nome e % administração
+    loc_f = locacoes_df.merge(
+        unidades_admin[["id", "nome", "administracao", "percentual_administracao"]],
+        left_on="unidade_id", right_on="id", how="left", suffixes=("", "_u")
+    )
+    loc_f["checkin"] = pd.to_datetime(loc_f["checkin"], errors="coerce").dt.date
+    loc_f["checkout"] = pd.to_datetime(loc_f["checkout"], errors="coerce").dt.date
+    loc_f = loc_f.dropna(subset=["checkin", "checkout"])
+    if loc_f.empty:
+        return loc_f
+    return calcular_administradora(loc_f, inicio, fim)
+
+
+@memo_relatorio
+def ganhos_anuais(anos, unidades, hoje: date, meses=None, meses_visao=None, incluir_futuro=True) -> tuple:
+    """Relatório de ganhos anuais a partir das somas de ganhos_por_mes.
+
+    `meses` (None: todos) restringe as somas e os totais do ano de `hoje`;
+    com `incluir_futuro`, o que tem data >= `hoje` entra sempre nas somas.
+    `meses_visao` filtra só a visão do gráfico (None: a mesma das somas).
+    Retorna (tabela_pivot, ganhos_despesas, visao, ganhos_ano, despesas_ano).
+    """
+    locacoes = ganhos_por_mes("locacoes", hoje)
+    despesas = ganhos_por_mes("despesas", hoje)
+    meses = list(range(1, 12 + 1)) if meses is None else meses
+
+    def base(df):
+        filtro = df["ano"].isin(anos) & df["mes"].isin(meses)
+        if incluir_futuro:
+            filtro |= df["futuro"]
+        df = df[filtro]
+        return df[df["nome"].isin(unidades)] if unidades else df
+
+    def do_ano(df):
+        return df.loc[(df["ano"] == hoje.year) & df["mes"].isin(meses), "valor"].sum()
+
+    loc_base, desp_base = base(locacoes), base(despesas)
+    ganhos_despesas = ganhos_despesas_por_unidade_ano(loc_base, desp_base)
+    tabela_pivot = pivot_ganhos_anuais(ganhos_despesas)
+    if meses_visao:
+        visao = ganhos_despesas_por_unidade_ano(
+            loc_base[loc_base["mes"].isin(meses_visao)], desp_base[desp_base["mes"].isin(meses_visao)], com_lucro=False
+        )
+    else:
+        visao = ganhos_despesas.copy()
+    return tabela_pivot, ganhos_despesas, visao, do_ano(locacoes), do_ano(despesas)
+
+
+@memo_relatorio
+def _bases_receita_despesa_tipo() -> tuple:
+    """Receita (mês do check-in) e despesas por tipo por unidade/mês, do resumo mensal, com o nome da unidade."""
+    nomes = get_unidades()[["id", "nome"]].rename(columns={"id": "unidade_id"})
+    locacoes = resumo_mensal().merge(nomes, on="unidade_id")
+    locacoes = locacoes.loc[locacoes["reservas"] > 0, ["nome", "ano", "mes", "receita"]].rename(columns={"receita": "valor"})
+    despesas = resumo_despesas().merge(nomes, on="unidade_id")
+    despesas = despesas[["nome", "ano", "mes", "tipo", "despesa"]].rename(columns={"despesa": "valor"})
+    return locacoes, despesas
+
+
+@memo_relatorio
+def tipos_de_despesa() -> list:
+    """Tipos de despesa lançados (para o filtro do relatório por tipo)."""
+    despesas = _bases_receita_despesa_tipo()[1]
+    return sorted(despesas["tipo"].unique()) if not despesas.empty else []
+
+
+@memo_relatorio
+def receita_despesa_por_tipo(unidades=None, mes=None) -> tuple:
+    """relatorio_receita_despesa_tipo nas `unidades` (vazio: todas) e no `mes` (None: todos)."""
+    locacoes, despesas = _bases_receita_despesa_tipo()
+    if unidades:
+        locacoes = locacoes[locacoes["nome"].isin(unidades)]
+        despesas = despesas[despesas["nome"].isin(unidades)]
+    if mes is not None:
+        locacoes = locacoes[locacoes["mes"] == int(mes)]
+        despesas = despesas[despesas["mes"] == int(mes)]
+    return relatorio_receita_despesa_tipo(locacoes, despesas)
@@ -0,0 +1,124 @@
+# hospedar/resumo.py
+"""Resumo mensal por unidade (receita, reservas, noites, despesas) mantido de forma incremental.
+
+Triggers em locacoes, noites e despesas só anotam em `resumo_pendente` as
+células (unidade, ano, mês) que mudaram. `aplicar_pendencias` recalcula essas
+células a partir das tabelas base, pelos índices, e limpa a fila; o resto do
+resumo fica como está. Recalcular em vez de somar deltas evita que
+arredondamentos se acumulem com o tempo.
+
+Quem esvazia a fila são as escritas em lote (importações, editores), dentro
+da própria transação. A leitura nunca pega o lock de escrita: `consulta_resumo`
+devolve o resumo gravado com as células ainda pendentes recalculadas na hora.
+
+Convenções (as mesmas dos relatórios que leem o resumo):
+- receita/reservas: locações pelo mês do check-in (checkout não é exigido);
+- noites: noites da tabela `noites` pelo mês da noite, sem day-use;
+- despesa/despesas: pelo mês da data; por tipo em `resumo_despesas`.
+"""
+
+# Células pendentes com o intervalo [inicio, fim) do mês, para as buscas por faixa nos índices
+_PENDENTES = """
+    SELECT unidade_id, ano, mes, printf('%04d-%02d-01', ano, mes) AS inicio,
+           date(printf('%04d-%02d-01', ano, mes), '+1 month') AS fim
+    FROM resumo_pendente
+"""
+
+
+def _mes(coluna: str) -> str:
+    """(ano, mes) inteiros de uma coluna de data; NULL quando a data é inválida."""
+    return (
+        f"CAST(strftime('%Y', {coluna}) AS INTEGER), "
+        f"CAST(strftime('%m', {coluna}) AS INTEGER)"
+    )
+
+
+def marcar_pendente(unidade: str, data: str) -> str:
+    """INSERT (para triggers) que anota a célula da `unidade` no mês de `data`.
+
+    Usa ON CONFLICT DO NOTHING e não INSERT OR IGNORE: num trigger, o OR IGNORE
+    é trocado pela política do comando que disparou (um upsert, por exemplo).
+    """
+    return (
+        "INSERT INTO resumo_pendente (unidade_id, ano, mes) "
+        f"SELECT {unidade}, {_mes(data)} "
+        f"WHERE {unidade} IS NOT NULL AND date({data}) IS NOT NULL "
+        "ON CONFLICT DO NOTHING"
+    )
+
+
+def marcar_tudo(conn):
+    """Anota todas as células com algum movimento (carga inicial ou reconstrução)."""
+    for unidade, data, tabela in (
+        ("unidade_id", "checkin", "locacoes"),
+        ("unidade_id", "data", "noites"),
+        ("unidade_id", "data", "despesas"),
+    ):
+        conn.execute(
+            "INSERT OR IGNORE INTO resumo_pendente (unidade_id, ano, mes) "
+            f"SELECT DISTINCT {unidade}, {_mes(data)} FROM {tabela} "
+            f"WHERE {unidade} IS NOT NULL AND date({data}) IS NOT NULL"
+        )
+
+
+# Valores atuais das células pendentes, nas colunas de cada tabela de resumo
+_CELULAS = {
+    "resumo_mensal": f"""
+        SELECT * FROM (
+            SELECT p.unidade_id, p.ano, p.mes,
+                   (SELECT TOTAL(l.valor) FROM locacoes l
+                     WHERE l.unidade_id = p.unidade_id AND l.checkin >= p.inicio AND l.checkin < p.fim
+                       AND date(l.checkin) IS NOT NULL) AS receita,
+                   (SELECT COUNT(*) FROM locacoes l
+                     WHERE l.unidade_id = p.unidade_id AND l.checkin >= p.inicio AND l.checkin < p.fim
+                       AND date(l.checkin) IS NOT NULL) AS reservas,
+                   (SELECT COUNT(*) FROM noites n
+                     WHERE n.unidade_id = p.unidade_id AND n.data >= p.inicio AND n.data < p.fim
+                       AND n.day_use = 0) AS noites,
+                   (SELECT TOTAL(d.valor) FROM despesas d
+                     WHERE d.unidade_id = p.unidade_id AND d.data >= p.inicio AND d.data < p.fim
+                       AND date(d.data) IS NOT NULL) AS despesa,
+                   (SELECT COUNT(*) FROM despesas d
+                     WHERE d.unidade_id = p.unidade_id AND d.data >= p.inicio AND d.data < p.fim
+                       AND date(d.data) IS NOT NULL) AS despesas
+            FROM ({_PENDENTES}) p
+        )
+        WHERE reservas > 0 OR noites > 0 OR despesas > 0
+    """,
+    "resumo_despesas": f"""
+        SELECT p.unidade_id, p.ano, p.mes, d.tipo, TOTAL(d.valor) AS despesa, COUNT(*) AS despesas
+        FROM ({_PENDENTES}) p
+        JOIN despesas d ON d.unidade_id = p.unidade_id AND d.data >= p.inicio AND d.data < p.fim
+        WHERE date(d.data) IS NOT NULL
+        GROUP BY p.unidade_id, p.ano, p.mes, d.tipo
+    """,
+}
+_CHAVE_PENDENTE = "(unidade_id, ano, mes) IN (SELECT unidade_id, ano, mes FROM resumo_pendente)"
+
+
+def consulta_resumo(tabela: str) -> str:
+    """SELECT (só leitura) da `tabela` de resumo já com as células pendentes recalculadas.
+
+    As linhas gravadas das células pendentes dão lugar ao valor atual, tirado
+    das tabelas base; com a fila vazia, é a própria tabela.
+    """
+    return f"""
+        SELECT * FROM {tabela} WHERE NOT {_CHAVE_PENDENTE}
+        UNION ALL
+        {_CELULAS[tabela]}
+    """
+
+
+def aplicar_pendencias(conn) -> int:
+    """Recalcula as células pendentes e esvazia a fila. Retorna quantas foram recalculadas.
+
+    Não faz commit: roda dentro da transação de quem chama.
+    """
+    n = conn.execute("SELECT COUNT(*) FROM resumo_pendente").fetchone()[0]
+    if not n:
+        return 0
+    for tabela, celulas in _CELULAS.items():
+        conn.execute(f"DELETE FROM {tabela} WHERE {_CHAVE_PENDENTE}")
+        conn.execute(f"INSERT INTO {tabela} SELECT * FROM ({celulas})")
+    conn.execute("DELETE FROM resumo_pendente")
+    return n
@@ -0,0 +1,196 @@
+# hospedar/tarefas.py
+"""Importações em segundo plano, acompanhadas pela tabela `jobs`.
+
+O arquivo enviado é copiado para a memória e entregue a um executor de uma
+thread que vive neste módulo (como o pool de conexões): a importação segue
+mesmo que a sessão do Streamlit seja recarregada ou fechada. Cada tarefa grava
+status, progresso e o resumo final na sua linha de `jobs`; a interface só lê
+essa tabela. Um único trabalhador evita que duas importações disputem o lock
+de escrita do SQLite.
+"""
+import io
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from hospedar.banco import conectar
+from hospedar.dados import get_unidades
+from hospedar.importacao import importar_csv_em_blocos, importar_excel_em_blocos
+
+NA_FILA = "na fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluída"
+ERRO = "erro"
+ATIVOS = (NA_FILA, EXECUTANDO)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="importacao")
+# Identifica esta execução do servidor; gravado com o pid em cada tarefa
+_INSTANCIA = uuid.uuid4().hex
+
+
+def _agora() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _atualizar(job_id: int, **campos):
+    sets = ", ".join(f"{c}=?" for c in campos)
+    conn = conectar()
+    try:
+        conn.execute(f"UPDATE jobs SET {sets} WHERE id=?", (*campos.values(), job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _processo_vivo(pid) -> bool:
+    """Se o processo `pid` ainda existe (Windows: OpenProcess; demais: sinal 0)."""
+    if pid is None:
+        return False
+    if os.name == "nt":
+        # No Windows, os.kill(pid, 0) mandaria CTRL_C_EVENT em vez de só testar
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, int(pid))  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            codigo = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(codigo))
+            return codigo.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # existe, só é de outro usuário
+    return True
+
+
+def _recuperar_interrompidas():
+    """Tarefas ativas de uma execução anterior do servidor ficam como erro.
+
+    Cada tarefa guarda o token da execução que a criou. Token diferente com o
+    nosso pid é uma execução anterior deste processo (o pid se repete depois
+    de um reinício, ex.: pid 1 em contêiner); com outro pid, só conta como
+    interrompida se o processo não existe mais, porque app.py, app3.py e
+    hospedagem.py podem rodar ao mesmo tempo sobre o mesmo banco. A leitura
+    não pega o lock de escrita; o UPDATE só roda quando há tarefa órfã.
+    """
+    conn = conectar()
+    try:
+        ativas = conn.execute(
+            f"SELECT id, pid FROM jobs WHERE status IN ({', '.join('?' * len(ATIVOS))}) AND instancia IS NOT ?",
+            (*ATIVOS, _INSTANCIA)
+        ).fetchall()
+        orfas = [job_id for job_id, pid in ativas if pid == os.getpid() or not _processo_vivo(pid)]
+        if orfas:
+            conn.executemany(
+                f"UPDATE jobs SET status=?, erro=?, concluido_em=? "
+                f"WHERE id=? AND status IN ({', '.join('?' * len(ATIVOS))})",
+                [(ERRO, "interrompida: o servidor foi reiniciado", _agora(), job_id, *ATIVOS) for job_id in orfas]
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def _executar(job_id: int, importar, *args):
+    """Roda `importar(job_id, *args)` no trabalhador e grava o resultado na linha da tarefa."""
+    _atualizar(job_id, status=EXECUTANDO, iniciado_em=_agora())
+    try:
+        inseridos, atualizados, pulados, motivos = importar(job_id, *args)
+    except Exception as e:
+        _atualizar(job_id, status=ERRO, erro=str(e), concluido_em=_agora())
+    else:
+        _atualizar(
+            job_id, status=CONCLUIDA, progresso=1.0, inseridos=inseridos, atualizados=atualizados,
+            pulados=pulados, motivos=json.dumps(motivos, ensure_ascii=False), concluido_em=_agora(),
+        )
+
+
+def _enviar(tipo: str, arquivo: str, modo: str, importar, *args) -> int:
+    _recuperar_interrompidas()
+    conn = conectar()
+    try:
+        cur = conn.execute(
+            "INSERT INTO jobs (tipo, arquivo, modo, status, pid, instancia, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (tipo, arquivo, modo, NA_FILA, os.getpid(), _INSTANCIA, _agora())
+        )
+        conn.commit()
+        job_id = cur.lastrowid
+    finally:
+        conn.close()
+    _executor.submit(_executar, job_id, importar, *args)
+    return job_id
+
+
+def _progresso(job_id: int):
+    return lambda fracao, linhas: _atualizar(job_id, progresso=float(fracao), linhas=int(linhas))
+
+
+def _importar_locacoes(job_id: int, dados: bytes, sobrescrever: bool, atualizar: bool):
+    unidades_df = get_unidades()
+    if unidades_df.empty:
+        raise ValueError("Não há unidades cadastradas. Cadastre antes de importar.")
+    return importar_csv_em_blocos(
+        io.BytesIO(dados), unidades_df, sobrescrever=sobrescrever, atualizar=atualizar,
+        progresso=_progresso(job_id),
+    )
+
+
+def _importar_despesas(job_id: int, dados: bytes, sobrescrever: bool):
+    unidades_df = get_unidades()
+    if unidades_df.empty:
+        raise ValueError("Não há unidades cadastradas. Cadastre unidades antes de importar despesas.")
+    inseridos, pulados, motivos = importar_excel_em_blocos(
+        io.BytesIO(dados), unidades_df, sobrescrever=sobrescrever, progresso=_progresso(job_id)
+    )
+    return inseridos, 0, pulados, motivos
+
+
+def enviar_importacao_locacoes(dados: bytes, arquivo: str, modo: str, sobrescrever=False, atualizar=False) -> int:
+    """Agenda a importação do CSV de locações (bytes do arquivo). Retorna o id da tarefa."""
+    return _enviar("locacoes", arquivo, modo, _importar_locacoes, dados, sobrescrever, atualizar)
+
+
+def enviar_importacao_despesas(dados: bytes, arquivo: str, modo: str, sobrescrever=False) -> int:
+    """Agenda a importação do Excel de despesas (bytes do arquivo). Retorna o id da tarefa."""
+    return _enviar("despesas", arquivo, modo, _importar_despesas, dados, sobrescrever)
+
+
+def tarefas_recentes(tipo: str, limite=10) -> pd.DataFrame:
+    """Últimas tarefas do `tipo` ("locacoes"/"despesas"), da mais nova para a mais antiga."""
+    _recuperar_interrompidas()
+    conn = conectar()
+    try:
+        tarefas = pd.read_sql(
+            "SELECT id, arquivo, modo, status, progresso, linhas, inseridos, atualizados, pulados, motivos, erro, "
+            "criado_em, concluido_em FROM jobs WHERE tipo = ? ORDER BY id DESC LIMIT ?",
+            conn, params=[tipo, int(limite)]
+        )
+    finally:
+        conn.close()
+    contagens = ["inseridos", "atualizados", "pulados"]
+    tarefas[contagens] = tarefas[contagens].astype("Int64")
+    # motivos gravados em JSON -> "motivo: n; ..."
+    tarefas["motivos"] = tarefas["motivos"].map(
+        lambda m: "; ".join(f"{k}: {v}" for k, v in json.loads(m).items()) if m else ""
+    )
+    return tarefas
+
+
+def ha_tarefas_ativas(tipo: str) -> bool:
+    conn = conectar()
+    try:
+        return conn.execute(
+            f"SELECT 1 FROM jobs WHERE tipo = ? AND status IN ({', '.join('?' * len(ATIVOS))}) LIMIT 1",
+            (tipo, *ATIVOS)
+        ).fetchone() is not None
+    finally:
+        conn.close()
@@ -0,0 +1,88 @@
+# hospedar/valores.py
+"""Normalização de textos e conversão de valores monetários vindos de planilhas."""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+def normalizar(s: str) -> str:
+    """Normaliza string para comparações (sem acento, lower, trim)."""
+    s = str(s or "").strip().lower()
+    s = unicodedata.normalize("NFKD", s)
+    return "".join(ch for ch in s if not unicodedata.combining(ch))
+
+
+def parse_valor_cell(x) -> float:
+    """Converte strings de dinheiro em float. Suporta 'R$ 1.234,56', '1,234.56', '1234,56', '1234.56', '(1.234,56)'. """
+    if x is None:
+        return 0.0
+    s = str(x).strip()
+    if s == "" or s.lower() in {"nan", "none"}:
+        return 0.0
+    neg = False
+    if s.startswith("(") and s.endswith(")"):
+        neg = True
+        s = s[1:-1]
+    s = re.sub(r"[^\d,.\-]", "", s)
+    if "," in s and "." in s:
+        if s.rfind(",") > s.rfind("."):
+            s = s.replace(".", "").replace(",", ".")
+        else:
+            s = s.replace(",", "")
+    elif "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    try:
+        v = float(s)
+        return -v if neg else v
+    except Exception:
+        return 0.0
+
+
+# Até 15 dígitos o pd.to_numeric arredonda igual ao float(); textos maiores ficam para parse_valor_cell
+_DIGITOS_EXATOS = 15
+
+
+def _valores_texto(textos: pd.Series) -> np.ndarray:
+    """Os passos de parse_valor_cell com operações de string do pandas; NaN onde não deu número."""
+    # Strings do Arrow (C++). Fora do ASCII o \d do RE2 e o strip() não batem com os do Python
+    s = textos.astype("string[pyarrow]").str.replace("\xa0", " ", regex=False)
+    ascii_ = s.str.fullmatch(r"[\x00-\x7f]*")
+    s = s.str.replace(r"^[\t-\r\x1c-\x1f ]+|[\t-\r\x1c-\x1f ]+$", "", regex=True)  # o que str.strip() tira
+    neg = s.str.contains(r"(?s)^\(.*\)$")
+    s = s.str.replace(r"(?s)^\((.*)\)$", r"\1", regex=True)
+    s = s.str.replace(r"[^0-9,.\-]+", "", regex=True)
+    # "1.234,56"/"1234,56": vírgula decimal (pontos somem); "1,234.56": vírgula de milhar (vírgulas somem)
+    decimal_br = s.str.contains(r",[^.]*$")
+    s = s.where(~decimal_br, s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    s = s.str.replace(",", "", regex=False)
+    numero = s.str.removeprefix("-")
+    ok = ascii_ & s.str.fullmatch(r"-?[0-9]*\.?[0-9]*") & (numero.str.len() <= _DIGITOS_EXATOS)
+    v = pd.to_numeric(numero.where(ok), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    sinal = np.where(s.str.startswith("-").to_numpy(dtype=bool), -1.0, 1.0)
+    return v * sinal * np.where(neg.to_numpy(dtype=bool), -1.0, 1.0)
+
+
+def parse_valor_series(series: pd.Series) -> pd.Series:
+    """parse_valor_cell aplicado à coluna inteira, com o mesmo float em cada célula.
+
+    Cada texto distinto é normalizado uma vez por _valores_texto; o que não sai
+    dali (outros tipos, nulos, dígitos não ASCII, textos longos ou inválidos)
+    passa por parse_valor_cell.
+    """
+    valores = series.astype(object)
+    eh_texto = (valores.map(type) == str).to_numpy()
+    textos = valores[eh_texto]
+    # drop_duplicates compara os objetos; o pd.factorize de textos corta no primeiro NUL
+    distintos = textos.drop_duplicates()
+    calc = _valores_texto(distintos)
+    for i in np.flatnonzero(np.isnan(calc)):
+        calc[i] = parse_valor_cell(distintos.iloc[i])
+
+    v = np.zeros(len(valores))
+    if len(distintos) < len(textos):
+        calc = calc[pd.Index(distintos.to_numpy()).get_indexer(textos.to_numpy())]
+    v[eh_texto] = calc
+    v[~eh_texto] = [parse_valor_cell(x) for x in valores[~eh_texto]]
+    return pd.Series(v, index=series.index, name=series.name)
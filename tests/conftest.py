@@ -0,0 +1,52 @@
+# tests/conftest.py
+"""Fixtures comuns: cada teste roda num banco SQLite vazio e migrado, em diretório temporário."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hospedar import banco, dados  # noqa: E402
+from hospedar.migracoes import inicializar_db  # noqa: E402
+
+
+def _trocar_banco(caminho):
+    banco.fechar_pool()
+    with banco._vigia_lock:
+        if banco._vigia is not None:
+            banco._vigia.close()
+            banco._vigia = None
+    banco.DB_PATH = caminho
+    dados.invalidar_cache()
+
+
+@pytest.fixture
+def db_vazio(tmp_path):
+    """Caminho de um banco ainda sem tabelas, já usado por conectar()."""
+    original = banco.DB_PATH
+    _trocar_banco(str(tmp_path / "hospedagem.db"))
+    yield banco.DB_PATH
+    _trocar_banco(original)
+
+
+@pytest.fixture
+def db(db_vazio):
+    """Banco migrado até a última versão do esquema."""
+    inicializar_db()
+    return db_vazio
+
+
+@pytest.fixture
+def unidades(db):
+    """Duas unidades cadastradas; retorna get_unidades()."""
+    conn = banco.conectar()
+    try:
+        conn.executemany(
+            "INSERT INTO unidades (nome, localizacao, capacidade, status) VALUES (?, ?, ?, ?)",
+            [("Apto 101", "Centro", 2, "Disponível"), ("Casa Praia", "Litoral", 6, "Disponível")],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return dados.get_unidades()
@@ -0,0 +1,81 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from hospedar import banco
+from hospedar.dados import get_locacoes
+from hospedar.conflitos import conflitos_lote, conflitos_no_banco, conflitos_reserva
+
+
+@pytest.fixture
+def apto(unidades):
+    return int(unidades["id"].iloc[0])
+
+
+def _gravar(reservas):
+    conn = banco.conectar()
+    try:
+        cur = conn.executemany(
+            "INSERT INTO locacoes (unidade_id, checkin, checkout, hospede) VALUES (?, ?, ?, ?)", reservas
+        )
+        conn.commit()
+        return cur
+    finally:
+        conn.close()
+
+
+def _reserva(unidade_id, checkin, checkout, ignorar_id=None):
+    conn = banco.conectar()
+    try:
+        return conflitos_reserva(conn, unidade_id, checkin, checkout, ignorar_id)
+    finally:
+        conn.close()
+
+
+def test_reserva_checkout_no_dia_do_checkin_nao_conflita(apto):
+    _gravar([(apto, "2024-01-01", "2024-01-02", "A")])
+    assert _reserva(apto, date(2024, 1, 2), date(2024, 1, 4)).empty
+    assert _reserva(apto, date(2023, 12, 30), date(2024, 1, 1)).empty
+
+
+def test_reserva_checkout_gravado_com_hora(apto):
+    _gravar([(apto, "2024-01-01 14:00", "2024-01-02 11:00", "A")])
+    assert _reserva(apto, date(2024, 1, 2), date(2024, 1, 3)).empty
+    assert list(_reserva(apto, date(2024, 1, 1), date(2024, 1, 3))["hospede"]) == ["A"]
+
+
+def _lote(linhas, index=None):
+    return pd.DataFrame(linhas, columns=["unidade_id", "checkin", "checkout"], index=index)
+
+
+def test_lote_aponta_so_a_linha_de_checkin_mais_tarde():
+    lote = _lote([(1, "2024-01-05", "2024-01-08"), (1, "2024-01-01", "2024-01-06"), (2, "2024-01-01", "2024-01-06")],
+                 index=[10, 11, 12])
+    r = conflitos_lote(lote)
+    assert list(r["linha"]) == [10]
+    assert list(r["conflita_com"]) == ["linha 11"]
+
+
+def test_lote_encostado_e_day_use():
+    lote = _lote([(1, "2024-01-01", "2024-01-03"), (1, "2024-01-03", "2024-01-03"), (1, "2024-01-03", "2024-01-05")])
+    r = conflitos_lote(lote)
+    # o day-use ocupa a noite do dia 3, como a terceira reserva; a que sai no dia 3 não conflita
+    assert list(r["linha"]) == [2]
+
+
+def test_lote_contra_existentes_e_datas_invalidas():
+    existentes = pd.DataFrame({"id": [7], "unidade_id": [1], "checkin": ["2024-02-01"], "checkout": ["2024-02-10"]})
+    lote = _lote([(1, "2024-02-09", "2024-02-12"), (2, "2024-02-05", "2024-02-11"), (1, None, "2024-02-05")])
+    r = conflitos_lote(lote, existentes)
+    assert list(r["linha"]) == [0]
+    assert list(r["conflita_com"]) == ["locação 7"]
+    assert conflitos_lote(lote.iloc[:0]).empty
+
+
+def test_no_banco_ignora_a_reserva_editada(apto):
+    _gravar([(apto, "2024-03-01", "2024-03-05", "A")])
+    banco_id = int(get_locacoes()["id"].iloc[0])
+    lote = _lote([(apto, "2024-03-04", "2024-03-06")])
+    assert list(conflitos_no_banco(lote)["conflita_com"]) == [f"locação {banco_id}"]
+    assert conflitos_no_banco(lote, ignorar_ids=[banco_id]).empty
@@ -0,0 +1,29 @@
+# tests/test_dados.py
+import pytest
+
+from hospedar import banco, dados
+
+
+@pytest.mark.parametrize("coluna", ["checkin) OR 1=1 --", "checkin; DROP TABLE locacoes"])
+def test_anos_disponiveis_recusa_coluna_invalida(db, coluna):
+    with pytest.raises(ValueError):
+        dados.anos_disponiveis("locacoes", "checkin", coluna)
+
+
+def test_valores_distintos_recusa_coluna_invalida(db):
+    with pytest.raises(ValueError):
+        dados.valores_distintos("locacoes", "plataforma IS NULL OR 1")
+
+
+def test_anos_disponiveis(unidades):
+    uid = int(unidades["id"].iloc[0])
+    conn = banco.conectar()
+    try:
+        conn.executemany(
+            "INSERT INTO locacoes (unidade_id, checkin, checkout, hospede, valor) VALUES (?, ?, ?, ?, ?)",
+            [(uid, "2023-12-30", "2024-01-02", "Ana", 100.0), (uid, "2025-03-01", "2025-03-04", "Bia", 200.0)],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    assert dados.anos_disponiveis("locacoes", "checkin", "checkout") == [2023, 2024, 2025]
@@ -0,0 +1,93 @@
+# tests/test_edicao.py
+import pandas as pd
+import pytest
+
+from hospedar import banco
+from hospedar.dados import get_locacoes
+from hospedar.edicao import com_unidade_id, gravar_mudancas, mudancas_editor
+
+COLUNAS = ["checkin", "checkout", "hospede", "valor", "plataforma", "status_pagamento"]
+
+
+def _grade():
+    return pd.DataFrame({
+        "id": [1, 2, 3],
+        "nome": ["Apto 101"] * 3,
+        "checkin": ["2024-01-01", "2024-01-05", "2024-01-10"],
+        "checkout": ["2024-01-03", "2024-01-07", "2024-01-12"],
+        "hospede": ["Ana", "Bia", "Caio"],
+        "valor": [100.0, 200.0, 300.0],
+        "plataforma": ["Airbnb"] * 3,
+        "status_pagamento": ["Pago"] * 3,
+    })
+
+
+def test_mudancas_editor_separa_editadas_novas_e_excluidas():
+    estado = {
+        "edited_rows": {"0": {"valor": 150.0}, "1": {"nome": "Outra"}, "2": {"hospede": "Carla"}, "9": {"valor": 1}},
+        "added_rows": [{"nome": "Apto 101", "checkin": "2024-02-01", "checkout": "2024-02-02"}, {"nome": None, "hospede": ""}],
+        "deleted_rows": [2],
+    }
+    editadas, novas, excluidas = mudancas_editor(estado, _grade(), COLUNAS)
+    # "nome" não está entre as colunas gravadas; a linha 2 foi removida; a 9 não existe
+    assert list(editadas["id"]) == [1]
+    assert editadas.iloc[0]["valor"] == 150.0 and editadas.iloc[0]["hospede"] == "Ana"
+    assert len(novas) == 1 and list(novas.columns) == [c for c in _grade().columns if c != "id"]
+    assert excluidas == [3]
+
+
+def test_mudancas_editor_sem_estado():
+    editadas, novas, excluidas = mudancas_editor(None, _grade(), COLUNAS)
+    assert editadas.empty and novas.empty and excluidas == []
+
+
+def test_gravar_mudancas_numa_transacao(unidades):
+    uid = int(unidades["id"].iloc[0])
+    conn = banco.conectar()
+    try:
+        conn.executemany(
+            "INSERT INTO locacoes (unidade_id, checkin, checkout, hospede, valor, plataforma, status_pagamento) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(uid, "2024-01-01", "2024-01-03", "Ana", 100.0, "Airbnb", "Pago"),
+             (uid, "2024-01-05", "2024-01-07", "Bia", 200.0, "Airbnb", "Pago")],
+        )
+        conn.commit()
+        grade = get_locacoes(colunas=["id"] + COLUNAS).sort_values("id").reset_index(drop=True)
+        grade.insert(1, "nome", "Apto 101")
+        estado = {
+            "edited_rows": {0: {"valor": "120"}},
+            "added_rows": [{"nome": "Casa Praia", "checkin": pd.Timestamp("2024-03-01"), "checkout": "2024-03-04",
+                            "hospede": "Duda", "valor": 90, "plataforma": "Direto", "status_pagamento": "Pendente"},
+                           {"nome": "Desconhecida", "checkin": "2024-03-01", "checkout": "2024-03-02"}],
+            "deleted_rows": [1],
+        }
+        editadas, novas, excluidas = mudancas_editor(estado, grade, COLUNAS)
+        novas = com_unidade_id(novas, unidades)
+        assert gravar_mudancas(conn, "locacoes", COLUNAS, editadas, novas, excluidas,
+                               colunas_novas=["unidade_id"] + COLUNAS, conversores={"valor": float}) == (1, 1, 1)
+    finally:
+        conn.close()
+
+    gravadas = get_locacoes(colunas=["hospede", "checkin", "valor"]).sort_values("hospede")
+    assert list(gravadas["hospede"]) == ["Ana", "Duda"]
+    assert list(gravadas["valor"]) == [120.0, 90.0]
+    assert list(gravadas["checkin"].astype(str)) == ["2024-01-01", "2024-03-01"]
+
+
+def test_gravar_mudancas_desfaz_tudo_se_falhar(unidades):
+    uid = int(unidades["id"].iloc[0])
+    editadas = pd.DataFrame(columns=["id"] + COLUNAS)
+    novas = pd.DataFrame({"unidade_id": [uid], "checkin": ["2024-01-05"], "checkout": ["2024-01-06"], "hospede": ["B"],
+                          "valor": ["não é número"], "plataforma": ["Direto"], "status_pagamento": ["Pago"]})
+    conn = banco.conectar()
+    try:
+        conn.execute("INSERT INTO locacoes (unidade_id, checkin, checkout, hospede) VALUES (?, '2024-01-01', '2024-01-02', 'A')", (uid,))
+        conn.commit()
+        id_a = int(get_locacoes()["id"].iloc[0])
+        # o DELETE roda antes do INSERT que falha; o rollback precisa devolver a linha
+        with pytest.raises(ValueError):
+            gravar_mudancas(conn, "locacoes", COLUNAS, editadas, novas, [id_a],
+                            colunas_novas=["unidade_id"] + COLUNAS, conversores={"valor": float})
+    finally:
+        conn.close()
+    assert list(get_locacoes()["hospede"]) == ["A"]
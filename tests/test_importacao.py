@@ -0,0 +1,252 @@
+import io
+import re
+import zipfile
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from hospedar import banco, importacao
+from hospedar.importacao import (
+    MOTIVO_CODIGO_CADASTRADO, MOTIVO_CODIGO_REPETIDO, MOTIVO_CONFLITO, MOTIVO_DATA, MOTIVO_DATA_DESPESA, MOTIVO_TIPO,
+    MOTIVO_UNIDADE, blocos_excel_despesas,
+    detectar_codificacao, importar_csv_em_blocos, importar_despesas, importar_excel_em_blocos, importar_locacoes,
+    ler_csv_locacoes, ler_excel_despesas, preparar_despesas, preparar_locacoes,
+)
+
+CABECALHO = "unidade;checkin;checkout;hospede;valor\n"
+
+
+def _csv_latin1_com_acento_no_fim(linhas_ascii: int) -> bytes:
+    """CSV latin-1 cujo único caractere não ASCII vem depois de `linhas_ascii` linhas."""
+    corpo = "".join(
+        f"Apto 101;{1 + i % 28:02d}/01/{2000 + i // 28};{2 + i % 28:02d}/01/{2000 + i // 28};Maria;100,00\n"
+        for i in range(linhas_ascii)
+    )
+    return (CABECALHO + corpo + "Casa Praia;10/02/2030;12/02/2030;João;250,00\n").encode("latin-1")
+
+
+def _consultar(sql):
+    conn = banco.conectar()
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _contar_locacoes():
+    return _consultar("SELECT COUNT(*) FROM locacoes")[0][0]
+
+
+def test_codificacao_pelo_bom_e_pelo_conteudo():
+    assert detectar_codificacao(io.BytesIO(b"\xef\xbb\xbfunidade\n")) == "utf-8-sig"
+    assert detectar_codificacao(io.BytesIO("unidade\nJoão\n".encode("utf-8"))) == "utf-8"
+    assert detectar_codificacao(io.BytesIO("unidade\nJoão\n".encode("latin-1"))) == "latin-1"
+
+
+def test_codificacao_nao_move_o_arquivo():
+    arquivo = io.BytesIO(b"abc" + "ç".encode("latin-1"))
+    arquivo.seek(1)
+    detectar_codificacao(arquivo)
+    assert arquivo.tell() == 1
+
+
+def test_caractere_utf8_cortado_entre_pedacos(monkeypatch):
+    monkeypatch.setattr(importacao, "_LEITURA_BYTES", 4)
+    assert detectar_codificacao(io.BytesIO("abcJoão".encode("utf-8"))) == "utf-8"
+
+
+def test_acento_latin1_depois_dos_primeiros_64kb():
+    dados = _csv_latin1_com_acento_no_fim(2000)
+    assert dados.index("João".encode("latin-1")) > 64 * 1024
+
+    df = ler_csv_locacoes(io.BytesIO(dados))
+    assert df["hospede"].iloc[-1] == "João"
+
+
+def test_acento_latin1_depois_do_primeiro_pedaco(monkeypatch):
+    monkeypatch.setattr(importacao, "_LEITURA_BYTES", 1024)
+    df = ler_csv_locacoes(io.BytesIO(_csv_latin1_com_acento_no_fim(200)))
+    assert df["hospede"].iloc[-1] == "João"
+
+
+def test_importacao_em_blocos_com_acento_no_ultimo_bloco(unidades):
+    arquivo = io.BytesIO(_csv_latin1_com_acento_no_fim(2000))
+    inseridos, atualizados, pulados, _ = importar_csv_em_blocos(arquivo, unidades, linhas_por_bloco=500)
+    assert (inseridos, atualizados, pulados) == (2001, 0, 0)
+    assert _contar_locacoes() == 2001
+
+
+def _planilha_despesas():
+    return pd.DataFrame({
+        "unidade": ["Apto 101", "casa praia", "Inexistente", "Apto 101", "Apto 101"],
+        "data": ["05/03/2024", "06/03/2024", "07/03/2024", "não é data", "08/03/2024"],
+        "tipo": ["Luz", "Gás", "Luz", "Luz", None],
+        "valor": ["R$ 1.234,56", "10", "5", "5", "5"],
+        "descricao": [None, "botijão", None, None, None],
+    })
+
+
+def _locacoes(linhas, colunas=("unidade", "checkin", "checkout", "hospede", "valor")):
+    return preparar_locacoes(pd.DataFrame(linhas, columns=list(colunas)))
+
+
+def test_importar_locacoes_conta_inseridas_e_puladas(unidades):
+    df = _locacoes([
+        ("Apto 101", "01/01/2024", "03/01/2024", "Ana", "100,00"),
+        ("apto 101 ", "05/01/2024", "07/01/2024", "Bia", None),
+        ("Chalé", "01/01/2024", "02/01/2024", "Caio", "50"),
+        ("Casa Praia", "xx", "02/01/2024", "Duda", "50"),
+        ("Casa Praia", "10/01/2024", "12/01/2024", "Eva", "80"),
+        ("Apto 101", "02/01/2024", "04/01/2024", "Fábio", "70"),
+    ])
+    inseridos, atualizados, pulados, motivos = importar_locacoes(df, unidades)
+    assert (inseridos, atualizados, pulados) == (3, 0, 3)
+    assert motivos == {MOTIVO_UNIDADE: 1, MOTIVO_DATA: 1, MOTIVO_CONFLITO: 1}
+    assert _consultar("SELECT hospede, valor FROM locacoes ORDER BY hospede") == [
+        ("Ana", 100.0), ("Bia", 0.0), ("Eva", 80.0)
+    ]
+
+
+def test_importar_locacoes_sobrescrever(unidades):
+    importar_locacoes(_locacoes([("Apto 101", "01/01/2024", "03/01/2024", "Ana", "100")]), unidades)
+    df = _locacoes([("Apto 101", "02/01/2024", "04/01/2024", "Bia", "100")])
+    # a reserva antiga sai na mesma transação, então não conta como sobreposição
+    assert importar_locacoes(df, unidades, sobrescrever=True)[:3] == (1, 0, 0)
+    assert _consultar("SELECT hospede FROM locacoes") == [("Bia",)]
+
+
+def test_importar_locacoes_codigo_repetido_vale_a_ultima_linha(unidades):
+    colunas = ("unidade", "checkin", "checkout", "hospede", "valor", "codigo_reserva")
+    df = _locacoes([
+        ("Casa Praia", "10/01/2024", "12/01/2024", "Eva", "80", "R2"),
+        ("Casa Praia", "20/01/2024", "22/01/2024", "Eva", "90", "R2"),
+        ("Casa Praia", "01/02/2024", "02/02/2024", "Gil", "40", " "),
+    ], colunas)
+    assert importar_locacoes(df, unidades) == (2, 0, 1, {MOTIVO_CODIGO_REPETIDO: 1})
+    assert _consultar("SELECT checkin, valor FROM locacoes WHERE codigo_reserva = 'R2'") == [("2024-01-20", 90.0)]
+    assert _consultar("SELECT COUNT(*) FROM locacoes WHERE codigo_reserva IS NULL") == [(1,)]
+
+
+def test_importar_locacoes_codigo_cadastrado_pula_ou_atualiza(unidades):
+    colunas = ("unidade", "checkin", "checkout", "hospede", "valor", "codigo_reserva")
+    importar_locacoes(_locacoes([
+        ("Apto 101", "01/01/2024", "03/01/2024", "Ana", "100", "R1"),
+        ("Apto 101", "05/01/2024", "07/01/2024", "Bia", "200", "R2"),
+    ], colunas), unidades)
+    novo = [
+        ("Apto 101", "01/01/2024", "04/01/2024", "Ana", "150", "R1"),
+        ("Apto 101", "05/01/2024", "07/01/2024", "Bia", "200", "R2"),
+        ("Casa Praia", "01/01/2024", "02/01/2024", "Caio", "50", "R3"),
+    ]
+
+    assert importar_locacoes(_locacoes(novo, colunas), unidades) == (1, 0, 2, {MOTIVO_CODIGO_CADASTRADO: 2})
+    assert _contar_locacoes() == 3
+
+    # R1 muda, R2 chega igual (não conta como atualizada) e R3 já está gravado
+    inseridos, atualizados, pulados, _ = importar_locacoes(_locacoes(novo, colunas), unidades, atualizar=True)
+    assert (inseridos, atualizados, pulados) == (0, 1, 0)
+    assert _consultar("SELECT checkout, valor FROM locacoes WHERE codigo_reserva = 'R1'") == [("2024-01-04", 150.0)]
+    assert _contar_locacoes() == 3
+
+
+def test_sobrescrever_em_blocos_perde_as_antigas_se_um_bloco_seguinte_falhar(unidades):
+    importar_locacoes(_locacoes([("Casa Praia", "01/01/2023", "03/01/2023", "Antiga", "100")]), unidades)
+    # aspas sem fechar na terceira linha: o leitor do CSV falha no segundo bloco
+    dados = (CABECALHO + "Apto 101;01/01/2024;03/01/2024;Ana;100\n" + "Apto 101;05/01/2024;07/01/2024;Bia;100\n"
+             + 'Apto 101;10/01/2024;12/01/2024;"Caio;100\n').encode()
+    with pytest.raises(ValueError, match="locações antigas já tinham sido apagadas"):
+        importar_csv_em_blocos(io.BytesIO(dados), unidades, sobrescrever=True, linhas_por_bloco=2)
+    assert _consultar("SELECT hospede FROM locacoes ORDER BY hospede") == [("Ana",), ("Bia",)]
+
+
+def test_sobrescrever_com_falha_no_primeiro_bloco_mantem_as_antigas(unidades):
+    importar_locacoes(_locacoes([("Casa Praia", "01/01/2023", "03/01/2023", "Antiga", "100")]), unidades)
+    dados = (CABECALHO + 'Apto 101;01/01/2024;03/01/2024;"Ana;100\n').encode()
+    with pytest.raises(pd.errors.ParserError):
+        importar_csv_em_blocos(io.BytesIO(dados), unidades, sobrescrever=True, linhas_por_bloco=2)
+    assert _consultar("SELECT hospede FROM locacoes") == [("Antiga",)]
+
+
+def test_importar_despesas_grava_validas_e_conta_motivos(unidades):
+    inseridos, pulados, motivos = importar_despesas(preparar_despesas(_planilha_despesas()), unidades)
+
+    assert (inseridos, pulados) == (2, 3)
+    assert motivos == {MOTIVO_UNIDADE: 1, MOTIVO_DATA_DESPESA: 1, MOTIVO_TIPO: 1}
+    ids = dict(zip(unidades["nome"], unidades["id"]))
+    assert _consultar("SELECT unidade_id, data, tipo, valor, descricao FROM despesas ORDER BY id") == [
+        (ids["Apto 101"], "2024-03-05", "Luz", 1234.56, ""),
+        (ids["Casa Praia"], "2024-03-06", "Gás", 10.0, "botijão"),
+    ]
+
+
+def test_importar_despesas_sobrescrever(unidades):
+    importar_despesas(preparar_despesas(_planilha_despesas()), unidades)
+    importar_despesas(preparar_despesas(_planilha_despesas()), unidades, sobrescrever=True)
+    assert _consultar("SELECT COUNT(*) FROM despesas")[0][0] == 2
+
+
+def _xlsx(linhas, dimensao=None) -> bytes:
+    """Pasta .xlsx com `linhas` ({número da linha: valores}); `dimensao` sobrescreve o <dimension>."""
+    livro = Workbook()
+    planilha = livro.active
+    for numero, valores in linhas.items():
+        for coluna, valor in enumerate(valores, start=1):
+            if valor is not None:
+                planilha.cell(row=numero, column=coluna, value=valor)
+    saida = io.BytesIO()
+    livro.save(saida)
+    if dimensao is None:
+        return saida.getvalue()
+    trocado = io.BytesIO()
+    with zipfile.ZipFile(saida) as origem, zipfile.ZipFile(trocado, "w") as destino:
+        for item in origem.infolist():
+            conteudo = origem.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                conteudo = re.sub(rb'<dimension ref="[^"]*" ?/>', f'<dimension ref="{dimensao}"/>'.encode(), conteudo)
+            destino.writestr(item, conteudo)
+    return trocado.getvalue()
+
+
+PLANILHA = {
+    1: [" Unidade ", "Data", "Categoria", "Extra", "Valor", "Descrição"],
+    2: ["Apto 101", datetime(2024, 3, 5), "Luz", "x", 10.5, "conta"],
+    3: ["Apto 101", datetime(2024, 3, 6), "Gás", None, 7, None],
+    # 4 e 5 ausentes do XML; 6 só tem coluna não mapeada
+    6: [None, None, None, "só extra", None, None],
+    7: ["Casa Praia", "07/03/2024", "#DIV/0!", None, "R$ 1.234,56", "NA"],
+    # 8 em diante: vazias no fim, descartadas
+    9: [None, None, None, "", None, None],
+}
+
+
+def _comparar_com_pandas(dados: bytes, linhas_por_bloco: int):
+    esperado = ler_excel_despesas(io.BytesIO(dados))[["unidade", "data", "tipo", "valor", "descricao"]]
+    blocos = list(blocos_excel_despesas(io.BytesIO(dados), linhas_por_bloco))
+    obtido = pd.concat(blocos, ignore_index=True)
+    pd.testing.assert_frame_equal(obtido, esperado.astype(object), check_dtype=False)
+    return blocos
+
+
+def test_blocos_excel_iguais_ao_read_excel():
+    blocos = _comparar_com_pandas(_xlsx(PLANILHA), linhas_por_bloco=2)
+    # As linhas em branco do meio entram junto com a linha seguinte
+    assert [len(b) for b in blocos] == [2, 3, 1]
+
+
+def test_blocos_excel_com_dimension_errado():
+    _comparar_com_pandas(_xlsx(PLANILHA, dimensao="A1"), linhas_por_bloco=4)
+
+
+def test_blocos_excel_so_cabecalho():
+    blocos = list(blocos_excel_despesas(io.BytesIO(_xlsx({1: ["unidade", "data", "tipo", "valor"]}))))
+    assert len(blocos) == 1 and blocos[0].empty
+    assert list(blocos[0].columns) == ["unidade", "data", "tipo", "valor"]
+
+
+def test_importar_excel_em_blocos(unidades):
+    inseridos, pulados, motivos = importar_excel_em_blocos(io.BytesIO(_xlsx(PLANILHA)), unidades, linhas_por_bloco=2)
+    # Em branco (linhas 4-6) e tipo com erro (#DIV/0!) não entram
+    assert (inseridos, pulados) == (2, 4)
+    assert motivos == {MOTIVO_UNIDADE: 3, MOTIVO_TIPO: 1}
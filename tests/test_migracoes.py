@@ -0,0 +1,83 @@
+# tests/test_migracoes.py
+import sqlite3
+
+import pytest
+
+from hospedar import banco, migracoes
+from hospedar.migracoes import INDICES, VERSAO_ATUAL, inicializar_db, migrar, versao_esquema
+
+
+def _tabelas(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_migrar_banco_vazio(db_vazio):
+    assert inicializar_db() == list(range(1, VERSAO_ATUAL + 1))
+    conn = banco.conectar()
+    try:
+        assert versao_esquema(conn) == VERSAO_ATUAL
+        assert {"unidades", "locacoes", "despesas", "precos", "noites", "resumo_mensal", "jobs"} <= _tabelas(conn)
+        indices = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert set(INDICES) | {"idx_locacoes_codigo_reserva"} <= indices
+        # a segunda inicialização só lê o user_version
+        assert migrar(conn) == []
+    finally:
+        conn.close()
+
+
+def test_migrar_banco_anterior_ao_versionamento(db_vazio):
+    # Esquema antigo criado pelo app antes das migrações, já com uma das colunas novas e com dados
+    antigo = sqlite3.connect(db_vazio)
+    antigo.executescript("""
+        CREATE TABLE unidades (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT, localizacao TEXT,
+                               capacidade INTEGER, status TEXT, administracao TEXT DEFAULT 'Não');
+        CREATE TABLE locacoes (id INTEGER PRIMARY KEY AUTOINCREMENT, unidade_id INTEGER, checkin DATE,
+                               checkout DATE, hospede TEXT, valor REAL, plataforma TEXT, status_pagamento TEXT);
+        CREATE TABLE despesas (id INTEGER PRIMARY KEY AUTOINCREMENT, unidade_id INTEGER, data DATE,
+                               tipo TEXT, valor REAL, descricao TEXT);
+        INSERT INTO unidades (nome, administracao) VALUES ('Apto 101', 'Sim');
+        INSERT INTO locacoes (unidade_id, checkin, checkout, hospede, valor) VALUES (1, '2024-01-30', '2024-02-02', 'Ana', 300);
+        INSERT INTO locacoes (unidade_id, checkin, checkout, hospede, valor) VALUES (1, '2024-02-10', '2024-02-10', 'Bia', 50);
+        INSERT INTO despesas (unidade_id, data, tipo, valor) VALUES (1, '2024-02-05', 'Limpeza', 80);
+    """)
+    antigo.close()
+
+    assert inicializar_db() == list(range(1, VERSAO_ATUAL + 1))
+    conn = banco.conectar()
+    try:
+        assert conn.execute("SELECT nome, administracao, percentual_administracao FROM unidades").fetchall() == [
+            ("Apto 101", "Sim", 0.0)
+        ]
+        # noites e resumo carregados a partir das reservas que já existiam
+        assert conn.execute("SELECT data, valor, day_use FROM noites ORDER BY data").fetchall() == [
+            ("2024-01-30", 100.0, 0), ("2024-01-31", 100.0, 0), ("2024-02-01", 100.0, 0), ("2024-02-10", 50.0, 1),
+        ]
+        resumo = conn.execute(
+            "SELECT mes, receita, reservas, noites, despesa FROM resumo_mensal WHERE ano = 2024 ORDER BY mes"
+        ).fetchall()
+        # noites do mês sem o day-use
+        assert resumo == [(1, 300.0, 1, 2, 0.0), (2, 50.0, 1, 1, 80.0)]
+        assert conn.execute("SELECT COUNT(*) FROM resumo_pendente").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_migrar_desfaz_passo_que_falha(db_vazio, monkeypatch):
+    conn = banco.conectar()
+    try:
+        monkeypatch.setattr(migracoes, "MIGRACOES", migracoes.MIGRACOES[:3])
+        monkeypatch.setattr(migracoes, "VERSAO_ATUAL", 3)
+        assert migrar(conn) == [1, 2, 3]
+
+        def quebra(conn):
+            conn.execute("CREATE TABLE parcial (x)")
+            raise RuntimeError("falhou")
+
+        monkeypatch.setattr(migracoes, "MIGRACOES", migracoes.MIGRACOES + [(4, "quebra", quebra)])
+        monkeypatch.setattr(migracoes, "VERSAO_ATUAL", 4)
+        with pytest.raises(RuntimeError):
+            migrar(conn)
+        assert versao_esquema(conn) == 3
+        assert "parcial" not in _tabelas(conn)
+    finally:
+        conn.close()
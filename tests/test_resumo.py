@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import time
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from hospedar import banco, dados
+from hospedar.resumo import aplicar_pendencias
+
+
+def _executar(sql, parametros=()):
+    conn = banco.conectar()
+    try:
+        conn.executemany(sql, parametros) if parametros else conn.execute(sql)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _pendentes():
+    conn = banco.conectar()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM resumo_pendente").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _lancar(unidades):
+    ids = unidades["id"].tolist()
+    _executar(
+        "INSERT INTO locacoes (unidade_id, checkin, checkout, valor) VALUES (?, ?, ?, ?)",
+        [(ids[0], "2024-01-10", "2024-01-12", 300.0), (ids[0], "2024-01-20", "2024-02-02", 1000.0),
+         (ids[1], "2024-02-05", "2024-02-05", 80.0)],
+    )
+    _executar(
+        "INSERT INTO despesas (unidade_id, data, tipo, valor) VALUES (?, ?, ?, ?)",
+        [(ids[0], "2024-01-15", "Luz", 50.0), (ids[0], "2024-01-16", "Luz", 25.0), (ids[1], "2024-03-01", "Gás", 9.0)],
+    )
+
+
+def test_leitura_recalcula_celulas_pendentes_sem_gravar(unidades):
+    _lancar(unidades)
+    assert _pendentes() > 0
+
+    mensal = dados.resumo_mensal()
+    despesas = dados.resumo_despesas()
+    assert _pendentes() > 0  # a leitura não esvazia a fila
+
+    conn = banco.conectar()
+    try:
+        aplicar_pendencias(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    dados.invalidar_cache()
+    pd.testing.assert_frame_equal(mensal, dados.resumo_mensal())
+    pd.testing.assert_frame_equal(despesas, dados.resumo_despesas())
+
+    apto = int(unidades["id"].iloc[0])
+    jan = mensal[(mensal["unidade_id"] == apto) & (mensal["mes"] == 1)].iloc[0]
+    assert (jan["receita"], jan["reservas"], jan["noites"], jan["despesa"]) == (1300.0, 2, 14, 75.0)
+
+
+def test_leitura_nao_espera_o_escritor(unidades):
+    _lancar(unidades)
+    escritor = sqlite3.connect(banco.DB_PATH, isolation_level=None)
+    try:
+        escritor.execute("BEGIN IMMEDIATE")
+        escritor.execute("DELETE FROM despesas")
+        inicio = time.perf_counter()
+        despesas = dados.resumo_despesas()
+        assert time.perf_counter() - inicio < 1
+        assert despesas["despesa"].sum() == 84.0  # o que já estava commitado
+    finally:
+        escritor.execute("ROLLBACK")
+        escritor.close()
+
+
+def test_importacao_esvazia_a_fila(unidades):
+    from hospedar.importacao import importar_locacoes, preparar_locacoes
+
+    df = pd.DataFrame({"unidade": ["Apto 101"], "checkin": ["10/01/2024"], "checkout": ["12/01/2024"], "valor": ["300"]})
+    importar_locacoes(preparar_locacoes(df), unidades)
+    assert _pendentes() == 0
+    assert dados.resumo_mensal()["receita"].sum() == 300.0
+
+
+def test_formulario_de_despesa_nao_deixa_celula_na_fila(unidades, monkeypatch):
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.chdir(raiz)
+    at = AppTest.from_file(os.path.join(raiz, "app.py"), default_timeout=60).run()
+    at.radio[0].set_value("🗂 Dados Cadastrais").run()
+    at.radio[-1].set_value("Despesas").run()
+    next(n for n in at.number_input if n.label == "Valor").set_value(120.0)
+    next(b for b in at.button if b.label == "Registrar Despesa").click().run()
+    assert not at.exception
+
+    assert _pendentes() == 0
+    conn = banco.conectar()
+    try:
+        assert conn.execute("SELECT SUM(despesa) FROM resumo_mensal").fetchone()[0] == 120.0
+    finally:
+        conn.close()
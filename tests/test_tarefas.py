@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from hospedar import banco, tarefas
+
+
+@pytest.fixture
+def processo_vivo():
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    yield proc.pid
+    proc.kill()
+    proc.wait()
+
+
+@pytest.fixture
+def pid_morto():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return proc.pid
+
+
+def _criar_job(pid, status=tarefas.EXECUTANDO, instancia="execucao-anterior"):
+    conn = banco.conectar()
+    try:
+        cur = conn.execute(
+            "INSERT INTO jobs (tipo, arquivo, modo, status, pid, instancia, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ("locacoes", "a.csv", "Adicionar", status, pid, instancia, "2024-01-01T00:00:00"),
+        )
+        conn.commit()
+        return cur.lastrowid
+    finally:
+        conn.close()
+
+
+def _status(job_id):
+    conn = banco.conectar()
+    try:
+        return conn.execute("SELECT status FROM jobs WHERE id=?", (job_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_processo_vivo(processo_vivo, pid_morto):
+    assert tarefas._processo_vivo(os.getpid())
+    assert tarefas._processo_vivo(processo_vivo)
+    assert not tarefas._processo_vivo(pid_morto)
+    assert not tarefas._processo_vivo(None)
+
+
+def test_recupera_so_tarefas_de_processos_mortos(db, processo_vivo, pid_morto):
+    deste = _criar_job(os.getpid(), instancia=tarefas._INSTANCIA)
+    # mesmo pid, outra execução: o servidor reiniciou e ganhou o mesmo pid (pid 1 em contêiner)
+    mesmo_pid_reiniciado = _criar_job(os.getpid())
+    anterior_ao_token = _criar_job(os.getpid(), tarefas.NA_FILA, instancia=None)
+    de_outro_servidor = _criar_job(processo_vivo, tarefas.NA_FILA)
+    orfa = _criar_job(pid_morto)
+    sem_pid = _criar_job(None)
+    concluida = _criar_job(pid_morto, tarefas.CONCLUIDA)
+
+    tarefas._recuperar_interrompidas()
+
+    assert _status(deste) == tarefas.EXECUTANDO
+    assert _status(mesmo_pid_reiniciado) == tarefas.ERRO
+    assert _status(anterior_ao_token) == tarefas.ERRO
+    assert _status(de_outro_servidor) == tarefas.NA_FILA
+    assert _status(orfa) == tarefas.ERRO
+    assert _status(sem_pid) == tarefas.ERRO
+    assert _status(concluida) == tarefas.CONCLUIDA
+
+
+def test_tarefa_nova_grava_pid_e_token(db):
+    job_id = tarefas._enviar("locacoes", "a.csv", "Adicionar", lambda job_id: (0, 0, 0, {}))
+    tarefas._executor.submit(lambda: None).result()  # espera o trabalhador
+    conn = banco.conectar()
+    try:
+        assert conn.execute("SELECT pid, instancia FROM jobs WHERE id=?", (job_id,)).fetchone() == (
+            os.getpid(), tarefas._INSTANCIA
+        )
+    finally:
+        conn.close()
+    assert _status(job_id) == tarefas.CONCLUIDA
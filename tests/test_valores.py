@@ -0,0 +1,48 @@
+# tests/test_valores.py
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from hospedar.valores import parse_valor_cell, parse_valor_series
+
+CASOS = [
+    None, np.nan, pd.NA, "", " ", "nan", "NaN ", "None", "none", "()", "(", ")", "-", ".", ",", "(-)", "-0", "(0)",
+    "R$ 1.234,56", "1,234.56", "1234,56", "1234.56", "(1.234,56)", "R$\xa01.234,56", " -R$ 10,5 ", "1.2.3", "1,2,3",
+    "1,234,567.8", "1.234.567,8", "--1", "1-2", "5.", ".5", "-.5", "007", "1e5", "١٢٣,٤", "1١2", "１２", "\x1f(5)\x1f",
+    "\x001", "\x002", "12345678901234,5", "1234567890123456,78", "0,1", 1234.5, 7, True, -0.0,
+]
+
+
+def _bits(serie):
+    return serie.to_numpy(dtype=float).view(np.int64)
+
+
+def _aleatorios(n, semente):
+    r = random.Random(semente)
+    alfabeto = "0123456789" * 3 + ",.-() R$\t\x1f\x00\xa0١"
+
+    def valor():
+        k = r.random()
+        if k < 0.4:
+            return "".join(r.choice(alfabeto) for _ in range(r.randint(0, 25)))
+        if k < 0.8:
+            v = f"{r.uniform(-1e6, 1e6):,.{r.randint(0, 4)}f}"
+            return v.translate(str.maketrans(",.", ".,")) if r.random() < 0.5 else v
+        return r.choice(["", None, "(50,00)", "R$ 150,00", "1.000"])
+
+    return [valor() for _ in range(n)]
+
+
+@pytest.mark.parametrize("valores", [CASOS, _aleatorios(20000, 1), _aleatorios(20000, 2)])
+def test_mesmo_float_que_parse_valor_cell(valores):
+    serie = pd.Series(valores, dtype=object, index=np.arange(len(valores)) * 2, name="valor")
+    esperado = serie.map(parse_valor_cell)
+    obtido = parse_valor_series(serie)
+    assert obtido.index.equals(serie.index) and obtido.name == "valor"
+    np.testing.assert_array_equal(_bits(obtido), _bits(esperado))
+
+
+def test_coluna_vazia():
+    assert parse_valor_series(pd.Series([], dtype=object)).empty